@@ -0,0 +1 @@
+# 従業員満足度・期待度調査アプリの補助モジュール群
@@ -0,0 +1,347 @@
+# 集計済み統計の増分更新
+#
+# 回答を保存するたびに、評価項目ごとの評価値ヒストグラム（件数）を属性別に
+# 加算していく。属性は調査定義の選択式の基本情報（事業部・職種・役職など）と
+# 全体で、平均・合計・件数・NPS の内訳はヒストグラムから求まる。集計結果の
+# 参照はヒストグラムを引くだけなので、回答数ではなく「属性値 × 項目」に比例する。
+# ヒストグラムは調査回（wave）ごとに分けて持ち、参照時に調査回で絞り込む
+# （wave=None なら全調査回の合計）。調査回のない回答は default_wave に数える。
+# ヒストグラムは回答データ全体から作り直し、照合することもできる。
+#
+# 期待度と満足度のギャップは、analytics.item_gaps と同じく回答者ごとの差
+# （期待度 − 満足度。両方に回答した人のみ）の平均とする。そのため項目ごとに
+# 差のヒストグラム（回答キー "gap:<期待度の回答キー>"、評価値は差）も加算する。
+# 項目の平均の差とは、どちらか一方だけに回答した人がいると一致しない。
+import sqlite3
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from survey.analytics import DETRACTOR_MAX, PROMOTER_MIN, gap_table, rating_matrix, segment_columns
+from survey.submissions import STORED_TABLE, unstored
+
+# 全体の集計を表す属性
+OVERALL = ("", "")
+
+# 回答者ごとのギャップのヒストグラムの回答キーの接頭辞
+GAP_PREFIX = "gap:"
+
+# 回答者ごとのギャップのヒストグラムを持つ集計済み統計の版（PRAGMA user_version）
+PAIRED_GAPS_VERSION = 1
+
+
+# ヒストグラムの行を表す列
+KEY_COLUMNS = ["wave", "segment_column", "segment_value", "response_key", "rating"]
+
+HISTOGRAMS_TABLE = (
+    "CREATE TABLE IF NOT EXISTS histograms ("
+    " wave TEXT NOT NULL, segment_column TEXT NOT NULL, segment_value TEXT NOT NULL,"
+    " response_key TEXT NOT NULL, rating INTEGER NOT NULL, count INTEGER NOT NULL,"
+    " PRIMARY KEY (wave, segment_column, segment_value, response_key, rating))"
+)
+
+
+# 1件の回答が加算されるヒストグラムの行 (調査回, 属性, 属性値, 回答キー, 評価値)
+def _histogram_keys(schema, record, default_wave):
+    wave = str(record.get("wave") or default_wave)
+    segments = [OVERALL] + [
+        (column, str(record[column]))
+        for column in segment_columns(schema)
+        if record.get(column) is not None
+    ]
+    ratings = []
+    for response_key, question in schema.questions.items():
+        value = record.get(response_key)
+        if value in question.scale.display:
+            ratings.append((response_key, int(value)))
+    for expectation, satisfaction in zip(schema.expectation, schema.satisfaction):
+        e, s = record.get(expectation.response_key), record.get(satisfaction.response_key)
+        if e in expectation.scale.display and s in satisfaction.scale.display:
+            ratings.append((GAP_PREFIX + expectation.response_key, int(e) - int(s)))
+    return [(wave, column, value, key, rating) for column, value in segments for key, rating in ratings]
+
+
+# 回答データ全体から調査回ごとのヒストグラムを作る
+def histograms_from_frame(df, schema, default_wave="default"):
+    if "wave" in df.columns:
+        waves = df["wave"].astype("string").fillna(default_wave)
+    else:
+        waves = pd.Series(default_wave, index=df.index, dtype="string")
+    frames = []
+    for wave, part in df.groupby(waves, sort=True):
+        table = _frame_histograms(part, schema)
+        table.insert(0, "wave", wave)
+        frames.append(table)
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS + ["count"])
+    return pd.concat(frames, ignore_index=True)
+
+
+# 1つの調査回の回答からヒストグラムを作る（属性値 × 評価値の組を np.bincount で数え、行ごとのループはない）
+# 期待度・満足度の組は、両方に回答した人の差も数える（差は負になりうるので最小値だけずらして数える）
+def _frame_histograms(df, schema):
+    questions = [q for key, q in schema.questions.items() if key in df.columns]
+    ratings = rating_matrix(df, questions)
+    keys = [q.response_key for q in questions]
+    valid = ~np.isnan(ratings)
+    valid &= np.where(valid, ratings, 0) >= 0
+    pairs = [(e, s) for e, s in zip(schema.expectation, schema.satisfaction) if e.response_key in df.columns and s.response_key in df.columns]
+    if pairs:
+        gaps = rating_matrix(df, [e for e, _ in pairs]) - rating_matrix(df, [s for _, s in pairs])
+        ratings = np.hstack([ratings, gaps])
+        valid = np.hstack([valid, ~np.isnan(gaps)])
+        keys += [GAP_PREFIX + e.response_key for e, _ in pairs]
+    ratings = np.where(valid, ratings, 0).astype(np.int64)
+    low = int(ratings[valid].min()) if valid.any() else 0
+    ratings -= low
+    size = int(ratings[valid].max()) + 1 if valid.any() else 1
+
+    parts = {"segment_column": [], "segment_value": [], "response_key": [], "rating": [], "count": []}
+    for column in [None] + [c for c in segment_columns(schema) if c in df.columns]:
+        if column is None:
+            codes, values = np.zeros(len(df), dtype=np.int64), np.array([""], dtype=object)
+        else:
+            codes, values = pd.factorize(df[column].astype("string"))
+            values = np.asarray(values, dtype=object)
+        for j, key in enumerate(keys):
+            rows = valid[:, j] & (codes >= 0)
+            counts = np.bincount(codes[rows] * size + ratings[rows, j], minlength=len(values) * size)
+            nonzero = np.flatnonzero(counts)
+            parts["segment_column"].append(np.full(len(nonzero), column or "", dtype=object))
+            parts["segment_value"].append(values[nonzero // size])
+            parts["response_key"].append(np.full(len(nonzero), key, dtype=object))
+            parts["rating"].append(nonzero % size + low)
+            parts["count"].append(counts[nonzero])
+    if not parts["count"]:
+        return pd.DataFrame(columns=list(parts))
+    return pd.DataFrame({name: np.concatenate(arrays) for name, arrays in parts.items()})
+
+
+class AggregateStore:
+    def __init__(self, path, schema, default_wave="default"):
+        self.path = path
+        self.schema = schema
+        self.default_wave = default_wave
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self._migrate(conn)
+                conn.execute(HISTOGRAMS_TABLE)
+                # 空の集計済み統計は最初から回答者ごとのギャップを数える
+                if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM histograms)").fetchone()[0]:
+                    conn.execute(f"PRAGMA user_version = {PAIRED_GAPS_VERSION}")
+            conn.execute(STORED_TABLE)
+            self._local.conn = conn
+        return conn
+
+    # 調査回の列がない以前のヒストグラムは default_wave の分として引き継ぐ
+    # （調査回ごとに分け直すには python -m survey.aggregates rebuild で作り直す）
+    def _migrate(self, conn):
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(histograms)")]
+        if not columns or "wave" in columns:
+            return
+        conn.execute("ALTER TABLE histograms RENAME TO histograms_without_wave")
+        conn.execute(HISTOGRAMS_TABLE)
+        conn.execute(
+            "INSERT INTO histograms (wave, segment_column, segment_value, response_key, rating, count)"
+            " SELECT ?, segment_column, segment_value, response_key, rating, count FROM histograms_without_wave",
+            (self.default_wave,),
+        )
+        conn.execute("DROP TABLE histograms_without_wave")
+
+    def _increment(self, conn, rows):
+        conn.executemany(
+            "INSERT INTO histograms (wave, segment_column, segment_value, response_key, rating, count)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(wave, segment_column, segment_value, response_key, rating)"
+            " DO UPDATE SET count = count + excluded.count",
+            rows,
+        )
+
+    # 1件の回答を加算する
+    def add(self, record):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._increment(conn, [key + (1,) for key in _histogram_keys(self.schema, record, self.default_wave)])
+
+    # 複数の回答（dict）を1回のトランザクションで加算する（送信キューの保存済みの回答は加算しない）
+    def add_many(self, records):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            records = unstored(conn, records)
+            counts = Counter(
+                key for record in records for key in _histogram_keys(self.schema, record, self.default_wave)
+            )
+            self._increment(conn, [key + (count,) for key, count in counts.items()])
+
+    # 複数の回答（DataFrame）をまとめて加算する
+    def add_frame(self, df):
+        table = histograms_from_frame(df, self.schema, self.default_wave)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._increment(conn, table.itertuples(index=False, name=None))
+        return len(table)
+
+    # 回答データ全体から作り直す
+    def rebuild(self, df):
+        table = histograms_from_frame(df, self.schema, self.default_wave)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM histograms")
+            self._increment(conn, table.itertuples(index=False, name=None))
+            conn.execute(f"PRAGMA user_version = {PAIRED_GAPS_VERSION}")
+        return len(table)
+
+    # 保存されているヒストグラム全体
+    def histograms(self):
+        return pd.read_sql_query(
+            "SELECT wave, segment_column, segment_value, response_key, rating, count FROM histograms",
+            self._connection(),
+        )
+
+    # 回答データ全体から作り直した結果と照合し、食い違う行を返す（一致すれば空）
+    def verify(self, df):
+        stored = self.histograms().set_index(KEY_COLUMNS)["count"]
+        expected = histograms_from_frame(df, self.schema, self.default_wave).set_index(KEY_COLUMNS)["count"]
+        both = pd.concat([stored.rename("stored"), expected.rename("expected")], axis=1).fillna(0)
+        return both[both["stored"] != both["expected"]].reset_index()
+
+    # 回答者ごとのギャップのヒストグラムがすべての回答の分そろっているか
+    # （それより前に作った集計済み統計は、python -m survey.aggregates rebuild で作り直すとそろう）
+    def paired_gaps(self):
+        return self._connection().execute("PRAGMA user_version").fetchone()[0] >= PAIRED_GAPS_VERSION
+
+    # 集計のある調査回
+    def waves(self):
+        return [wave for wave, in self._connection().execute("SELECT DISTINCT wave FROM histograms ORDER BY wave")]
+
+    # 属性と調査回の絞り込み（wave=None なら全調査回の合計）
+    @staticmethod
+    def _where(segment_column, wave):
+        if wave is None:
+            return "segment_column = ?", (segment_column or "",)
+        return "segment_column = ? AND wave = ?", (segment_column or "", wave)
+
+    # 属性値 × 回答キーごとの件数と平均（segment_column=None は全体）
+    def summary(self, segment_column=None, wave=None):
+        where, params = self._where(segment_column, wave)
+        rows = self._connection().execute(
+            "SELECT segment_value, response_key, SUM(count), SUM(rating * count) FROM histograms"
+            f" WHERE {where} GROUP BY segment_value, response_key",
+            params,
+        ).fetchall()
+        df = pd.DataFrame(rows, columns=["segment", "response_key", "count", "total"])
+        df["mean"] = df["total"] / df["count"]
+        return df
+
+    # 属性値ごとの NPS の内訳
+    def nps(self, segment_column=None, wave=None):
+        where, params = self._where(segment_column, wave)
+        rows = self._connection().execute(
+            f"SELECT segment_value, rating, count FROM histograms WHERE {where} AND response_key = 'nps'",
+            params,
+        ).fetchall()
+        df = pd.DataFrame(rows, columns=["segment", "rating", "count"])
+        if df.empty:
+            return pd.DataFrame(columns=["promoters", "passives", "detractors", "responses", "nps"])
+        bucket = np.select(
+            [df["rating"] >= PROMOTER_MIN, df["rating"] <= DETRACTOR_MAX],
+            ["promoters", "detractors"],
+            default="passives",
+        )
+        table = df.assign(bucket=bucket).pivot_table(
+            index="segment", columns="bucket", values="count", aggfunc="sum", fill_value=0
+        ).reindex(columns=["promoters", "passives", "detractors"], fill_value=0)
+        table["responses"] = table.sum(axis=1)
+        table["nps"] = (table["promoters"] - table["detractors"]) / table["responses"] * 100
+        table.columns.name = None
+        return table
+
+    # NPS の内訳（全体。analytics.nps_summary と同じ形）
+    def nps_summary(self, wave=None):
+        table = self.nps(wave=wave)
+        if table.empty:
+            return {"responses": 0, "promoters": 0, "passives": 0, "detractors": 0, "nps": np.nan}
+        row = table.iloc[0]
+        return {
+            "responses": int(row["responses"]),
+            "promoters": int(row["promoters"]),
+            "passives": int(row["passives"]),
+            "detractors": int(row["detractors"]),
+            "nps": float(row["nps"]),
+        }
+
+    # 項目ごとの期待度・満足度の平均とギャップ（analytics.item_gaps と同じ形・同じ定義）
+    # ギャップは回答者ごとの差の平均。回答者ごとのギャップのヒストグラムがそろっていない
+    # 集計済み統計（paired_gaps() が False）では、代わりに項目の平均の差を返す
+    def item_gaps(self, wave=None):
+        summary = self.summary(wave=wave).set_index("response_key")
+        expectation = summary.reindex([q.response_key for q in self.schema.expectation])
+        satisfaction = summary.reindex([q.response_key for q in self.schema.satisfaction])
+        gap = None
+        if self.paired_gaps():
+            gap = summary.reindex([GAP_PREFIX + q.response_key for q in self.schema.expectation])["mean"].to_numpy(dtype=float)
+        return gap_table(
+            self.schema,
+            expectation["mean"].to_numpy(dtype=float),
+            satisfaction["mean"].to_numpy(dtype=float),
+            expectation["count"].fillna(0).to_numpy(dtype=int),
+            gap=gap,
+        )
+
+    # 属性値ごとのクロス集計（analytics.segment_summary と同じ列）
+    # 期待度・満足度は項目平均の平均
+    def segment_summary(self, segment_column, wave=None):
+        means = self.summary(segment_column, wave).pivot(index="segment", columns="response_key", values="mean")
+        nps = self.nps(segment_column, wave)
+        evaluation = [q.response_key for q in self.schema.evaluation]
+        table = means.reindex(columns=evaluation)
+        table.insert(0, "responses", nps["responses"].reindex(table.index).fillna(0).astype(int))
+        table["nps"] = nps["nps"].reindex(table.index)
+        table["expectation"] = means.reindex(columns=[q.response_key for q in self.schema.expectation]).mean(axis=1)
+        table["satisfaction"] = means.reindex(columns=[q.response_key for q in self.schema.satisfaction]).mean(axis=1)
+        table["gap"] = table["expectation"] - table["satisfaction"]
+        table.index.name = segment_column
+        table.columns.name = None
+        return table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog, load_responses
+
+    parser = argparse.ArgumentParser(description="集計済み統計を回答データから作り直し、全件集計と照合します")
+    parser.add_argument("command", choices=["rebuild", "verify"], help="rebuild: 作り直して照合 / verify: 照合のみ")
+    parser.add_argument("log", help="回答ログ（CSV）のパス")
+    parser.add_argument("dataset", help="Parquet データセットのディレクトリ")
+    parser.add_argument("store", help="集計済み統計（SQLite）のパス")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    log = AppendOnlyLog(args.log, schema.columns)
+    df = load_responses(log, ResponseDataset(args.dataset, response_dtypes(schema)))
+    store = AggregateStore(args.store, schema)
+    if args.command == "rebuild":
+        print(f"{len(df)} 件の回答から {store.rebuild(df)} 行のヒストグラムを作成しました")
+    mismatches = store.verify(df)
+    if len(mismatches):
+        print(mismatches.to_string(index=False))
+        raise SystemExit(f"NG: 全件集計と一致しない行が {len(mismatches)} 行あります")
+    print("OK: 全件集計と一致しました")
@@ -0,0 +1,145 @@
+# 回答の集計
+#
+# すべて回答行列（1行1回答の DataFrame）に対する列単位の pandas / NumPy 演算で
+# 計算し、行ごとの Python ループは使わない。
+import numpy as np
+import pandas as pd
+
+# NPS の区分（0〜6: 批判者、7〜8: 中立者、9〜10: 推奨者）
+DETRACTOR_MAX = 6
+PROMOTER_MIN = 9
+
+QUADRANTS = {
+    (True, False): "最優先で改善",
+    (True, True): "強みとして維持",
+    (False, False): "優先度低",
+    (False, True): "過剰充足",
+}
+
+
+# 属性別に集計する列（調査定義の選択式の基本情報）
+def segment_columns(schema):
+    return [q.key for q in schema.demographics if q.widget == "select"]
+
+
+# 集計に必要な列
+def analysis_columns(schema):
+    return (
+        [q.response_key for q in schema.evaluation]
+        + [q.response_key for q in schema.expectation]
+        + [q.response_key for q in schema.satisfaction]
+        + segment_columns(schema)
+    )
+
+
+# NPS の内訳（件数・割合）と NPS 値
+def nps_summary(scores):
+    scores = pd.to_numeric(scores, errors="coerce").dropna().to_numpy()
+    n = len(scores)
+    promoters = int(np.count_nonzero(scores >= PROMOTER_MIN))
+    detractors = int(np.count_nonzero(scores <= DETRACTOR_MAX))
+    passives = n - promoters - detractors
+    return {
+        "responses": n,
+        "promoters": promoters,
+        "passives": passives,
+        "detractors": detractors,
+        "nps": (promoters - detractors) / n * 100 if n else np.nan,
+    }
+
+
+# 質問の回答を float の行列（未回答は NaN）として取り出す
+def rating_matrix(df, questions):
+    columns = [q.response_key for q in questions]
+    frame = df.reindex(columns=columns)
+    numeric = [c for c in columns if frame[c].dtype == object]
+    if numeric:
+        frame[numeric] = frame[numeric].apply(pd.to_numeric, errors="coerce")
+    return frame.to_numpy(dtype=float, na_value=np.nan)
+
+
+# NaN を除いた平均（axis=0: 列ごと、axis=1: 行ごと）。回答がなければ NaN
+def nan_mean(matrix, axis):
+    counts = np.count_nonzero(~np.isnan(matrix), axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(matrix, axis=axis) / counts
+
+
+# 項目ごとの期待度・満足度の平均とギャップ（期待度 − 満足度）、優先度の象限
+# ギャップは回答者ごとの差の平均（両方に回答した人のみ）で、どちらか一方だけに回答した人が
+# いると、表の期待度と満足度の差とは一致しない（集計済み統計の AggregateStore.item_gaps も同じ定義）
+def item_gaps(df, schema):
+    expectation = rating_matrix(df, schema.expectation)
+    satisfaction = rating_matrix(df, schema.satisfaction)
+    return gap_table(
+        schema,
+        nan_mean(expectation, axis=0),
+        nan_mean(satisfaction, axis=0),
+        np.count_nonzero(~np.isnan(expectation), axis=0),
+        # 回答者ごとの差の平均（両方に回答した人のみ）
+        gap=nan_mean(expectation - satisfaction, axis=0),
+    )
+
+
+# 項目ごとの平均からギャップ表を作る（gap を省略すると平均の差）
+def gap_table(schema, expectation, satisfaction, responses, gap=None):
+    items = pd.DataFrame({
+        "category": [q.category for q in schema.expectation],
+        "item": [q.key for q in schema.expectation],
+        "question": [q.text for q in schema.expectation],
+        "expectation": expectation,
+        "satisfaction": satisfaction,
+        "responses": responses,
+    })
+    items["gap"] = items["expectation"] - items["satisfaction"] if gap is None else gap
+    items["quadrant"] = quadrants(items["expectation"], items["satisfaction"])
+    return items
+
+
+# 期待度・満足度それぞれの全項目平均を境界にした4象限
+def quadrants(expectation, satisfaction):
+    high_expectation = (expectation >= expectation.mean()).to_numpy()
+    high_satisfaction = (satisfaction >= satisfaction.mean()).to_numpy()
+    labels = np.select(
+        [high_expectation & ~high_satisfaction, high_expectation & high_satisfaction, ~high_expectation & ~high_satisfaction],
+        [QUADRANTS[(True, False)], QUADRANTS[(True, True)], QUADRANTS[(False, False)]],
+        default=QUADRANTS[(False, True)],
+    )
+    return pd.Series(labels, index=expectation.index)
+
+
+# カテゴリごとのギャップ（項目平均の平均）
+def category_gaps(items):
+    return (
+        items.groupby("category", sort=False)[["expectation", "satisfaction", "gap"]]
+        .mean()
+        .sort_values("gap", ascending=False)
+    )
+
+
+# 回答者ごとの集計値（総合評価、推奨者・批判者のフラグ、期待度・満足度の全項目平均とギャップ）
+# 属性別の集計はこの表を属性で groupby して平均をとる
+def respondent_measures(df, schema):
+    scores = rating_matrix(df, schema.evaluation)
+    expectation = nan_mean(rating_matrix(df, schema.expectation), axis=1)
+    satisfaction = nan_mean(rating_matrix(df, schema.satisfaction), axis=1)
+
+    table = pd.DataFrame(scores, columns=[q.response_key for q in schema.evaluation], index=df.index)
+    nps = table["nps"] if "nps" in table else pd.Series(np.nan, index=df.index)
+    table["promoter"] = (nps >= PROMOTER_MIN).astype(float).where(nps.notna())
+    table["detractor"] = (nps <= DETRACTOR_MAX).astype(float).where(nps.notna())
+    table["expectation"] = expectation
+    table["satisfaction"] = satisfaction
+    table["gap"] = expectation - satisfaction
+    return table
+
+
+# 属性（事業部・職種・役職など）ごとのクロス集計
+# 総合評価の平均、NPS、期待度・満足度の全項目平均とギャップ
+def segment_summary(df, schema, segment):
+    table = respondent_measures(df, schema)
+    grouped = table.groupby(df[segment], observed=True, sort=True)
+    summary = grouped.mean()
+    summary["nps"] = (summary.pop("promoter") - summary.pop("detractor")) * 100
+    summary.insert(0, "responses", grouped.size())
+    return summary
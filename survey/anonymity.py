@@ -0,0 +1,121 @@
+# 個人が特定されない属性別集計（少人数のセルの秘匿）
+#
+# 任意の基本情報の組み合わせ（例: 事業部 × 役職 × 年齢）で回答を集計し、
+# 回答者が k 人未満のセルは表示しない（suppress）か、1つの「その他」の
+# セルにまとめる（merge）。年齢・年収・残業時間などの数値は、調査定義の
+# bands の区間に丸めてから集計する。
+#
+# 集計は回答者ごとの集計値（analytics.respondent_measures）を属性の組で
+# 1回 groupby し、セルごとの合計と件数を持っておく。平均はそこから求めるので、
+# セルをまとめるときも回答を読み直さずに合計と件数を足すだけで済む。
+#
+# 秘匿したセルの回答者数の合計も k 人以上になるまで、小さい順に他のセルも
+# 秘匿する（全体の集計から表示中のセルを引いて、1つだけ秘匿したセルの値を
+# 逆算できないようにする）。
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from survey.analytics import respondent_measures
+
+# 表示する最小の回答者数（環境変数 SURVEY_MIN_CELL_SIZE で変えられる）
+K_MIN = 5
+
+MODES = ("suppress", "merge")
+
+# 少人数のセルをまとめたセルの属性値
+MERGED = "その他（少人数）"
+
+# 入社年など、bands のない数値を区切る幅
+DEFAULT_BAND_WIDTH = 5
+
+
+# 数値の属性を区切る境界（各区間は下限以上・次の境界未満。最後の区間は上限なし）
+def band_edges(question):
+    if question.bands:
+        return list(question.bands)
+    if question.widget == "year":
+        current = datetime.now().year
+        first = current - question.years + 1
+        return list(range(current + 1, first, -DEFAULT_BAND_WIDTH))[::-1]
+    low = question.min if question.min is not None else 0
+    high = question.max if question.max is not None else low + DEFAULT_BAND_WIDTH * 10
+    return list(range(low, high + 1, max((high - low) // 10, 1)))
+
+
+def band_labels(edges):
+    labels = [f"{low}〜{high - 1}" for low, high in zip(edges, edges[1:])]
+    return [f"{edges[0] - 1}以下"] + labels + [f"{edges[-1]}〜"]
+
+
+# 集計に使う属性の値（選択式は選択肢、数値は区間のラベルをカテゴリとするカテゴリ型。表示順もこの順になる）
+def segment_values(df, question):
+    if question.widget == "select":
+        return pd.Series(pd.Categorical(df[question.key].astype("string"), categories=question.options), index=df.index)
+    edges = band_edges(question)
+    values = pd.to_numeric(df[question.key], errors="coerce")
+    return pd.cut(values, [-np.inf] + edges + [np.inf], right=False, labels=band_labels(edges))
+
+
+# 秘匿するセル（回答者数が k 未満のセルと、秘匿したセルの合計を k 以上にするための小さいセル）
+def hidden_cells(sizes, k):
+    values = np.asarray(sizes, dtype=float)
+    hidden = values < k
+    if hidden.any() and values[hidden].sum() < k:
+        for i in np.argsort(values, kind="stable"):
+            if not hidden[i]:
+                hidden[i] = True
+                if values[hidden].sum() >= k:
+                    break
+    return pd.Series(hidden, index=sizes.index)
+
+
+# 集計に必要な列
+def analysis_columns(schema, by):
+    return list(by) + [q.response_key for q in schema.evaluation + schema.expectation + schema.satisfaction]
+
+
+def _summary(sums, counts, sizes):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts.replace(0, np.nan)
+    means["nps"] = (means.pop("promoter") - means.pop("detractor")) * 100
+    means.insert(0, "responses", sizes)
+    return means
+
+
+# 基本情報の組み合わせ by（キーの並び）での集計
+# mode: "suppress" は k 人未満のセルを表示しない、"merge" は1つの「その他（少人数）」のセルにまとめる
+# 戻り値は (集計表, 秘匿・統合したセルの数)
+def cross_tab(df, schema, by, k=K_MIN, mode="suppress"):
+    if mode not in MODES:
+        raise ValueError(f"未対応の秘匿方法です: {mode}")
+    questions = {q.key: q for q in schema.demographics}
+    by = list(by)
+    keys = [segment_values(df, questions[key]).rename(key) for key in by]
+    table = respondent_measures(df, schema)
+
+    grouped = table.groupby(keys, observed=True, sort=True, dropna=True)
+    sums, counts, sizes = grouped.sum(min_count=1), grouped.count(), grouped.size()
+    hidden = hidden_cells(sizes, k)
+    summary = _summary(sums[~hidden], counts[~hidden], sizes[~hidden])
+
+    if mode == "merge" and hidden.any():
+        merged = _summary(
+            sums[hidden].sum(min_count=1).to_frame().T,
+            counts[hidden].sum().to_frame().T,
+            pd.Series([sizes[hidden].sum()]),
+        )
+        merged.index = pd.MultiIndex.from_tuples([(MERGED,) * len(by)], names=by) if len(by) > 1 else pd.Index([MERGED], name=by[0])
+        # まとめても k 人未満なら表示しない（hidden_cells により全体が k 未満のときだけ起きる）
+        if merged["responses"].iloc[0] >= k:
+            summary = pd.concat([summary, merged])
+    return summary, int(hidden.sum())
+
+
+# responses 列を持つ集計表（集計済み統計の属性別など）から、k 人未満のセルを除く
+# 戻り値は (集計表, 除いたセルの数)
+def suppress(summary, k=K_MIN):
+    sizes = summary["responses"].fillna(0)
+    hidden = hidden_cells(sizes, k)
+    return summary[~hidden], int(hidden.sum())
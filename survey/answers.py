@@ -0,0 +1,46 @@
+# 回答の評価値別インデックス
+#
+# セッションごとに (セクション, 評価値) → 質問 のバケットを持ち、回答を
+# 記録した時点で更新する。理由入力ページのように「期待度が1または2の項目」
+# を求めるときは該当バケットを引くだけでよく、全質問を走査し直す必要はない。
+# 条件分岐するページを追加するときもこのインデックスを使う。
+class AnswerIndex:
+    def __init__(self):
+        self._buckets = {}
+        self._ratings = {}
+
+    # 既存の回答（例: 再開したセッション）からインデックスを作り直す
+    @classmethod
+    def rebuild(cls, schema, responses):
+        index = cls()
+        for response_key, value in responses.items():
+            question = schema.question(response_key)
+            if question is not None and value is not None:
+                index.record(question, value)
+        return index
+
+    # 回答を記録する（値が変わっていなければ何もしない）
+    def record(self, question, value):
+        key = question.response_key
+        previous = self._ratings.get(key)
+        if previous == value:
+            return
+        if previous is not None:
+            del self._buckets[(question.section, previous)][key]
+        self._buckets.setdefault((question.section, value), {})[key] = question
+        self._ratings[key] = value
+
+    def rating(self, response_key):
+        return self._ratings.get(response_key)
+
+    # section の回答が ratings のいずれかである質問（出題順）
+    def questions(self, section, ratings):
+        found = [
+            question
+            for rating in ratings
+            for question in self._buckets.get((section, rating), {}).values()
+        ]
+        return sorted(found, key=lambda question: question.position)
+
+    def count(self, section, rating):
+        return len(self._buckets.get((section, rating), ()))
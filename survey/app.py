@@ -0,0 +1,238 @@
+# アプリ全体で共有する状態（調査定義・保存先・送信キュー・セッション・チェックポイント）
+#
+# このモジュールはプロセスで1回だけ読み込まれ、各ページのモジュール
+# （survey.views.*）とエントリポイント（streamlit_survey.py）から使う。
+# 保存先のオブジェクトは st.cache_resource で調査ごとに1つ作り、全セッションで共有する。
+#
+# pandas / pyarrow に依存する保存・集計のモジュール（survey.storage、survey.dataset、
+# survey.aggregates など）は、そのオブジェクトを最初に作るときに読み込む。
+# 回答ページを表示しているあいだは読み込まれず、回答の送信か集計結果ページで初めて読み込む。
+import functools
+import os
+
+import streamlit as st
+
+from survey import metrics, registry, validation
+from survey.answers import AnswerIndex
+from survey.checkpoint import CheckpointStore, changed_fields, new_token
+from survey.schema import load_schema
+from survey.submissions import SubmissionQueue
+
+# 配信する調査（URL の ?survey=<調査ID>。省略時は既定の調査）
+def survey_id():
+    return st.query_params.get("survey") or registry.DEFAULT_SURVEY
+
+# 調査定義（調査ごとにプロセスで1回だけコンパイルし、全セッションで共有する）
+@st.cache_resource
+def get_schema(survey_id):
+    path = registry.definition_path(survey_id)
+    if path is None:
+        raise KeyError(survey_id)
+    return load_schema(path)
+
+# 表示中の調査の調査定義（調査が見つからなければ KeyError）
+def schema():
+    return get_schema(survey_id())
+
+# 実行時メトリクス（再実行・描画関数・読み書きの所要時間など）
+# SURVEY_METRICS_PORT / SURVEY_METRICS_FILE で Prometheus 形式の出力先を指定する
+@st.cache_resource
+def get_metrics():
+    return metrics.from_environment()
+
+METRICS = get_metrics()
+
+# 調査ごとの回答データの保存先（SURVEY_DATA_DIR の下。既定の調査は employee_survey_data.*）
+@st.cache_resource
+def get_storage_paths(survey_id):
+    paths = registry.storage_paths(survey_id)
+    os.makedirs(os.path.dirname(paths["log"]) or ".", exist_ok=True)
+    return paths
+
+# 調査回（データセットのパーティション。環境変数で指定し、未指定なら実施中の調査回、それもなければ回答年）
+SURVEY_WAVE = os.environ.get("SURVEY_WAVE")
+
+# 回答ログがこのサイズを超えたら型付きデータセットへ移し替える
+COMPACT_THRESHOLD_BYTES = 1024 * 1024
+
+# 以下の保存先のオブジェクト（接続を含む）は調査ごとに1つ作り、その調査の全セッションで共有する
+# 回答ログ（追記専用）
+@st.cache_resource
+def get_response_log(survey_id):
+    from survey.storage import AppendOnlyLog
+    return AppendOnlyLog(get_storage_paths(survey_id)["log"], get_schema(survey_id).columns)
+
+# 型付きの列指向データセット（調査回・回答日でパーティション分割）
+@st.cache_resource
+def get_response_dataset(survey_id):
+    from survey.dataset import ResponseDataset, response_dtypes
+    return ResponseDataset(get_storage_paths(survey_id)["dataset"], response_dtypes(get_schema(survey_id)))
+
+# 集計済み統計（保存のたびに属性別のヒストグラムを加算する）
+@st.cache_resource
+def get_aggregate_store(survey_id):
+    from survey.aggregates import AggregateStore
+    return AggregateStore(get_storage_paths(survey_id)["aggregates"], get_schema(survey_id))
+
+# 回答データの版（ログとデータセット。読み込みや集計のキャッシュのキー）
+def responses_version(survey_id):
+    from survey.storage import responses_version
+    return responses_version(get_response_log(survey_id), get_response_dataset(survey_id))
+
+# データ読み込み（ログとデータセットの版をキーにキャッシュするので、追記後は自動的に読み直す）
+# 版をキーにする集計のキャッシュからは、同じ版でこれを呼ぶ
+@st.cache_data(max_entries=8)
+def cached_responses(survey_id, version, columns):
+    from survey.storage import load_responses
+    return load_responses(get_response_log(survey_id), get_response_dataset(survey_id), columns)
+
+# columns を指定するとその列だけを読む
+@METRICS.timed
+def load_data(columns=None):
+    current = survey_id()
+    return cached_responses(current, responses_version(current), None if columns is None else tuple(columns))
+
+# 調査回の管理（開始・締め切り）と、締め切った調査回のスナップショット
+@st.cache_resource
+def get_wave_store(survey_id):
+    from survey.waves import WaveStore
+    return WaveStore(get_storage_paths(survey_id)["waves"], get_schema(survey_id))
+
+def current_wave(now):
+    return SURVEY_WAVE or get_wave_store(survey_id()).current() or str(now.year)
+
+# 理由の自由記述の索引（保存のたびに、その回答の記述だけを足す）
+@st.cache_resource
+def get_reason_index(survey_id):
+    from survey.reasons import ReasonIndex
+    return ReasonIndex(get_storage_paths(survey_id)["reasons"], get_schema(survey_id))
+
+# 送信された回答を集計済み統計・理由の索引・回答ログへまとめて保存する（送信キューのワーカーのスレッドで動く）
+# どの保存先も保存済みの submission_id の回答は読み飛ばすので、途中で失敗したバッチを保存し直しても
+# 二重にはならない。トランザクションで書く SQLite の保存先を先に、途中まで書けることのある回答ログを最後に書く
+@METRICS.timed
+def commit_responses(log, aggregates, reasons, records):
+    aggregates.add_many(records)
+    reasons.add_many(records)
+    log.append_many(records)
+
+# 回答ログが大きくなったら型付きデータセットへ移し替える（送信キューが保存待ちの回答を保存し終えた後に動く）
+@METRICS.timed
+def compact_responses(log, dataset):
+    from survey.dataset import compact
+    if log.size() > COMPACT_THRESHOLD_BYTES:
+        compact(log, dataset)
+
+# 送信キュー（受け付けた回答をディスクのジャーナルに書き、バックグラウンドでまとめて保存する）
+@st.cache_resource
+def get_submission_queue(survey_id):
+    log = get_response_log(survey_id)
+    commit = functools.partial(commit_responses, log, get_aggregate_store(survey_id), get_reason_index(survey_id))
+    maintain = functools.partial(compact_responses, log, get_response_dataset(survey_id))
+    return SubmissionQueue(get_storage_paths(survey_id)["submissions"], commit, maintain).start()
+
+# データ保存（ジャーナルに1行書いた時点で受け付け完了。回答ログへの保存はワーカーが行い、
+# 保存でログの版が変わると読み込みキャッシュは無効になる）
+@METRICS.timed
+def save_data(data):
+    get_submission_queue(survey_id()).submit(data)
+
+# 回答途中のチェックポイントを残しておく日数（これより古いものは保存のついでに削除する）
+CHECKPOINT_MAX_AGE_DAYS = float(os.environ.get("SURVEY_CHECKPOINT_MAX_AGE_DAYS", 30))
+
+# 回答途中のチェックポイント（再開用トークンは URL の ?resume= に載せる）
+@st.cache_resource
+def get_checkpoint_store(survey_id):
+    return CheckpointStore(get_storage_paths(survey_id)["checkpoints"], CHECKPOINT_MAX_AGE_DAYS * 86400)
+
+# 基本情報の入力欄のキー（st.session_state に入力中の値が入る）
+def demographic_key(question):
+    return f"demographic_{question.key}"
+
+# 回答から基本情報の入力欄の値を入れておく（入力欄は既定値ではなく、この値を表示する）
+# 入力欄に表示できない値（調査定義の変更で選択肢・範囲から外れたものなど）は入れない
+def seed_demographics(responses):
+    for question in schema().demographics:
+        if question.key not in responses:
+            continue
+        value, error = validation.normalize_demographic(question, responses[question.key])
+        if error or value is None:
+            continue
+        st.session_state[demographic_key(question)] = str(value) if question.widget == "text" else value
+
+# 入れておいた基本情報の入力欄の値を捨てる（最初から回答し直すとき・調査を切り替えたとき）
+def clear_demographics():
+    for key in [key for key in st.session_state if str(key).startswith("demographic_")]:
+        del st.session_state[key]
+
+# URL のトークンに対応するチェックポイントがあれば、続きから再開する
+def restore_checkpoint():
+    token = st.query_params.get("resume")
+    if not token:
+        return
+    checkpoint = get_checkpoint_store(survey_id()).load(token)
+    if checkpoint is None:
+        return
+    page, responses = checkpoint
+    st.session_state.responses = responses
+    st.session_state.current_page = page
+    st.session_state.checkpointed = dict(responses)
+    st.session_state.answer_index = AnswerIndex.rebuild(schema(), responses)
+    seed_demographics(responses)
+
+# 前回のチェックポイントから変わった項目だけを保存する
+def save_checkpoint():
+    token = st.query_params.get("resume")
+    if not token:
+        token = new_token()
+        st.query_params["resume"] = token
+    changed = changed_fields(st.session_state.responses, st.session_state.checkpointed)
+    get_checkpoint_store(survey_id()).save(token, st.session_state.current_page, changed)
+    st.session_state.checkpointed.update(changed)
+
+# 送信済み・やり直しのときはチェックポイントと再開用トークンを破棄する
+def discard_checkpoint():
+    token = st.query_params.get("resume")
+    if token:
+        get_checkpoint_store(survey_id()).delete(token)
+        del st.query_params["resume"]
+    st.session_state.checkpointed = {}
+
+# セッション状態の既定値（回答の dict はセッションごとに作る）
+SESSION_DEFAULTS = {
+    'page': 'intro',
+    'current_page': 1,
+}
+
+# セッション状態の初期化
+def initialize_session():
+    # 別の調査に切り替わったら、途中の回答は引き継がずに最初から
+    current = survey_id()
+    if st.session_state.get('survey_id') != current:
+        for key in ('responses', 'current_page', 'answer_index', 'checkpointed'):
+            st.session_state.pop(key, None)
+        clear_demographics()
+        st.session_state.survey_id = current
+
+    for key, val in SESSION_DEFAULTS.items():
+        if key not in st.session_state:
+            st.session_state[key] = val
+    if 'responses' not in st.session_state:
+        st.session_state.responses = {}
+
+    # 評価値別の回答インデックス（理由入力ページの対象項目を引く）
+    if 'answer_index' not in st.session_state:
+        st.session_state.answer_index = AnswerIndex()
+
+    # 最後にチェックポイントへ保存した回答（差分の計算に使う）
+    if 'checkpointed' not in st.session_state:
+        st.session_state.checkpointed = {}
+        restore_checkpoint()
+
+# ページ移動（回答途中のページへ移るときはチェックポイントを保存する）
+def go_to(page):
+    st.session_state.current_page = page
+    if 1 < page < 9:
+        save_checkpoint()
+    st.rerun()
+
@@ -0,0 +1,389 @@
+# 画面描画と保存の計測
+#
+# streamlit.testing の AppTest でアプリをヘッドレスに実行し、次の3つを測る。
+#
+# - payload:  各ページの状態から1回描画したときの要素（protobuf）の数とバイト数
+# - sessions: イントロからサンキューページまで回答を通しで進めたときの、
+#             ページごとのスクリプト実行時間・要素数・セッション状態のサイズ
+# - saves:    既存の回答が N 件（既定は 1千 / 1万 / 10万件）あるときの
+#             save_data（送信の受け付け）のレイテンシ、受け付けた回答が
+#             保存されるまでの時間、保存直後の load_data の時間
+# - startup:  新しいプロセスでエントリポイントとページのモジュール（回答ページ・
+#             集計結果ページ）を読み込むまでの時間と、読み込まれたモジュール
+#             （コールドスタート）。あわせて、モジュールを読み込み済みの状態で
+#             エントリポイントを実行し直す時間（再実行ごとのオーバーヘッド）
+#
+# 結果は --json で JSON として書き出せるので、版ごとの結果を比べて
+# 性能の劣化を検出できる。
+#
+#   python -m survey.bench
+#   python -m survey.bench --sessions 3 --rows 1000 10000 100000 --json bench.json
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from survey import app, registry, synthetic
+from survey.schema import _Frozen
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_survey.py")
+
+PAGES = {
+    1: "イントロ",
+    2: "基本情報",
+    3: "総合評価",
+    4: "期待項目",
+    5: "期待していない理由",
+    6: "満足項目",
+    7: "満足していない理由",
+    8: "満足している理由",
+    9: "サンキュー",
+}
+
+
+# 要素ツリーをたどり、(要素数, バイト数) を返す
+def _measure(node):
+    proto = getattr(node, "proto", None)
+    elements, size = (1, proto.ByteSize()) if proto is not None else (0, 0)
+    for child in getattr(node, "children", {}).values():
+        n, b = _measure(child)
+        elements += n
+        size += b
+    return elements, size
+
+
+# 指定のページを1回描画したときの送信量
+def page_payload(page, responses=None, timeout=30):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    # 調査が切り替わったとみなされると最初のページに戻るので、表示中の調査も設定しておく
+    at.session_state["survey_id"] = registry.DEFAULT_SURVEY
+    at.session_state["current_page"] = page
+    at.session_state["responses"] = dict(responses or {})
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    elements, size = _measure(at._tree)
+    return {"page": page, "name": PAGES.get(page, ""), "elements": elements, "bytes": size}
+
+
+# アプリの作業ディレクトリ（回答データなどが作られる）を一時ディレクトリにする
+# 保存先を掴んだままのキャッシュ済みリソースは出入りのたびに破棄する
+@contextlib.contextmanager
+def _workdir():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        try:
+            yield tmp
+        finally:
+            st.cache_resource.clear()
+            st.cache_data.clear()
+            os.chdir(cwd)
+
+
+def payloads(pages=PAGES):
+    with _workdir():
+        return [page_payload(page) for page in pages]
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "p50_ms": _percentile(seconds, 50) * 1000,
+        "p99_ms": _percentile(seconds, 99) * 1000,
+        "max_ms": max(seconds) * 1000,
+        "mean_ms": sum(seconds) / len(seconds) * 1000,
+    }
+
+
+# オブジェクトが参照しているものを含めたおおよそのメモリ量（バイト）
+# 調査定義のオブジェクトは全セッションで共有されるので数えない
+def _deep_size(obj, seen=None):
+    seen = set() if seen is None else seen
+    if isinstance(obj, _Frozen) or id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k, seen) + _deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _deep_size(vars(obj), seen)
+    return size
+
+
+# ラジオボタンの i 番目の選択肢の値（表示は「値: ラベル」）
+def _option_value(radio, i):
+    return int(radio.options[i].split(":")[0])
+
+
+# 1回実行して、実行時間と描画結果を記録する
+def _step(at, steps, action):
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    page = at.session_state["current_page"]
+    elements, size = _measure(at._tree)
+    steps.append({
+        "page": page,
+        "name": PAGES.get(page, ""),
+        "run_ms": elapsed * 1000,
+        "elements": elements,
+        "bytes": size,
+        "session_state_bytes": _deep_size(at.session_state.to_dict()),
+    })
+
+
+# イントロから送信まで1回分の回答を通しで進め、表示したページごとの計測値を返す
+def session_walk(rng, timeout=30):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    steps = []
+    _step(at, steps, at.run)
+    while at.session_state["current_page"] < 9:
+        for radio in at.radio:
+            radio.set_value(_option_value(radio, rng.randrange(len(radio.options))))
+        for text_area in at.text_area:
+            text_area.input("ベンチマークの回答")
+        _step(at, steps, at.button[0].click().run)
+    return steps
+
+
+# セッションを sessions 回通しで実行し、ページごとの計測値をまとめる
+def session_benchmark(sessions=1, seed=0):
+    rng = random.Random(seed)
+    with _workdir():
+        walks = [session_walk(rng) for _ in range(sessions)]
+    pages = {}
+    for steps in walks:
+        for step in steps:
+            pages.setdefault(step["page"], []).append(step)
+    return [
+        {
+            "page": page,
+            "name": PAGES.get(page, ""),
+            "runs": len(steps),
+            "run_ms_p50": _percentile([s["run_ms"] for s in steps], 50),
+            "run_ms_max": max(s["run_ms"] for s in steps),
+            "elements": max(s["elements"] for s in steps),
+            "bytes": max(s["bytes"] for s in steps),
+            "session_state_bytes": max(s["session_state_bytes"] for s in steps),
+        }
+        for page, steps in sorted(pages.items())
+    ]
+
+
+# 既存の回答が rows 件あるときの save_data / load_data の時間
+#
+# 既存の回答は移し替え済みのデータセットに置き、集計済み統計もそこから作る
+# （運用中と同じく、ログには移し替え前の少量の回答だけがある状態）。
+# save_data はアプリの共有モジュール（survey.app）から直接呼ぶ。
+def save_benchmark(rows, saves=20, seed=0):
+    survey_id = registry.DEFAULT_SURVEY
+    schema = app.get_schema(survey_id)
+    existing = synthetic.generate_frame(schema, rows, seed)
+    records = synthetic.generate_frame(schema, saves, seed + 1).astype(object)
+    records["timestamp"] = records["timestamp"].map(lambda t: t.strftime("%Y-%m-%d %H:%M:%S"))
+    records = records.where(records.notna(), None)
+    with _workdir():
+        app.get_response_dataset(survey_id).write(existing)
+        app.get_aggregate_store(survey_id).rebuild(existing)
+
+        seconds = []
+        for record in records.to_dict("records"):
+            start = time.perf_counter()
+            app.save_data(record)
+            seconds.append(time.perf_counter() - start)
+
+        # 受け付けた回答がワーカーで回答ログに保存されるまでの時間
+        queue = app.get_submission_queue(survey_id)
+        start = time.perf_counter()
+        queue.flush()
+        commit_seconds = time.perf_counter() - start
+        queue.close()
+
+        start = time.perf_counter()
+        loaded = len(app.load_data())
+        load_seconds = time.perf_counter() - start
+    if loaded != rows + saves:
+        raise RuntimeError(f"保存後の件数が一致しません: {loaded} != {rows + saves}")
+    return {
+        "rows": rows,
+        "save": _latency_summary(seconds),
+        "commit_ms": commit_seconds * 1000,
+        "load_ms": load_seconds * 1000,
+    }
+
+
+# コールドスタートを測るページのモジュール（エントリポイントが表示するときに読み込むもの）
+VIEWS = {
+    "questionnaire": "survey.views.questionnaire",
+    "results": "survey.views.results",
+}
+
+# 読み込まれたかどうかを報告する重いモジュール
+HEAVY_MODULES = ("numpy", "pandas", "pyarrow")
+
+# 新しいプロセスで実行し、streamlit とエントリポイント・ページのモジュールを読み込む時間を JSON で出力する
+_COLD_START = """
+import importlib, json, sys, time
+start = time.perf_counter()
+import streamlit
+loaded = time.perf_counter()
+before = len(sys.modules)
+for name in sys.argv[1:]:
+    importlib.import_module(name)
+end = time.perf_counter()
+print(json.dumps({
+    "streamlit_ms": (loaded - start) * 1000,
+    "import_ms": (end - loaded) * 1000,
+    "modules": len(sys.modules) - before,
+    "heavy": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+# ページを最初に表示するまでに読み込むモジュールの時間（新しいプロセスで repeat 回測った中央値）
+def cold_start(view, repeat=3):
+    root = os.path.dirname(APP_PATH)
+    module = os.path.splitext(os.path.basename(APP_PATH))[0]
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", _COLD_START, module, VIEWS[view]],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        "view": view,
+        "streamlit_ms": statistics.median(r["streamlit_ms"] for r in runs),
+        "import_ms": statistics.median(r["import_ms"] for r in runs),
+        "modules": runs[-1]["modules"],
+        "heavy": runs[-1]["heavy"],
+    }
+
+
+# 再実行ごとにエントリポイントのモジュールレベルの文を実行する時間
+# （Streamlit はコンパイル済みのスクリプトを再利用するので、コンパイルは含めない。
+# モジュールは読み込み済みの状態で測り、main() は呼ばない）
+def rerun_overhead(repeat=200):
+    with open(APP_PATH, encoding="utf-8") as f:
+        code = compile(f.read(), APP_PATH, "exec")
+    if os.path.dirname(APP_PATH) not in sys.path:
+        sys.path.insert(0, os.path.dirname(APP_PATH))
+    exec(code, {"__name__": "__bench__"})
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        exec(code, {"__name__": "__bench__"})
+        seconds.append(time.perf_counter() - start)
+    return _latency_summary(seconds)
+
+
+def startup_benchmark(repeat=3):
+    return {
+        "cold_start": [cold_start(view, repeat) for view in VIEWS],
+        "rerun": rerun_overhead(),
+    }
+
+
+def _environment():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "streamlit": st.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def run(pages=PAGES, sessions=1, rows=(1000, 10000, 100000), saves=20, cold_starts=3):
+    return {
+        "environment": _environment(),
+        "startup": startup_benchmark(cold_starts) if cold_starts else None,
+        "payload": payloads(pages),
+        "sessions": session_benchmark(sessions) if sessions else [],
+        "saves": [save_benchmark(n, saves) for n in rows],
+    }
+
+
+def _print_results(results):
+    if results["startup"]:
+        print(f"{'view':<14} {'streamlit ms':>12} {'import ms':>10} {'modules':>8}  heavy")
+        for result in results["startup"]["cold_start"]:
+            print(
+                f"{result['view']:<14} {result['streamlit_ms']:>12.1f} {result['import_ms']:>10.1f}"
+                f" {result['modules']:>8}  {', '.join(result['heavy']) or '-'}"
+            )
+        rerun = results["startup"]["rerun"]
+        print(f"rerun overhead: p50 {rerun['p50_ms']:.3f} ms / p99 {rerun['p99_ms']:.3f} ms")
+        print()
+
+    print(f"{'page':<6} {'elements':>8} {'bytes':>8}")
+    for result in results["payload"]:
+        print(f"{result['page']:<6} {result['elements']:>8} {result['bytes']:>8}  {result['name']}")
+    print(f"{'total':<6} {sum(r['elements'] for r in results['payload']):>8} {sum(r['bytes'] for r in results['payload']):>8}")
+
+    if results["sessions"]:
+        print()
+        print(f"{'page':<6} {'run ms':>8} {'max ms':>8} {'elements':>8} {'bytes':>8} {'state':>8}")
+        for result in results["sessions"]:
+            print(
+                f"{result['page']:<6} {result['run_ms_p50']:>8.1f} {result['run_ms_max']:>8.1f}"
+                f" {result['elements']:>8} {result['bytes']:>8} {result['session_state_bytes']:>8}  {result['name']}"
+            )
+
+    if results["saves"]:
+        print()
+        print(f"{'rows':>8} {'save p50':>9} {'save p99':>9} {'save max':>9} {'commit ms':>10} {'load ms':>9}")
+        for result in results["saves"]:
+            save = result["save"]
+            print(
+                f"{result['rows']:>8} {save['p50_ms']:>9.2f} {save['p99_ms']:>9.2f}"
+                f" {save['max_ms']:>9.2f} {result['commit_ms']:>10.1f} {result['load_ms']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ページの描画と回答の保存を計測します")
+    parser.add_argument("pages", nargs="*", type=int, help="送信量を計測するページ番号（省略時はすべて）")
+    parser.add_argument("--sessions", type=int, default=1, help="通しで回答するセッション数（0 で省略）")
+    parser.add_argument("--rows", type=int, nargs="*", default=[1000, 10000, 100000], help="save_data を計測する既存の回答数")
+    parser.add_argument("--saves", type=int, default=20, help="既存の回答数ごとの save_data の回数")
+    parser.add_argument("--cold-starts", type=int, default=3, help="コールドスタートを測るプロセスの起動回数（0 で省略）")
+    parser.add_argument("--json", help="結果を JSON で書き出すパス（- で標準出力）")
+    args = parser.parse_args()
+
+    # save_data の計測ではアプリのモジュールを streamlit run なしで使うので、その警告は出さない
+    logging.disable(logging.WARNING)
+    results = run(args.pages or list(PAGES), args.sessions, args.rows, args.saves, args.cold_starts)
+    if args.json == "-":
+        json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        _print_results(results)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,122 @@
+# 回答途中のチェックポイント保存
+#
+# ページを移動するたびに途中までの回答を SQLite（WAL モード）に保存し、
+# URL のクエリパラメータに載せた再開用トークンで復元できるようにする。
+# 接続が切れたりサーバーが再起動しても、同じ URL を開けば続きから回答できる。
+# 保存するのは前回のチェックポイントから変わった項目だけなので、同時に
+# 多数のセッションが書き込んでも1回の書き込みは小さく済む。
+#
+# 回答を送信せずに離れたセッションのチェックポイントは残り続けるので、max_age（秒）を
+# 指定したストアは、保存のついでに purge_interval 秒に1回、max_age より古い
+# チェックポイントを削除する。アプリでは SURVEY_CHECKPOINT_MAX_AGE_DAYS（既定 30 日）。
+# 手動で削除する場合:
+#
+#   python -m survey.checkpoint employee_survey_data.checkpoints.sqlite3 --max-age-days 30
+import json
+import secrets
+import sqlite3
+import threading
+import time
+
+_MISSING = object()
+
+# 古いチェックポイントを削除する間隔（秒）
+PURGE_INTERVAL = 3600
+
+
+def new_token():
+    return secrets.token_urlsafe(16)
+
+
+# 前回保存した内容から変わった項目だけを返す
+def changed_fields(responses, saved):
+    return {key: value for key, value in responses.items() if saved.get(key, _MISSING) != value}
+
+
+class CheckpointStore:
+    def __init__(self, path, max_age=None, purge_interval=PURGE_INTERVAL):
+        self.path = path
+        self.max_age = max_age
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._purged_at = 0
+
+    # スレッドごとに接続を持つ（Streamlit のセッションは別スレッドで動く）
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                " token TEXT PRIMARY KEY, page INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoint_fields ("
+                " token TEXT NOT NULL, field TEXT NOT NULL, value TEXT,"
+                " PRIMARY KEY (token, field))"
+            )
+            self._local.conn = conn
+        return conn
+
+    # 現在のページと変更された項目を保存する
+    def save(self, token, page, changed):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO checkpoints (token, page, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(token) DO UPDATE SET page = excluded.page, updated_at = excluded.updated_at",
+                (token, page, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO checkpoint_fields (token, field, value) VALUES (?, ?, ?)"
+                " ON CONFLICT(token, field) DO UPDATE SET value = excluded.value",
+                [(token, field, json.dumps(value, ensure_ascii=False)) for field, value in changed.items()],
+            )
+        if self.max_age is not None and time.time() - self._purged_at > self.purge_interval:
+            self._purged_at = time.time()
+            self.purge(self.max_age)
+
+    # (ページ, 回答) を返す。チェックポイントがなければ None
+    def load(self, token):
+        conn = self._connection()
+        row = conn.execute("SELECT page FROM checkpoints WHERE token = ?", (token,)).fetchone()
+        if row is None:
+            return None
+        fields = conn.execute("SELECT field, value FROM checkpoint_fields WHERE token = ?", (token,))
+        return row[0], {field: json.loads(value) for field, value in fields}
+
+    def delete(self, token):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM checkpoint_fields WHERE token = ?", (token,))
+            conn.execute("DELETE FROM checkpoints WHERE token = ?", (token,))
+
+    # 一定期間更新のないチェックポイントを削除する
+    def purge(self, max_age_seconds):
+        conn = self._connection()
+        cutoff = time.time() - max_age_seconds
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM checkpoint_fields WHERE token IN"
+                " (SELECT token FROM checkpoints WHERE updated_at < ?)",
+                (cutoff,),
+            )
+            deleted = conn.execute("DELETE FROM checkpoints WHERE updated_at < ?", (cutoff,)).rowcount
+        return deleted
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="一定期間更新のない回答途中のチェックポイントを削除します")
+    parser.add_argument("store", help="チェックポイント（SQLite）のパス")
+    parser.add_argument("--max-age-days", type=float, default=30, help="この日数より前に更新されたものを削除する")
+    args = parser.parse_args()
+
+    deleted = CheckpointStore(args.store).purge(args.max_age_days * 86400)
+    print(f"{deleted} 件のチェックポイントを削除しました")
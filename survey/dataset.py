@@ -0,0 +1,196 @@
+# 型付きの列指向データセット（Parquet）
+#
+# 回答は送信時には追記専用ログ（CSV）に書き、まとめて Parquet のデータセットへ
+# 移し替える。データセットは調査回（wave）と回答日（date）でパーティション
+# 分割し、列ごとに明示した型で保存する。評価値は Int8、基本情報の選択肢は
+# 調査定義の選択肢をカテゴリとするカテゴリ型になるので、CSV と比べて
+# ファイルが小さく、読み込み時の型推論も不要になる。必要な列だけを読める。
+import glob
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PARTITION_COLUMNS = ["wave", "date"]
+
+# パーティション列は文字列として読む（"2025" のような値を整数と推論させない）
+PARTITIONING = ds.partitioning(pa.schema([(c, pa.string()) for c in PARTITION_COLUMNS]), flavor="hive")
+
+
+# 調査定義から保存列の型を作る
+def response_dtypes(schema):
+    dtypes = {}
+    for question in schema.demographics:
+        if question.dtype == "category":
+            dtypes[question.key] = pd.CategoricalDtype(question.options)
+        else:
+            dtypes[question.key] = question.dtype
+    for response_key in schema.questions:
+        dtypes[response_key] = "Int8"
+    for reason in schema.reasons.values():
+        item_column, rating_column, reason_column = reason.columns
+        scale = schema.section(reason.section)[0].scale
+        dtypes[item_column] = "string"
+        dtypes[rating_column] = pd.CategoricalDtype(scale.labels)
+        dtypes[reason_column] = "string"
+    dtypes["wave"] = "string"
+    dtypes["timestamp"] = "datetime64[ns]"
+    return dtypes
+
+
+# DataFrame の列を指定の型にそろえる（変換できない値は欠損値になる）
+def apply_dtypes(df, dtypes):
+    df = df.copy()
+    for column, dtype in dtypes.items():
+        if column not in df.columns or df[column].dtype == dtype:
+            continue
+        if dtype == "datetime64[ns]":
+            if pd.api.types.is_datetime64_any_dtype(df[column]):
+                continue
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        elif isinstance(dtype, str) and dtype.startswith(("Int", "UInt", "Float")):
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype(dtype)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("string").astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+class ResponseDataset:
+    def __init__(self, root, dtypes, default_wave="default"):
+        self.root = root
+        self.dtypes = dict(dtypes)
+        self.default_wave = default_wave
+        self._schemas = {}
+
+    def files(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.root), "**", "*.parquet"), recursive=True))
+
+    # データセットの版（読み込みキャッシュのキー）
+    def version(self):
+        return tuple((path, os.stat(path).st_mtime_ns) for path in self.files())
+
+    # 回答をデータセットに書き足す（既存ファイルは書き換えない）
+    # name を指定すると、各パーティションのファイル名を name-<連番>.parquet にする。
+    # 同じ回答を同じ name でもう一度書くと、前回のファイルを上書きする
+    def write(self, df, name=None):
+        if df.empty:
+            return 0
+        extra = [c for c in df.columns if c not in self.dtypes and c not in PARTITION_COLUMNS]
+        df = apply_dtypes(df.reindex(columns=list(self.dtypes) + extra), self.dtypes)
+        df["wave"] = df["wave"].fillna(self.default_wave)
+        df["date"] = df["timestamp"].dt.strftime("%Y-%m-%d").fillna("unknown")
+        options = {} if name is None else {"basename_template": name + "-{i}.parquet",
+                                           "existing_data_behavior": "overwrite_or_ignore"}
+        df.to_parquet(self.root, partition_cols=PARTITION_COLUMNS, index=False, **options)
+        return len(df)
+
+    # データセット全体の列（ファイルごとの列の和集合とパーティション列）
+    # 列は後から増えることがあり、増えた列は以後に書いたファイルにしかない。
+    # ファイルは書き換えないので、読んだスキーマはパスごとに覚えておく
+    def schema(self):
+        schemas = []
+        for path in self.files():
+            if path not in self._schemas:
+                self._schemas[path] = pq.read_schema(path)
+            schemas.append(self._schemas[path])
+        return pa.unify_schemas(schemas + [PARTITIONING.schema], promote_options="permissive")
+
+    # 回答を読む。columns で列を、filters（pyarrow 形式）で行を絞り込める
+    # 例: read(["nps", "事業部"], filters=[("wave", "=", "2025")])
+    # データセットにない列（まだ移し替えていない新しい列など）は欠損値になる
+    def read(self, columns=None, filters=None):
+        columns = None if columns is None else list(columns)
+        if not self.files():
+            return self.empty(columns)
+        schema = self.schema()
+        names = schema.names if columns is None else [c for c in columns if c in schema.names]
+        dataset = ds.dataset(self.root, schema=schema, format="parquet", partitioning=PARTITIONING)
+        expression = None if filters is None else pq.filters_to_expression(filters)
+        df = dataset.to_table(columns=names, filter=expression).to_pandas()
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        elif "date" in df.columns:
+            df = df.drop(columns="date")
+        return apply_dtypes(df, self.dtypes)
+
+    # 回答を batch_size 件程度ずつ読む（データセット全体を一度に読み込まない）
+    # columns / filters は read と同じ。データセットにない列は欠損値になる。
+    # ファイルは1つずつ開いて閉じる（データセットのスキャナーはファイルごとの
+    # メタデータを保持し続け、ファイル数に比例してメモリが増えるため）。
+    # パーティションごとの小さなファイルは batch_size 件までまとめてから変換する
+    def iter_batches(self, columns=None, filters=None, batch_size=65536):
+        if not self.files():
+            return
+        columns = list(columns or self.dtypes)
+        dataset = ds.dataset(self.root, format="parquet", partitioning=PARTITIONING)
+        expression = None if filters is None else pq.filters_to_expression(filters)
+        pending, rows = [], 0
+        for fragment in dataset.get_fragments(filter=expression):
+            partition = ds.get_partition_keys(fragment.partition_expression)
+            with pq.ParquetFile(fragment.path) as f:
+                names = [c for c in columns if c in f.schema_arrow.names]
+                for batch in f.iter_batches(batch_size=batch_size, columns=names):
+                    table = pa.Table.from_batches([batch])
+                    for key, value in partition.items():
+                        table = table.append_column(key, pa.array([value] * table.num_rows, pa.string()))
+                    if expression is not None:
+                        table = table.filter(expression)
+                    pending.append(table)
+                    rows += table.num_rows
+                    if rows >= batch_size:
+                        yield self._frame(pending, columns)
+                        pending, rows = [], 0
+        if rows:
+            yield self._frame(pending, columns)
+
+    def _frame(self, tables, columns):
+        df = pa.concat_tables(tables, promote_options="permissive").to_pandas()
+        return apply_dtypes(df.reindex(columns=columns), self.dtypes)
+
+    def empty(self, columns=None):
+        columns = list(self.dtypes) if columns is None else columns
+        return apply_dtypes(pd.DataFrame(columns=columns), self.dtypes)
+
+    # データセットの回答と、まだログにある回答（型なし）を1つにまとめる
+    def combine(self, stored, recent):
+        recent = apply_dtypes(recent, self.dtypes)
+        frames = [df for df in (stored, recent) if not df.empty]
+        if not frames:
+            return stored
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+# 回答ログの内容をデータセットへ移し替え、移した件数を返す
+#
+# 切り離したセグメントは1つずつ、セグメント名から決まるファイル名で書いてから消す。
+# 書いた後・消す前に止まっても、次の移し替えで同じセグメントを同じファイル名に
+# 書き直すだけなので、回答がデータセットに二重に入ることはない
+def compact(log, dataset):
+    count = 0
+    for path in log.detach():
+        name = os.path.basename(path).removesuffix(".compacting")
+        count += dataset.write(log.read([path]), name=name)
+        os.remove(path)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog
+
+    parser = argparse.ArgumentParser(description="回答ログを型付きの Parquet データセットへ移し替えます")
+    parser.add_argument("log", help="回答ログ（CSV）のパス")
+    parser.add_argument("dataset", help="出力先の Parquet データセットのディレクトリ")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    log = AppendOnlyLog(args.log, schema.columns)
+    count = compact(log, ResponseDataset(args.dataset, response_dtypes(schema)))
+    print(f"{count} 件を {args.dataset} に移し替えました")
@@ -0,0 +1,206 @@
+# キードライバー分析（どの満足度項目が NPS・総合満足度・定着意向を左右しているか）
+#
+# 回答行列（satisfaction_* の項目 × 回答者）と目的変数（総合評価）から、
+# 項目ごとに次の3つを求める。
+#
+# - correlation: 目的変数との相関係数
+# - beta:        標準化した重回帰の係数（他の項目を一定にしたときの影響）
+# - weight:      相対重要度（Johnson の relative weights。項目どうしの相関を
+#                直交化して R² を項目に配分したもので、合計が R² になる）
+#
+# 計算はすべて「項目と目的変数をまとめた行列の共分散行列」からの線形代数で、
+# 回答者数に比例するのは行列積1回だけになる。信頼区間はブートストラップで、
+# 復元抽出した回答について同じ計算を繰り返す。ブートストラップは
+# プロセスプールで並列に計算し、乱数はチャンクごとに固定のシードから作るので、
+# プロセス数を変えても結果は変わらない。
+#
+#   python -m survey.drivers --dataset employee_survey_data.parquet --bootstrap 500
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from survey.analytics import rating_matrix
+
+OUTCOMES = ("nps", "overall_satisfaction", "intention_to_stay")
+
+BOOTSTRAP = 200
+CONFIDENCE = 0.95
+
+# ブートストラップ1タスクあたりの回数（プロセスに配る単位。乱数のシードもこの単位で分ける）
+BOOTSTRAP_CHUNK = 25
+
+# この回答数より少なければプロセスプールを使わずに計算する
+PARALLEL_MIN_ROWS = 5_000
+
+# 固有値がこれ以下の方向は、項目どうしが線形従属とみなして除く（疑似逆行列）
+EIGENVALUE_TOLERANCE = 1e-10
+
+
+# 分析に必要な列
+def analysis_columns(schema, outcomes=OUTCOMES):
+    return [q.response_key for q in schema.satisfaction] + [o for o in outcomes if o in schema.questions]
+
+
+# 項目と目的変数の行列（目的変数と項目がすべてそろった回答だけ）
+def _matrix(df, schema, outcomes):
+    items = list(schema.satisfaction)
+    targets = [schema.questions[o] for o in outcomes if o in schema.questions]
+    matrix = np.hstack([rating_matrix(df, items), rating_matrix(df, targets)])
+    return matrix[~np.isnan(matrix).any(axis=1)], items, targets
+
+
+# 共分散行列（行列積は入力の型で計算し、結果は float64 にする）
+def _covariance(matrix):
+    centered = matrix - matrix.mean(axis=0)
+    return (centered.T @ centered).astype(np.float64) / max(len(matrix) - 1, 1)
+
+
+# 共分散行列から (相関係数, 標準化偏回帰係数, 相対重要度, R²) を求める
+# 項目は先頭 p 列、目的変数は残りの列。分散が 0 の項目は他と無相関として扱う
+def _statistics(covariance, p):
+    sd = np.sqrt(np.diag(covariance))
+    scale = np.where(sd > 0, sd, np.inf)
+    corr = covariance / np.outer(scale, scale)
+    np.fill_diagonal(corr, 1.0)
+    rxx, rxy = corr[:p, :p], corr[:p, p:]
+
+    eigenvalues, vectors = np.linalg.eigh(rxx)
+    keep = eigenvalues > EIGENVALUE_TOLERANCE
+    eigenvalues, vectors = eigenvalues[keep], vectors[:, keep]
+    projected = vectors.T @ rxy
+    beta = vectors @ (projected / eigenvalues[:, None])
+    # rxx の平方根 Λ = V √λ Vᵀ で項目を直交化し、直交化した変数の係数の2乗を Λ² で配分する
+    half = (vectors * np.sqrt(eigenvalues)) @ vectors.T
+    orthogonal = vectors @ (projected / np.sqrt(eigenvalues)[:, None])
+    weights = (half ** 2) @ (orthogonal ** 2)
+    r2 = np.sum(rxy * beta, axis=0)
+    return rxy, beta, weights, r2
+
+
+# ワーカープロセスごとに1回だけ受け取る回答行列
+_shared = {}
+
+
+def _init_worker(matrix, p):
+    _shared["matrix"] = matrix
+    _shared["p"] = p
+
+
+# ブートストラップを replicates 回計算する（結果は [相関, 係数, 重要度] と R² の配列）
+# 復元抽出した行を取り出して共分散を計算し直す。1回あたりの計算は回答数 × 列数² の行列積1回
+def _bootstrap_chunk(seed, replicates, matrix=None, p=None):
+    matrix = _shared["matrix"] if matrix is None else matrix
+    p = _shared["p"] if p is None else p
+    rng = np.random.default_rng(seed)
+    n = len(matrix)
+    items, r2s = [], []
+    for _ in range(replicates):
+        corr, beta, weight, r2 = _statistics(_covariance(matrix[rng.integers(0, n, n)]), p)
+        items.append(np.stack([corr, beta, weight]))
+        r2s.append(r2)
+    return np.stack(items), np.stack(r2s)
+
+
+def _bootstrap(matrix, p, bootstrap, seed, workers):
+    # 中心化してから float32 にする（評価値の範囲なら精度は足り、行列積とプロセスへの転送が半分で済む）
+    matrix = (matrix - matrix.mean(axis=0)).astype(np.float32)
+    chunks = [min(BOOTSTRAP_CHUNK, bootstrap - start) for start in range(0, bootstrap, BOOTSTRAP_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers == 1 or len(matrix) < PARALLEL_MIN_ROWS:
+        results = [_bootstrap_chunk(s, r, matrix, p) for s, r in zip(seeds, chunks)]
+    else:
+        # Streamlit のサーバーはスレッドを持つので、fork ではなく spawn で起動する
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(matrix, p),
+        ) as pool:
+            results = list(pool.map(_bootstrap_chunk, seeds, chunks))
+    return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+
+# キードライバー分析
+# 戻り値は {"summary": 目的変数ごとの回答数・R², "drivers": 目的変数 × 項目の表}
+# bootstrap=0 なら信頼区間は計算しない。workers はプロセス数（None: CPU 数、1: 並列化しない）
+def analyze(df, schema, outcomes=OUTCOMES, bootstrap=BOOTSTRAP, confidence=CONFIDENCE, seed=0, workers=None):
+    matrix, items, targets = _matrix(df, schema, outcomes)
+    p = len(items)
+    summary = pd.DataFrame({"outcome": [t.response_key for t in targets], "responses": len(matrix)})
+    columns = ["outcome", "category", "item", "question", "satisfaction", "correlation", "beta", "weight", "share"]
+    if len(matrix) <= p + 1 or not targets:
+        summary["r2"] = np.nan
+        return {"summary": summary, "drivers": pd.DataFrame(columns=columns)}
+
+    corr, beta, weight, r2 = _statistics(_covariance(matrix), p)
+    summary["r2"] = r2
+    means = matrix[:, :p].mean(axis=0)
+    frames = []
+    for j, target in enumerate(targets):
+        frames.append(pd.DataFrame({
+            "outcome": target.response_key,
+            "category": [q.category for q in items],
+            "item": [q.key for q in items],
+            "question": [q.text for q in items],
+            "satisfaction": means,
+            "correlation": corr[:, j],
+            "beta": beta[:, j],
+            "weight": weight[:, j],
+            "share": weight[:, j] / r2[j] if r2[j] > 0 else np.nan,
+        }))
+    drivers = pd.concat(frames, ignore_index=True)
+
+    if bootstrap:
+        samples, r2_samples = _bootstrap(matrix, p, bootstrap, seed, workers)
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+        for k, name in enumerate(("correlation", "beta", "weight")):
+            # (統計量, 項目, 目的変数) を目的変数ごとに並べた表の順にそろえる
+            drivers[f"{name}_low"] = low[k].T.ravel()
+            drivers[f"{name}_high"] = high[k].T.ravel()
+        r2_low, r2_high = np.nanpercentile(r2_samples, [tail, 100 - tail], axis=0)
+        summary["r2_low"], summary["r2_high"] = r2_low, r2_high
+    return {"summary": summary, "drivers": drivers}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog, load_responses
+
+    parser = argparse.ArgumentParser(description="満足度の項目が NPS・総合満足度・定着意向に与える影響を分析します")
+    parser.add_argument("--log", default="employee_survey_data.csv", help="回答ログ（CSV）のパス")
+    parser.add_argument("--dataset", default="employee_survey_data.parquet", help="Parquet データセットのディレクトリ")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    parser.add_argument("--outcome", action="append", help="目的変数（繰り返し指定可。既定は nps / overall_satisfaction / intention_to_stay）")
+    parser.add_argument("--bootstrap", type=int, default=BOOTSTRAP, help="ブートストラップの回数（0 で信頼区間なし）")
+    parser.add_argument("--workers", type=int, help="ブートストラップのプロセス数（既定は CPU 数）")
+    parser.add_argument("--seed", type=int, default=0, help="ブートストラップの乱数のシード")
+    parser.add_argument("--top", type=int, default=10, help="目的変数ごとに表示する項目数")
+    parser.add_argument("--csv", help="項目ごとの結果を書き出す CSV のパス")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    outcomes = tuple(args.outcome or OUTCOMES)
+    log = AppendOnlyLog(args.log, schema.columns)
+    df = load_responses(log, ResponseDataset(args.dataset, response_dtypes(schema)), analysis_columns(schema, outcomes))
+
+    start = time.perf_counter()
+    result = analyze(df, schema, outcomes, args.bootstrap, seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    print(result["summary"].to_string(index=False))
+    for outcome, table in result["drivers"].groupby("outcome", sort=False):
+        print(f"\n{outcome}（相対重要度の大きい順）")
+        columns = [c for c in ("category", "item", "correlation", "beta", "weight", "weight_low", "weight_high", "share") if c in table]
+        print(table.nlargest(args.top, "weight")[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\n{len(df)} 件の回答を {elapsed:.1f} 秒で分析しました")
+    if args.csv:
+        result["drivers"].to_csv(args.csv, index=False, encoding="utf-8-sig")
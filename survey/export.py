@@ -0,0 +1,239 @@
+# 回答データのエクスポート
+#
+# Parquet データセットと回答ログの回答を chunk_size 件ずつ読み、期間
+# （timestamp）と属性値で絞り込みながら CSV / Excel / JSON Lines / Parquet
+# に書き出す。一度に持つのはチャンク1つ分だけなので、回答数が増えても
+# メモリ使用量は変わらない。期間の指定は回答日のパーティションの絞り込みにも
+# 使うので、対象外の日のファイルは読まない。
+# CSV は Excel で開けるよう、BOM 付き UTF-8 や Shift_JIS（cp932）でも書ける。
+#
+#   python -m survey.export responses.csv --since 2025-04-01 --until 2025-05-01 --encoding utf-8-bom
+#   python -m survey.export responses.xlsx --segment 事業部=営業部 --segment 事業部=開発部
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from survey.dataset import apply_dtypes
+
+try:
+    import openpyxl
+except ImportError:  # Excel 形式の書き出しにだけ必要
+    openpyxl = None
+
+CHUNK_SIZE = 50_000
+
+FORMATS = ("csv", "xlsx", "jsonl", "parquet")
+
+# CSV の文字コード（Shift_JIS は Windows の Excel と同じ cp932。表せない文字は ? になる）
+ENCODINGS = {
+    "utf-8": "utf-8",
+    "utf-8-bom": "utf-8-sig",
+    "shift_jis": "cp932",
+}
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Excel の1シートの最大行数（見出し行を含む）
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _timestamp(value):
+    return None if value is None or value == "" else pd.Timestamp(value)
+
+
+# チャンクを期間と属性値で絞り込む
+# since 以上 until 未満、segments は {列: 値の並び}（列ごとにいずれかに一致、列どうしは AND）
+def _filter(df, since, until, segments):
+    keep = np.ones(len(df), dtype=bool)
+    if since is not None or until is not None:
+        timestamps = pd.to_datetime(df["timestamp"], errors="coerce")
+        if since is not None:
+            keep &= (timestamps >= since).to_numpy(dtype=bool, na_value=False)
+        if until is not None:
+            keep &= (timestamps < until).to_numpy(dtype=bool, na_value=False)
+    for column, values in segments.items():
+        keep &= df[column].astype("string").isin([str(v) for v in values]).to_numpy(dtype=bool, na_value=False)
+    return df if keep.all() else df[keep]
+
+
+# 回答日のパーティションの絞り込み（pyarrow 形式）
+def _date_filters(since, until):
+    filters = []
+    if since is not None:
+        filters.append(("date", ">=", since.strftime("%Y-%m-%d")))
+    if until is not None:
+        filters.append(("date", "<=", until.strftime("%Y-%m-%d")))
+    return filters or None
+
+
+# 条件に合う回答を chunk_size 件程度ずつ返す（データセットの回答、ログの回答の順）
+# columns を指定するとその列だけを返す
+def iter_responses(log, dataset=None, columns=None, since=None, until=None, segments=None, chunk_size=CHUNK_SIZE):
+    since, until = _timestamp(since), _timestamp(until)
+    segments = {column: values for column, values in (segments or {}).items() if values}
+    columns = list(columns or log.columns)
+    needed = columns + [c for c in ["timestamp", *segments] if c not in columns]
+
+    sources = [log.read_chunks(chunk_size, needed)]
+    if dataset is not None:
+        # ログの回答はデータセットと同じ型にそろえる
+        typed = (apply_dtypes(df, dataset.dtypes) for df in sources[0])
+        sources = [dataset.iter_batches(needed, _date_filters(since, until), chunk_size), typed]
+    for source in sources:
+        for df in source:
+            df = _filter(df, since, until, segments)
+            if len(df):
+                yield df[columns]
+
+
+def write_csv(chunks, out, encoding="utf-8"):
+    text = io.TextIOWrapper(out, encoding=ENCODINGS.get(encoding, encoding), errors="replace", newline="")
+    count = 0
+    try:
+        for df in chunks:
+            df.to_csv(text, header=count == 0, index=False, lineterminator="\n", date_format="%Y-%m-%d %H:%M:%S")
+            count += len(df)
+        text.flush()
+    finally:
+        text.detach()
+    return count
+
+
+# to_json は文字列全体を一度に作るので、JSONL_ROWS 行ずつに分けて書く
+JSONL_ROWS = 5_000
+
+
+def write_jsonl(chunks, out):
+    count = 0
+    for df in chunks:
+        for start in range(0, len(df), JSONL_ROWS):
+            body = df.iloc[start:start + JSONL_ROWS].to_json(orient="records", lines=True, force_ascii=False, date_format="iso")
+            out.write(body.encode("utf-8"))
+            if body and not body.endswith("\n"):
+                out.write(b"\n")
+        count += len(df)
+    return count
+
+
+def write_parquet(chunks, out):
+    writer = None
+    count = 0
+    try:
+        for df in chunks:
+            if writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                writer = pq.ParquetWriter(out, table.schema)
+            else:
+                table = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+            count += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        # 該当する回答がない場合も、読める（空の）Parquet ファイルにする
+        pq.write_table(pa.table({}), out)
+    return count
+
+
+def _excel_value(value):
+    if value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+# 書き込み専用モードの openpyxl で1行ずつ書く（シートの行数の上限を超えたら次のシートへ）
+def write_xlsx(chunks, out):
+    if openpyxl is None:
+        raise RuntimeError("Excel 形式で書き出すには openpyxl をインストールしてください")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet, rows, count = None, EXCEL_MAX_ROWS, 0
+    for df in chunks:
+        header = list(df.columns)
+        for record in df.astype(object).itertuples(index=False, name=None):
+            if rows >= EXCEL_MAX_ROWS:
+                sheet = workbook.create_sheet(f"回答{len(workbook.worksheets) + 1}")
+                sheet.append(header)
+                rows = 1
+            sheet.append([_excel_value(value) for value in record])
+            rows += 1
+        count += len(df)
+    if sheet is None:
+        workbook.create_sheet("回答1")
+    workbook.save(out)
+    return count
+
+
+# chunks を fmt の形式で out（バイナリのファイルオブジェクト）に書き出し、件数を返す
+# encoding は CSV の文字コード（utf-8 / utf-8-bom / shift_jis）
+def export(chunks, out, fmt, encoding="utf-8"):
+    if fmt == "csv":
+        return write_csv(chunks, out, encoding)
+    if fmt == "jsonl":
+        return write_jsonl(chunks, out)
+    if fmt == "parquet":
+        return write_parquet(chunks, out)
+    if fmt == "xlsx":
+        return write_xlsx(chunks, out)
+    raise ValueError(f"未対応の形式です: {fmt}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import sys
+
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog
+
+    parser = argparse.ArgumentParser(description="回答データを絞り込んで CSV / Excel / JSON Lines / Parquet に書き出します")
+    parser.add_argument("output", help="出力ファイルのパス（- で標準出力）")
+    parser.add_argument("--format", choices=FORMATS, help="出力形式（省略時は拡張子から判断）")
+    parser.add_argument("--encoding", choices=list(ENCODINGS), default="utf-8", help="CSV の文字コード")
+    parser.add_argument("--since", help="この日時以降の回答（例: 2025-04-01）")
+    parser.add_argument("--until", help="この日時より前の回答（例: 2025-05-01）")
+    parser.add_argument("--segment", action="append", default=[], metavar="列=値", help="属性値で絞り込む（繰り返し指定可）")
+    parser.add_argument("--columns", help="書き出す列（カンマ区切り）")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="1回に読む件数")
+    parser.add_argument("--log", default="employee_survey_data.csv", help="回答ログ（CSV）のパス")
+    parser.add_argument("--dataset", default="employee_survey_data.parquet", help="Parquet データセットのディレクトリ")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    args = parser.parse_args()
+
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error("--format を指定してください（csv / xlsx / jsonl / parquet）")
+    segments = {}
+    for spec in args.segment:
+        column, _, value = spec.partition("=")
+        segments.setdefault(column, []).append(value)
+
+    schema = load_schema(args.schema)
+    log = AppendOnlyLog(args.log, schema.columns)
+    dataset = ResponseDataset(args.dataset, response_dtypes(schema))
+    unknown = [c for c in segments if c not in schema.columns]
+    if unknown:
+        parser.error(f"調査定義にない列です: {', '.join(unknown)}")
+    chunks = iter_responses(
+        log, dataset, args.columns.split(",") if args.columns else None,
+        args.since, args.until, segments, args.chunk_size,
+    )
+    if args.output == "-":
+        count = export(chunks, sys.stdout.buffer, fmt, args.encoding)
+    else:
+        with open(args.output, "wb") as out:
+            count = export(chunks, out, fmt, args.encoding)
+    print(f"{count} 件を {args.output} に書き出しました", file=sys.stderr)
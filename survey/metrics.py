@@ -0,0 +1,226 @@
+# 実行時メトリクスの計測と出力
+#
+# スクリプトの再実行（ページごと）、各ページの描画関数、load_data / save_data
+# の所要時間と、再実行ごとに送った要素数、アクティブなセッション数を記録する。
+# 記録は固定バケットのヒストグラムへの加算だけなので、本番で常時有効にしておける。
+# 出力は Prometheus のテキスト形式で、ローカルの HTTP エンドポイント
+# （/metrics）か、一定間隔で書き換えるファイル（node_exporter の textfile
+# collector など）のどちらか、または両方を使う。
+#
+#   SURVEY_METRICS_PORT=9464 streamlit run streamlit_survey.py
+#   SURVEY_METRICS_FILE=/var/lib/node_exporter/survey.prom streamlit run streamlit_survey.py
+#
+# 既知の制限: Streamlit にはブラウザへ送るメッセージ（ForwardMsg）を観察する公開の
+# 方法がないので、要素数は再実行のあいだだけ ScriptRunContext の非公開の _enqueue を
+# 数える関数に差し替えて数えている。Streamlit の更新で _enqueue がなくなった場合は
+# 警告をログに出して要素数の記録だけをやめ、所要時間とセッション数は記録し続ける。
+# 送ったメッセージのバイト数は測っていない。
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# 所要時間（秒）と要素数のバケット境界
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ELEMENT_BUCKETS = (10, 25, 50, 100, 200, 400, 800, 1600)
+
+# この秒数のあいだ再実行のないセッションはアクティブとみなさない
+SESSION_TIMEOUT_SECONDS = 300
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+logger = logging.getLogger(__name__)
+
+
+# ラベル1つで分けた累積ヒストグラム
+class Histogram:
+    def __init__(self, name, help, label, buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    # 呼び出し側（Metrics）のロックの中で呼ぶ
+    def observe(self, label_value, value):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in sorted(self._series.items()):
+            label = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label}}} {total}")
+            lines.append(f"{self.name}_count{{{label}}} {cumulative}")
+        return lines
+
+
+class Metrics:
+    def __init__(self, session_timeout=SESSION_TIMEOUT_SECONDS):
+        self.session_timeout = session_timeout
+        self.rerun_seconds = Histogram(
+            "survey_rerun_seconds", "スクリプト1回の再実行の所要時間（ページ別）", "page", TIME_BUCKETS
+        )
+        self.rerun_elements = Histogram(
+            "survey_rerun_elements", "スクリプト1回の再実行で送った要素数（ページ別）", "page", ELEMENT_BUCKETS
+        )
+        self.function_seconds = Histogram(
+            "survey_function_seconds", "描画関数・load_data・save_data の所要時間", "function", TIME_BUCKETS
+        )
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._counts_elements = True
+
+    def _observe(self, histogram, label_value, value):
+        with self._lock:
+            histogram.observe(label_value, value)
+
+    # 関数の所要時間を記録するデコレーター（例外で抜けた場合も記録する）
+    def timed(self, func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._observe(self.function_seconds, name, time.perf_counter() - start)
+
+        return wrapper
+
+    # スクリプト1回の再実行を計測する
+    # 所要時間と、この再実行でブラウザへ送ったメッセージ（要素）の数を page のラベルで記録する。
+    # st.rerun() などで中断された場合も記録する。
+    # st.fragment の中でも使い、フラグメントだけの再実行を記録する（アプリ全体の再実行の
+    # 中で描画されたときは、外側の再実行に含めて数えるので記録しない）
+    @contextlib.contextmanager
+    def rerun(self, page):
+        ctx = get_script_run_ctx()
+        if ctx is None or getattr(self._local, "active", False):
+            yield
+            return
+        elements = 0
+        enqueue = getattr(ctx, "_enqueue", None) if self._counts_elements else None
+        if enqueue is None and self._counts_elements:
+            self._counts_elements = False
+            logger.warning("ScriptRunContext._enqueue がないため、再実行ごとの要素数は記録しません")
+
+        def counting_enqueue(msg):
+            nonlocal elements
+            if msg.HasField("delta"):
+                elements += 1
+            enqueue(msg)
+
+        if enqueue is not None:
+            ctx._enqueue = counting_enqueue
+        self._local.active = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if enqueue is not None:
+                ctx._enqueue = enqueue
+            self._local.active = False
+            label = str(page)
+            with self._lock:
+                self.rerun_seconds.observe(label, elapsed)
+                if enqueue is not None:
+                    self.rerun_elements.observe(label, elements)
+                self._sessions[ctx.session_id] = time.monotonic()
+
+    # 直近 session_timeout 秒以内に再実行のあったセッション数
+    def active_sessions(self):
+        cutoff = time.monotonic() - self.session_timeout
+        with self._lock:
+            for session_id in [s for s, seen in self._sessions.items() if seen < cutoff]:
+                del self._sessions[session_id]
+            return len(self._sessions)
+
+    # Prometheus のテキスト形式
+    def render(self):
+        active = self.active_sessions()
+        with self._lock:
+            lines = (
+                self.rerun_seconds.render()
+                + self.rerun_elements.render()
+                + self.function_seconds.render()
+            )
+        lines += [
+            f"# HELP survey_active_sessions 直近 {self.session_timeout} 秒以内に再実行のあったセッション数",
+            "# TYPE survey_active_sessions gauge",
+            f"survey_active_sessions {active}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    # ファイルに書き出す（読み手が書きかけを読まないよう、一時ファイルから置き換える）
+    def write(self, path):
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+# /metrics で Prometheus のテキスト形式を返す HTTP サーバーを別スレッドで起動する
+def serve(metrics, port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="survey-metrics-http", daemon=True).start()
+    return server
+
+
+# interval 秒ごとにメトリクスをファイルへ書き出すスレッドを起動する
+# 書き出しに失敗してもログに出して書き出しを続ける（一時的なディスクの問題でファイルが古いままにならないよう）
+def write_periodically(metrics, path, interval=15):
+    def loop():
+        while True:
+            try:
+                metrics.write(path)
+            except Exception:
+                logger.exception("メトリクスをファイルに書き出せませんでした: %s", path)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="survey-metrics-file", daemon=True)
+    thread.start()
+    return thread
+
+
+# 環境変数の設定に従って出力先を用意した Metrics を作る
+#   SURVEY_METRICS_PORT:     /metrics を返すポート（SURVEY_METRICS_HOST で待ち受けアドレス、既定 127.0.0.1）
+#   SURVEY_METRICS_FILE:     書き出すファイルのパス（SURVEY_METRICS_INTERVAL で間隔の秒数、既定 15）
+def from_environment(environ=os.environ):
+    metrics = Metrics()
+    if environ.get("SURVEY_METRICS_PORT"):
+        serve(metrics, int(environ["SURVEY_METRICS_PORT"]), environ.get("SURVEY_METRICS_HOST", "127.0.0.1"))
+    if environ.get("SURVEY_METRICS_FILE"):
+        write_periodically(metrics, environ["SURVEY_METRICS_FILE"], float(environ.get("SURVEY_METRICS_INTERVAL", 15)))
+    return metrics
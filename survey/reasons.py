@@ -0,0 +1,312 @@
+# 理由の自由記述の索引と検索
+#
+# 理由入力ページ（low_expectation / low_satisfaction / high_satisfaction）の
+# 自由記述を、文字 bigram の転置索引として SQLite（WAL モード）に持つ。
+# 回答を保存するたびにその回答の記述だけを索引に足すので、検索のたびに
+# 回答ログを読み直すことはない。
+#
+# - 検索: 空白区切りのキーワード（すべてを含む記述）と "..." で囲んだフレーズ。
+#   語の bigram の出現文書を、出現文書の少ない bigram から順に絞り込み、
+#   残った候補だけを本文と照合する。1文字の語は、その文字で始まる bigram を
+#   範囲で引く（本文の末尾には区切り文字を足して索引するので、末尾の文字も引ける）。
+# - 語の頻度: 漢字・カタカナ・英数字の連続（2文字以上）を語とみなし、理由の
+#   種類 × 項目のカテゴリごとに、その語を含む記述の数を数えておく。
+#
+# 全角・半角や大文字・小文字の違いは NFKC と casefold でそろえてから扱う。
+#
+#   python -m survey.reasons rebuild employee_survey_data.csv employee_survey_data.parquet employee_survey_data.reasons.sqlite3
+#   python -m survey.reasons search employee_survey_data.reasons.sqlite3 人員 "フィードバック"
+import re
+import shlex
+import sqlite3
+import threading
+import unicodedata
+
+import pandas as pd
+
+from survey.submissions import STORED_TABLE, unstored
+
+# 本文の末尾に足す区切り文字（1文字の語の検索用）
+END = "\n"
+
+# 語とみなす文字の連続（漢字、カタカナ、英数字）
+TERM = re.compile(r"[々一-鿿]{2,}|[ァ-ヺー]{2,}|[a-z0-9]{2,}")
+
+# この件数まで絞り込んだら、残りの bigram では絞らずに本文と照合する
+VERIFY_CANDIDATES = 2_000
+
+# 照合が必要な語で、どの bigram もこの件数より多くの記述に出てくるなら、
+# ID で引かずに索引の本文をまとめて照合する（その方が速い）
+SCAN_CANDIDATES = 10_000
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", str(text)).casefold()).strip()
+
+
+# 索引する bigram（正規化済みの本文から）
+def bigrams(text):
+    padded = text + END
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+# 語の頻度を数える語（正規化済みの本文から）
+def terms(text):
+    return set(TERM.findall(text))
+
+
+# 検索語の解析（"..." はフレーズ、それ以外は空白区切りのキーワード）
+def parse_query(query):
+    try:
+        words = shlex.split(query)
+    except ValueError:
+        words = query.split()
+    return [w for w in (normalize(word) for word in words) if w]
+
+
+# 理由入力ページの記述を取り出す（(理由の種類, 項目, 評価, 本文) の並び）
+def reason_entries(schema, record):
+    entries = []
+    for prompt in schema.reasons.values():
+        item_column, rating_column, reason_column = prompt.columns
+        text = record.get(reason_column)
+        if text is None or not normalize(text):
+            continue
+        entries.append((prompt.key, record.get(item_column), record.get(rating_column), str(text)))
+    return entries
+
+
+class ReasonIndex:
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        # 項目の表示文字列（「カテゴリ - 質問」）からカテゴリを引く
+        self._categories = {
+            f"{q.category} - {q.text}": q.category
+            for q in schema.expectation + schema.satisfaction
+        }
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY, prompt TEXT NOT NULL, category TEXT, item TEXT,"
+                " rating TEXT, text TEXT NOT NULL, normalized TEXT NOT NULL, timestamp TEXT)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " gram TEXT NOT NULL, doc INTEGER NOT NULL, PRIMARY KEY (gram, doc)) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS grams ("
+                " gram TEXT PRIMARY KEY, count INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS terms ("
+                " prompt TEXT NOT NULL, category TEXT NOT NULL, term TEXT NOT NULL, count INTEGER NOT NULL,"
+                " PRIMARY KEY (prompt, category, term)) WITHOUT ROWID"
+            )
+            conn.execute(STORED_TABLE)
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn, records):
+        grams, counts = {}, {}
+        for record in records:
+            timestamp = record.get("timestamp")
+            timestamp = None if timestamp is None else str(timestamp)
+            for prompt, item, rating, text in reason_entries(self.schema, record):
+                category = self._categories.get(item, "")
+                normalized = normalize(text)
+                doc = conn.execute(
+                    "INSERT INTO documents (prompt, category, item, rating, text, normalized, timestamp)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (prompt, category, item, rating, text, normalized, timestamp),
+                ).lastrowid
+                document_grams = bigrams(normalized)
+                conn.executemany("INSERT INTO postings (gram, doc) VALUES (?, ?)", [(g, doc) for g in document_grams])
+                for gram in document_grams:
+                    grams[gram] = grams.get(gram, 0) + 1
+                for term in terms(normalized):
+                    key = (prompt, category, term)
+                    counts[key] = counts.get(key, 0) + 1
+        conn.executemany(
+            "INSERT INTO grams (gram, count) VALUES (?, ?)"
+            " ON CONFLICT(gram) DO UPDATE SET count = count + excluded.count",
+            grams.items(),
+        )
+        conn.executemany(
+            "INSERT INTO terms (prompt, category, term, count) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(prompt, category, term) DO UPDATE SET count = count + excluded.count",
+            [key + (count,) for key, count in counts.items()],
+        )
+
+    # 回答（dict）の理由の記述を索引に足す（送信キューの保存済みの回答は足さない）
+    def add_many(self, records):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._insert(conn, unstored(conn, records))
+
+    # 回答データ全体（DataFrame）から作り直し、索引した記述の数を返す
+    def rebuild(self, df):
+        records = df.astype(object).where(df.notna(), None).to_dict("records")
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ("documents", "postings", "grams", "terms"):
+                conn.execute(f"DELETE FROM {table}")
+            self._insert(conn, records)
+        return self.count()
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    # bigram を含む記述の ID（1文字ならその文字で始まる bigram をすべて）
+    def _postings(self, conn, gram):
+        if len(gram) == 2:
+            rows = conn.execute("SELECT doc FROM postings WHERE gram = ?", (gram,))
+        else:
+            rows = conn.execute(
+                "SELECT DISTINCT doc FROM postings WHERE gram >= ? AND gram < ?", (gram, gram + "\U0010ffff")
+            )
+        return {doc for doc, in rows}
+
+    def _frequency(self, conn, gram):
+        if len(gram) == 2:
+            row = conn.execute("SELECT count FROM grams WHERE gram = ?", (gram,)).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT SUM(count) FROM grams WHERE gram >= ? AND gram < ?", (gram, gram + "\U0010ffff")
+            ).fetchone()
+        return (row and row[0]) or 0
+
+    # 語をすべて含む記述の候補（bigram の出現文書の積。本文との照合前）と、照合が不要かどうか
+    # 照合が必要な語で、どの bigram も SCAN_CANDIDATES 件より多くの記述に出てくるなら、候補は None（索引では絞れない）
+    def _candidates(self, conn, words):
+        grams = {g for word in words for g in ([word] if len(word) == 1 else bigrams(word) - {word[-1] + END})}
+        frequencies = {g: self._frequency(conn, g) for g in grams}
+        ordered = sorted(grams, key=frequencies.get)
+        short = all(len(word) <= 2 for word in words)
+        if not short and frequencies[ordered[0]] > SCAN_CANDIDATES:
+            return None, False
+        candidates = None
+        for n, gram in enumerate(ordered, 1):
+            postings = self._postings(conn, gram)
+            candidates = postings if candidates is None else candidates & postings
+            if len(candidates) <= VERIFY_CANDIDATES:
+                break
+        # 語がどれも bigram 1つ（または1文字）で、すべての bigram で絞り込んだなら索引の結果がそのまま答えになる
+        exact = short and n == len(ordered)
+        return candidates, exact
+
+    # 検索語（キーワード・"フレーズ"）をすべて含む記述を新しい順に返す
+    # prompt / category で理由の種類・項目のカテゴリを絞り込める。戻り値は (総件数, 先頭 limit 件の DataFrame)
+    def search(self, query, prompt=None, category=None, limit=50):
+        columns = ["id", "prompt", "category", "item", "rating", "text", "timestamp"]
+        words = parse_query(query)
+        if not words:
+            return 0, pd.DataFrame(columns=columns)
+        conn = self._connection()
+        candidates, exact = self._candidates(conn, words)
+        if candidates is None:
+            # ありふれた語だけの検索は、索引の本文をまとめて照合する
+            ids = self._matches(conn, None, prompt, category, words)
+        elif exact and not prompt and not category:
+            ids = sorted(candidates, reverse=True)
+        else:
+            candidates = sorted(candidates, reverse=True)
+            ids = []
+            for start in range(0, len(candidates), 500):
+                ids += self._matches(conn, candidates[start:start + 500], prompt, category, [] if exact else words)
+        return len(ids), self._documents(conn, columns, ids[:limit])
+
+    # 条件に合う記述の ID を新しい順に返す（ids が None ならすべての記述から。
+    # words を指定すると、正規化した本文がそのすべてを含むものだけ）
+    def _matches(self, conn, ids, prompt=None, category=None, words=()):
+        sql = "SELECT id FROM documents WHERE 1"
+        params = []
+        if ids is not None:
+            sql += f" AND id IN ({','.join('?' * len(ids))})"
+            params.extend(ids)
+        for word in words:
+            sql += " AND instr(normalized, ?) > 0"
+            params.append(word)
+        if prompt:
+            sql += " AND prompt = ?"
+            params.append(prompt)
+        if category:
+            sql += " AND category = ?"
+            params.append(category)
+        return [doc for doc, in conn.execute(sql + " ORDER BY id DESC", params)]
+
+    def _documents(self, conn, columns, ids):
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM documents WHERE id IN ({','.join('?' * len(ids))}) ORDER BY id DESC", ids
+        ).fetchall() if ids else []
+        return pd.DataFrame(rows, columns=columns)
+
+    # 理由の種類 × 項目のカテゴリごとの語の頻度（その語を含む記述の数）上位 top 語
+    # category を省略すると理由の種類全体で合算する
+    def term_frequencies(self, prompt, category=None, top=20):
+        sql = "SELECT term, SUM(count) AS documents FROM terms WHERE prompt = ?"
+        params = [prompt]
+        if category is not None:
+            sql += " AND category = ?"
+            params.append(category)
+        sql += " GROUP BY term ORDER BY documents DESC, term LIMIT ?"
+        params.append(top)
+        return pd.DataFrame(self._connection().execute(sql, params).fetchall(), columns=["term", "documents"])
+
+    # 理由の種類ごと・項目のカテゴリごとの記述の数
+    def categories(self, prompt):
+        rows = self._connection().execute(
+            "SELECT category, COUNT(*) FROM documents WHERE prompt = ? GROUP BY category ORDER BY COUNT(*) DESC",
+            (prompt,),
+        ).fetchall()
+        return pd.DataFrame(rows, columns=["category", "documents"])
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog, load_responses
+
+    parser = argparse.ArgumentParser(description="理由の自由記述の索引を作り直す・検索します")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="回答データ全体から索引を作り直す")
+    rebuild.add_argument("log", help="回答ログ（CSV）のパス")
+    rebuild.add_argument("dataset", help="Parquet データセットのディレクトリ")
+    rebuild.add_argument("index", help="索引（SQLite）のパス")
+    search = commands.add_parser("search", help="キーワード・フレーズで検索する")
+    search.add_argument("index", help="索引（SQLite）のパス")
+    search.add_argument("query", nargs="+", help="検索語（フレーズは引用符で囲む）")
+    search.add_argument("--prompt", help="理由の種類（low_expectation など）")
+    search.add_argument("--limit", type=int, default=20, help="表示する件数")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    if args.command == "rebuild":
+        log = AppendOnlyLog(args.log, schema.columns)
+        columns = [c for prompt in schema.reasons.values() for c in prompt.columns] + ["timestamp"]
+        df = load_responses(log, ResponseDataset(args.dataset, response_dtypes(schema)), columns)
+        start = time.perf_counter()
+        count = ReasonIndex(args.index, schema).rebuild(df)
+        print(f"{count} 件の記述を索引しました（{time.perf_counter() - start:.1f} 秒）")
+    else:
+        index = ReasonIndex(args.index, schema)
+        query = " ".join(shlex.quote(word) if " " in word else word for word in args.query)
+        start = time.perf_counter()
+        total, matches = index.search(query, args.prompt, limit=args.limit)
+        elapsed = time.perf_counter() - start
+        print(matches[["prompt", "category", "text"]].to_string(index=False))
+        print(f"{total} 件（{elapsed * 1000:.1f} ミリ秒）")
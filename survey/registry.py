@@ -0,0 +1,65 @@
+# 調査の一覧と保存先
+#
+# 1つのプロセスで複数の調査（会社・調査回ごとの調査定義）を配信する。
+# 調査は URL の ?survey=<調査ID> で選び、調査定義は SURVEY_DEFINITIONS_DIR
+# （既定は survey パッケージのディレクトリ）の <調査ID>.json から読む。
+# 回答データは調査ごとに SURVEY_DATA_DIR/<調査ID>/ の下に分けて保存する。
+# 既定の調査（?survey= なし）は従来どおり SURVEY_DATA_DIR 直下の
+# employee_survey_data.* に保存する。
+import os
+import re
+
+from survey.schema import DEFAULT_SCHEMA_PATH
+
+DEFAULT_SURVEY = os.path.splitext(os.path.basename(DEFAULT_SCHEMA_PATH))[0]
+
+# 調査IDに使える文字（パスの一部になるので、区切り文字などは使えない）
+SURVEY_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def definitions_dir(environ=os.environ):
+    return environ.get("SURVEY_DEFINITIONS_DIR") or os.path.dirname(DEFAULT_SCHEMA_PATH)
+
+
+def data_dir(environ=os.environ):
+    return environ.get("SURVEY_DATA_DIR") or "."
+
+
+# 配信できる調査IDの一覧
+def survey_ids(environ=os.environ):
+    root = definitions_dir(environ)
+    ids = [
+        name[:-len(".json")]
+        for name in os.listdir(root)
+        if name.endswith(".json") and SURVEY_ID_PATTERN.match(name[:-len(".json")])
+    ]
+    return sorted(ids)
+
+
+# 調査定義のパス（調査IDが不正・定義がなければ None）
+def definition_path(survey_id, environ=os.environ):
+    if not SURVEY_ID_PATTERN.match(survey_id or ""):
+        return None
+    path = os.path.join(definitions_dir(environ), f"{survey_id}.json")
+    return path if os.path.isfile(path) else None
+
+
+# 調査の回答データの保存先
+#   log: 回答ログ（CSV）、dataset: Parquet データセット、
+#   aggregates: 集計済み統計、checkpoints: 回答途中のチェックポイント、
+#   submissions: 保存待ちの送信のジャーナル、reasons: 理由の自由記述の索引、
+#   waves: 調査回の管理と締め切った調査回のスナップショット
+def storage_paths(survey_id, environ=os.environ):
+    if survey_id == DEFAULT_SURVEY:
+        prefix = os.path.join(data_dir(environ), "employee_survey_data")
+    else:
+        prefix = os.path.join(data_dir(environ), survey_id, "responses")
+    return {
+        "log": f"{prefix}.csv",
+        "dataset": f"{prefix}.parquet",
+        "aggregates": f"{prefix}.aggregates.sqlite3",
+        "checkpoints": f"{prefix}.checkpoints.sqlite3",
+        "submissions": f"{prefix}.submissions.sqlite3",
+        "reasons": f"{prefix}.reasons.sqlite3",
+        "waves": f"{prefix}.waves.sqlite3",
+    }
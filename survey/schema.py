@@ -0,0 +1,232 @@
+# 調査定義（スキーマ）
+#
+# 質問・選択肢・保存列の定義を JSON から読み込み、プロセスごとに1回だけ
+# 変更不可のオブジェクトへコンパイルする。回答キー、列順、選択肢の配列、
+# 回答キーからの逆引きはコンパイル時に作っておくので、ページ描画のたびに
+# f-string や探索で組み立て直す必要はない。
+import json
+import os
+from types import MappingProxyType
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "employee_survey.json")
+
+# 回答モード（定義の answer_mode。省略時は batch）
+#   batch:      評価・期待・満足のページの回答を st.form でまとめ、「次へ進む」で1回だけ確定する
+#   per_answer: 回答のたびに、その質問のまとまり（カテゴリ）だけを st.fragment として再実行する
+ANSWER_MODES = ("batch", "per_answer")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+# コンパイル後は属性を変更できないオブジェクトの基底クラス
+class _Frozen:
+    __slots__ = ()
+
+    def __init__(self, **attrs):
+        for name, value in attrs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} は変更できません")
+
+    # 変更不可なのでコピーは自分自身でよい（ウィジェットの options は deepcopy される）
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        key = getattr(self, "response_key", None) or getattr(self, "key", None) or getattr(self, "name", "")
+        return f"<{type(self).__name__} {key}>"
+
+
+# 評価尺度（保存する値と表示ラベル）
+# display は「値: ラベル」の表示文字列、text はラベルのみ（ラベルがない尺度は値そのもの）
+# anchors はラベルのない尺度で説明を添える値（例: 0, 5, 10）
+class Scale(_Frozen):
+    __slots__ = ("name", "values", "labels", "display", "text", "anchors")
+
+    def label(self, value):
+        return self.text[value]
+
+
+# リッカート尺度の1問
+# section: "evaluation" / "expectation" / "satisfaction"
+# position はスキーマ内での出題順
+class Question(_Frozen):
+    __slots__ = ("key", "text", "response_key", "scale", "section", "category", "position")
+
+
+# 基本情報の1問（widget: select / number / slider / year / text）
+# dtype は保存時の型（select は options をカテゴリとするカテゴリ型）
+# unit は数値の単位（円を 1 として。例: 万円の項目は 10000。「500万」のような入力の換算に使う）
+# bands は属性別の集計で数値を区切る境界（各区間は下限以上・次の境界未満）
+class DemographicQuestion(_Frozen):
+    __slots__ = (
+        "key", "label", "widget", "options", "min", "max", "value", "step", "help", "years", "unit", "bands", "dtype",
+    )
+
+
+# 期待・満足項目のカテゴリ
+class Category(_Frozen):
+    __slots__ = ("name", "items", "expectation", "satisfaction")
+
+
+# 理由を尋ねるページの定義（section の回答が ratings のいずれかの項目が対象）
+# title / intro / empty はページの見出し・説明文・対象項目がないときの案内
+class ReasonPrompt(_Frozen):
+    __slots__ = ("key", "section", "ratings", "columns", "title", "intro", "empty")
+
+
+class Schema(_Frozen):
+    __slots__ = (
+        "title", "answer_mode", "scales", "demographics", "evaluation", "categories",
+        "expectation", "satisfaction", "reasons", "questions", "columns",
+    )
+
+    # 回答キーから質問を引く（該当がなければ None）
+    def question(self, response_key):
+        return self.questions.get(response_key)
+
+    def section(self, name):
+        return getattr(self, name)
+
+
+def _compile_scale(name, spec):
+    values = tuple(spec["values"])
+    labels = tuple(spec.get("labels") or ())
+    if labels and len(labels) != len(values):
+        raise SchemaError(f"尺度 {name} の values と labels の数が一致しません")
+    text = {value: labels[i] if labels else str(value) for i, value in enumerate(values)}
+    display = {value: f"{value}: {label}" if labels else label for value, label in text.items()}
+    return Scale(
+        name=name,
+        values=values,
+        labels=labels,
+        display=MappingProxyType(display),
+        text=MappingProxyType(text),
+        anchors=MappingProxyType({int(value): label for value, label in spec.get("anchors", {}).items()}),
+    )
+
+
+def _compile_demographic(spec):
+    return DemographicQuestion(
+        key=spec["key"],
+        label=spec.get("label", spec["key"]),
+        widget=spec["widget"],
+        options=tuple(spec.get("options") or ()),
+        min=spec.get("min"),
+        max=spec.get("max"),
+        value=spec.get("value"),
+        step=spec.get("step"),
+        help=spec.get("help"),
+        years=spec.get("years"),
+        unit=spec.get("unit", 1),
+        bands=tuple(spec.get("bands") or ()),
+        dtype=spec.get("dtype", "category" if spec["widget"] == "select" else "string"),
+    )
+
+
+def _scale(scales, name):
+    try:
+        return scales[name]
+    except KeyError:
+        raise SchemaError(f"未定義の尺度です: {name}") from None
+
+
+# 定義（dict）をコンパイルする
+def compile_schema(definition):
+    answer_mode = definition.get("answer_mode", "batch")
+    if answer_mode not in ANSWER_MODES:
+        raise SchemaError(f"answer_mode は {' / '.join(ANSWER_MODES)} のいずれかです: {answer_mode}")
+    scales = {name: _compile_scale(name, spec) for name, spec in definition["scales"].items()}
+    demographics = tuple(_compile_demographic(spec) for spec in definition["demographics"])
+    evaluation = tuple(
+        Question(
+            key=spec["key"],
+            text=spec["question"],
+            response_key=spec["key"],
+            scale=_scale(scales, spec["scale"]),
+            section="evaluation",
+            category=None,
+            position=position,
+        )
+        for position, spec in enumerate(definition["evaluation"])
+    )
+
+    item_scales = definition["item_scales"]
+    items_total = sum(len(spec["items"]) for spec in definition["categories"])
+    categories = []
+    offset = len(evaluation)
+    for spec in definition["categories"]:
+        items = tuple((item["key"], item["question"]) for item in spec["items"])
+        per_section = {
+            section: tuple(
+                Question(
+                    key=key,
+                    text=text,
+                    response_key=f"{section}_{key}",
+                    scale=_scale(scales, item_scales[section]),
+                    section=section,
+                    category=spec["name"],
+                    position=offset + n * items_total + i,
+                )
+                for i, (key, text) in enumerate(items)
+            )
+            for n, section in enumerate(("expectation", "satisfaction"))
+        }
+        categories.append(Category(name=spec["name"], items=items, **per_section))
+        offset += len(items)
+    categories = tuple(categories)
+    expectation = tuple(q for category in categories for q in category.expectation)
+    satisfaction = tuple(q for category in categories for q in category.satisfaction)
+
+    reasons = {
+        spec["key"]: ReasonPrompt(
+            key=spec["key"],
+            section=spec["section"],
+            ratings=frozenset(spec["ratings"]),
+            columns=tuple(f"{spec['key']}_{field}" for field in ("item", "rating", "reason")),
+            title=spec.get("title", ""),
+            intro=spec.get("intro", ""),
+            empty=spec.get("empty", ""),
+        )
+        for spec in definition.get("reasons", ())
+    }
+
+    questions = {}
+    for question in evaluation + expectation + satisfaction:
+        if question.response_key in questions:
+            raise SchemaError(f"回答キーが重複しています: {question.response_key}")
+        questions[question.response_key] = question
+
+    # 保存列の順序（列が増えても既存列の位置は変わらない）
+    columns = (
+        tuple(q.key for q in demographics)
+        + tuple(questions)
+        + tuple(column for reason in reasons.values() for column in reason.columns)
+        + ("wave", "timestamp")
+    )
+
+    return Schema(
+        title=definition.get("title", ""),
+        answer_mode=answer_mode,
+        scales=MappingProxyType(scales),
+        demographics=demographics,
+        evaluation=evaluation,
+        categories=categories,
+        expectation=expectation,
+        satisfaction=satisfaction,
+        reasons=MappingProxyType(reasons),
+        questions=MappingProxyType(questions),
+        columns=columns,
+    )
+
+
+# JSON ファイルから読み込んでコンパイルする
+def load_schema(path=DEFAULT_SCHEMA_PATH):
+    with open(path, encoding="utf-8") as f:
+        return compile_schema(json.load(f))
@@ -0,0 +1,279 @@
+import contextlib
+import csv
+import glob
+import io
+import os
+import threading
+import time
+
+import pandas as pd
+
+from survey.submissions import SUBMISSION_ID
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなし（プロセス内ロックのみ）
+    fcntl = None
+
+
+# 追記専用の回答ログ
+#
+# 1回答につき1回のバッファ済み write で末尾に追記するだけなので、
+# 既存の回答数に関係なく送信コストは一定になる。
+# ヘッダーはファイル作成時に一度だけ書き込む。スキーマに新しい列が
+# 増えた場合は既存ファイルを書き換えず、列を拡張した新しいセグメント
+# (例: employee_survey_data.1.csv) に切り替える。既存列の位置は変わらない。
+#
+# 同時送信に備えて、追記はプロセス内ロック（Streamlit のセッションは同一
+# プロセスのスレッド）とロックファイルへの flock（複数プロセス・複数
+# レプリカ）の両方で直列化する。
+#
+# 送信キューからの回答（submission_id 付き）は、ログにすでにある ID なら追記しない
+# （一部だけ保存できたバッチの再試行で同じ回答を二重に書かないため）。
+class AppendOnlyLog:
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self._segment = None
+        self._header = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stored = None
+
+    # ログを構成するセグメントファイル（古い順）
+    def segments(self):
+        root, ext = os.path.splitext(self.path)
+        paths = [self.path] if os.path.exists(self.path) else []
+        n = 1
+        while os.path.exists(f"{root}.{n}{ext}"):
+            paths.append(f"{root}.{n}{ext}")
+            n += 1
+        return paths
+
+    def _segment_path(self, n):
+        if n == 0:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{n}{ext}"
+
+    @staticmethod
+    def _read_header(path):
+        with open(path, newline="", encoding="utf-8") as f:
+            return next(csv.reader(f), [])
+
+    def _open_segment(self):
+        segments = self.segments()
+        if segments:
+            self._segment = segments[-1]
+            self._header = self._read_header(self._segment)
+        else:
+            self._segment = self.path
+            self._header = None
+
+    # 既存ヘッダーを保ったまま、不足している列を末尾に足したヘッダー
+    def _extended_header(self, record):
+        header = list(self._header or [])
+        for column in self.columns + list(record):
+            if column not in header:
+                header.append(column)
+        return header
+
+    @staticmethod
+    def _format(rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator="\n")
+        writer.writerows(rows)
+        return buf.getvalue().encode("utf-8")
+
+    # 新しいセグメントをヘッダー付きで作成する（他プロセスが先に作っていれば False）
+    def _create(self, path, header, row):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            return False
+        try:
+            os.write(fd, self._format([header, row]))
+        finally:
+            os.close(fd)
+        return True
+
+    # プロセス内・プロセス間の排他ロック
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.path + ".lock", os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _write(self, path, row):
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, self._format([row]))
+        finally:
+            os.close(fd)
+
+    # 1件の回答を追記する（複数のセッション・プロセスから同時に呼んでよい）
+    def append(self, record):
+        with self._locked():
+            self._append(record)
+
+    # 複数の回答をまとめて追記する（送信キューのバッチ保存）
+    # 現在のヘッダーに収まる回答はまとめて1回の write で書き、列が増える回答だけ1件ずつ追記する
+    # ログにすでにある submission_id の回答は読み飛ばす
+    def append_many(self, records):
+        with self._locked():
+            stored = self._stored_ids()
+            records = [record for record in records if record.get(SUBMISSION_ID) not in stored]
+            if not records:
+                return
+            try:
+                self._append(records[0])
+                rows = []
+                for record in records[1:]:
+                    if set(record) <= set(self._header):
+                        rows.append([record.get(c) for c in self._header])
+                        continue
+                    self._write_rows(rows)
+                    rows = []
+                    self._append(record)
+                self._write_rows(rows)
+            except BaseException:
+                # どこまで書けたかはファイルから読み直す
+                self._stored = None
+                raise
+            stored.update(record[SUBMISSION_ID] for record in records if record.get(SUBMISSION_ID) is not None)
+
+    # ログにある送信キューの回答の ID
+    # 最初に使うときにセグメント（と移し替え待ちのファイル）から読み、以後は追記した ID を足していく。
+    # 送信キューは保存待ちの回答がなくなってから移し替えるので、移し替えた回答の ID は覚えておかなくてよい
+    def _stored_ids(self):
+        if self._stored is None:
+            ids = set()
+            for path in self.segments() + self._detached():
+                if SUBMISSION_ID in self._read_header(path):
+                    ids.update(pd.read_csv(path, usecols=[SUBMISSION_ID])[SUBMISSION_ID].dropna().astype("int64").tolist())
+            self._stored = ids
+        return self._stored
+
+    def _write_rows(self, rows):
+        if not rows:
+            return
+        fd = os.open(self._segment, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, self._format(rows))
+        finally:
+            os.close(fd)
+        self._writes += 1
+
+    # DataFrame の回答をまとめて追記する（合成データの投入など）
+    # 1行目で通常の追記と同じくセグメントとヘッダーを確定し、残りは1回の write で書く
+    def extend(self, df):
+        if df.empty:
+            return
+        with self._locked():
+            self._append({column: None if pd.isna(value) else value for column, value in df.iloc[0].items()})
+            rest = df.iloc[1:]
+            if rest.empty:
+                return
+            fd = os.open(self._segment, os.O_WRONLY | os.O_APPEND)
+            try:
+                os.write(fd, rest.reindex(columns=self._header).to_csv(header=False, index=False, lineterminator="\n").encode("utf-8"))
+            finally:
+                os.close(fd)
+            self._writes += 1
+
+    # ログの版。追記のたびに変わるので、読み込みキャッシュのキーに使う。
+    # 他プロセスの追記はファイルのサイズと mtime、このプロセスの追記は
+    # 書き込みカウンタで検知する。
+    def version(self):
+        stats = [os.stat(path) for path in self.segments()]
+        return (self._writes,) + tuple((st.st_size, st.st_mtime_ns) for st in stats)
+
+    def _append(self, record):
+        # 他のプロセスが新しいセグメントを作っていれば、そちらに追記する
+        segments = self.segments()
+        if not segments or segments[-1] != self._segment:
+            self._open_segment()
+
+        while True:
+            if self._header is not None and set(record) <= set(self._header):
+                self._write(self._segment, [record.get(c) for c in self._header])
+                self._writes += 1
+                return
+
+            header = self._extended_header(record)
+            segment = self._segment_path(len(self.segments())) if self._header is not None else self.path
+            if self._create(segment, header, [record.get(c) for c in header]):
+                self._segment, self._header = segment, header
+                self._writes += 1
+                return
+            # 他のプロセスが先にセグメントを作成した場合は読み直して再試行
+            self._open_segment()
+
+    # 全セグメント（paths を指定した場合はそのファイル）を1つの DataFrame として読み込む
+    # columns を指定するとその列だけを読む（ない列は欠損値で埋める）
+    def read(self, paths=None, columns=None):
+        usecols = None if columns is None else set(columns).__contains__
+        frames = [pd.read_csv(path, usecols=usecols) for path in (self.segments() if paths is None else paths)]
+        frames = [df for df in frames if not df.empty]
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+        if columns is not None:
+            return df.reindex(columns=list(columns))
+        ordered = [c for c in self.columns if c in df.columns]
+        return df[ordered + [c for c in df.columns if c not in ordered]]
+
+    # chunksize 行ずつ読む（全セグメントを一度に読み込まない）
+    def read_chunks(self, chunksize, columns=None):
+        usecols = None if columns is None else set(columns).__contains__
+        for path in self.segments():
+            with pd.read_csv(path, usecols=usecols, chunksize=chunksize) as reader:
+                for df in reader:
+                    yield df.reindex(columns=list(columns or self.columns))
+
+    # 未移し替えの回答ログのサイズ（バイト）
+    def size(self):
+        return sum(os.path.getsize(path) for path in self.segments())
+
+    # 現在のセグメントをログから切り離し、切り離したファイルのパスを返す
+    #
+    # 列指向データセットへの移し替え用。セグメントは *.compacting に改名され、
+    # 以後の追記は新しいセグメントに入る。前回の移し替えが途中で止まって
+    # 残っているファイルがあれば、それも先頭に含める。
+    def detach(self):
+        with self._locked():
+            pending = self._detached()
+            stamp = time.time_ns()
+            for n, path in enumerate(self.segments()):
+                target = f"{self.path}.{stamp}-{n:04d}.compacting"
+                os.rename(path, target)
+                pending.append(target)
+            self._segment = None
+            self._header = None
+            self._stored = None
+        return pending
+
+    # 切り離した後、まだ移し替えの終わっていないファイル
+    def _detached(self):
+        return sorted(glob.glob(glob.escape(self.path) + ".*.compacting"))
+
+
+# ログと列指向データセットを合わせた版（読み込みキャッシュのキー）
+def responses_version(log, dataset=None):
+    if dataset is None:
+        return log.version()
+    return log.version() + dataset.version()
+
+
+# 列指向データセットに移し替え済みの回答と、ログに残っている回答を合わせて読む
+# columns を指定するとその列だけを読む
+def load_responses(log, dataset=None, columns=None):
+    recent = log.read(columns=columns)
+    if dataset is None:
+        return recent
+    return dataset.combine(dataset.read(columns), recent)
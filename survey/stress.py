@@ -0,0 +1,142 @@
+# 同時送信のストレスベンチマーク
+#
+# アプリと同じ経路（送信キューへの submit → ワーカーが回答ログ・集計済み統計・
+# 理由の索引へ保存）で N 件の送信を並列に発行し、保存し終えた後に
+# 回答ログ（移し替え済みのデータセットを含む）にちょうど N 行、集計済み統計の
+# NPS に N 件、理由の索引に N 件が入っていることを確認する。
+# あわせて送信1件あたりのレイテンシ（p50 / p99）と、保存し終えるまでの時間を記録する。
+#
+# 複数プロセスの場合、各プロセスが同じジャーナルに送信し、保存はジャーナルの
+# ロックを取れた1つのワーカーが行う（アプリを複数プロセスで動かす場合と同じ）。
+#
+#   python -m survey.stress --submits 500 --workers 32 --processes 4
+import argparse
+import functools
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from survey.aggregates import AggregateStore
+from survey.dataset import ResponseDataset, response_dtypes
+from survey.reasons import ReasonIndex
+from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+from survey.storage import AppendOnlyLog, load_responses
+from survey.submissions import SubmissionQueue
+
+
+# 選択式の基本情報・NPS・理由の記述を含む回答
+def _record(schema, worker, seq):
+    record = {"worker": worker, "seq": seq, "nps": seq % 11}
+    for question in schema.demographics:
+        if question.widget == "select":
+            record[question.key] = question.options[seq % len(question.options)]
+    reason = next(iter(schema.reasons.values()))
+    record[reason.columns[2]] = "理由, \"引用\" と\n改行を含む自由記述"
+    record["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return record
+
+
+# 保存先（アプリの get_* と同じ構成。root の下に置く）
+def _sinks(root, schema):
+    log = AppendOnlyLog(os.path.join(root, "stress.csv"), schema.columns)
+    dataset = ResponseDataset(os.path.join(root, "stress.parquet"), response_dtypes(schema))
+    aggregates = AggregateStore(os.path.join(root, "stress.aggregates.sqlite3"), schema)
+    reasons = ReasonIndex(os.path.join(root, "stress.reasons.sqlite3"), schema)
+    return log, dataset, aggregates, reasons
+
+
+# アプリと同じ保存・移し替えの関数をつないだ送信キュー
+def _queue(root, schema):
+    from survey.app import commit_responses, compact_responses
+
+    log, dataset, aggregates, reasons = _sinks(root, schema)
+    return SubmissionQueue(
+        os.path.join(root, "stress.submissions.sqlite3"),
+        functools.partial(commit_responses, log, aggregates, reasons),
+        functools.partial(compact_responses, log, dataset),
+    )
+
+
+# 1プロセス分：スレッドで並列に送信し、各送信のレイテンシ（秒）を返す
+def _run_threads(root, schema_path, worker, submits, threads):
+    schema = load_schema(schema_path)
+    queue = _queue(root, schema).start()
+
+    def submit(seq):
+        start = time.perf_counter()
+        queue.submit(_record(schema, worker, seq))
+        return time.perf_counter() - start
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            return list(pool.map(submit, range(submits)))
+    finally:
+        queue.close()
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run(root, submits, workers, processes, schema_path=DEFAULT_SCHEMA_PATH):
+    per_process = [submits // processes + (1 if i < submits % processes else 0) for i in range(processes)]
+    start = time.perf_counter()
+    if processes == 1:
+        latencies = _run_threads(root, schema_path, 0, submits, workers)
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_run_threads, root, schema_path, i, n, workers) for i, n in enumerate(per_process)]
+            latencies = [t for f in futures for t in f.result()]
+    elapsed = time.perf_counter() - start
+
+    # ジャーナルに残っている回答を保存し終えるまで待つ
+    schema = load_schema(schema_path)
+    queue = _queue(root, schema).start()
+    try:
+        queue.flush()
+    finally:
+        queue.close()
+    drained = time.perf_counter() - start
+
+    log, dataset, aggregates, reasons = _sinks(root, schema)
+    df = load_responses(log, dataset)
+    status = queue.status()
+    return {
+        "submits": submits,
+        "rows": len(df),
+        "unique_rows": len(df.drop_duplicates(["worker", "seq"])),
+        "aggregated": aggregates.nps_summary()["responses"],
+        "indexed": reasons.count(),
+        "failed": status["failed"],
+        "elapsed": elapsed,
+        "drained": drained,
+        "throughput": submits / elapsed if elapsed else float("inf"),
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="送信キューへの同時送信ストレスベンチマーク")
+    parser.add_argument("--submits", type=int, default=500, help="送信件数 N")
+    parser.add_argument("--workers", type=int, default=32, help="プロセスあたりの並列スレッド数")
+    parser.add_argument("--processes", type=int, default=1, help="送信するプロセス数")
+    parser.add_argument("--dir", help="保存先のディレクトリ（省略時は一時ディレクトリ）")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = run(args.dir or tmp, args.submits, args.workers, args.processes, args.schema)
+
+    print(f"送信 {result['submits']} 件 / 回答ログ {result['rows']} 行（重複なし {result['unique_rows']} 行）")
+    print(f"集計済み統計 {result['aggregated']} 件 / 理由の索引 {result['indexed']} 件 / 保存できなかった回答 {result['failed']} 件")
+    print(f"送信 {result['elapsed']:.2f} 秒（{result['throughput']:.0f} 件/秒）/ 保存し終えるまで {result['drained']:.2f} 秒")
+    print(f"レイテンシ p50 {result['p50_ms']:.2f} ms / p99 {result['p99_ms']:.2f} ms / 平均 {result['mean_ms']:.2f} ms")
+    counts = (result["rows"], result["unique_rows"], result["aggregated"], result["indexed"])
+    if any(count != result["submits"] for count in counts):
+        raise SystemExit("NG: 保存された件数が送信件数と一致しません")
+    print("OK")
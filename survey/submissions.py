@@ -0,0 +1,260 @@
+# 回答送信のキュー（送信をすぐに受け付け、保存はバックグラウンドでまとめて行う）
+#
+# 送信された回答は、まずローカルディスクのジャーナル（SQLite、WAL モード、
+# synchronous=FULL）に1行書いてコミットし、それだけで回答者に受け付けを返す。
+# 回答ログ・集計済み統計への保存は、バックグラウンドのワーカーがジャーナルから
+# batch_size 件ずつ取り出してまとめて行い、保存できた分だけジャーナルから消す。
+#
+# - 保存に失敗した回答はジャーナルに残り、間隔を延ばしながら再試行する。
+#   失敗が続く回答が他の回答を巻き込まないよう、失敗したバッチは1件ずつ保存し直す。
+#   max_attempts 回失敗した回答は再試行をやめ、ジャーナルに残したままにする
+#   （python -m survey.submissions で確認し、--retry で再試行に戻せる）。
+# - プロセスが落ちても、コミット済みのジャーナルの回答は次に起動したワーカーが
+#   保存する。保存とジャーナルからの削除のあいだで落ちた場合や、バッチの一部の
+#   保存先にだけ保存できた場合は同じ回答をもう一度保存することになるので、
+#   回答にはジャーナルの ID（submission_id）を付けて渡し、各保存先は保存済みの
+#   ID の回答を読み飛ばす（回答を失わず、二重にも保存しない）。
+# - 移し替えなどの保存先の手入れ（maintain）は、ジャーナルの回答を保存し終えた
+#   後に別に行う。手入れが失敗しても、保存済みの回答の再試行にはならない。
+# - 複数のプロセスが同じジャーナルを使う場合、保存するのはロックファイルの
+#   flock を取れた1つのワーカーだけで、他のプロセスはジャーナルに書くだけになる。
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間ロックなし（1プロセスでの利用のみ）
+    fcntl = None
+
+BATCH_SIZE = 500
+
+# ジャーナルを見に行く間隔（秒。同じプロセスの送信ではすぐに起こす）
+POLL_INTERVAL = 0.5
+
+# 再試行の間隔の上限（秒）と、再試行をやめるまでの失敗回数
+MAX_BACKOFF = 60
+MAX_ATTEMPTS = 10
+
+# 保存する回答に付けるジャーナルの ID の列
+SUBMISSION_ID = "submission_id"
+
+# SQLite の保存先が保存済みの ID を記録する表
+STORED_TABLE = "CREATE TABLE IF NOT EXISTS stored_submissions (id INTEGER PRIMARY KEY)"
+
+logger = logging.getLogger(__name__)
+
+
+# SQLite の保存先で、まだ保存していない回答だけを返す（返した回答の ID は同じトランザクションで記録する）
+# ID のない回答（合成データなど）はそのまま返す
+def unstored(conn, records):
+    fresh = []
+    for record in records:
+        submission_id = record.get(SUBMISSION_ID)
+        if submission_id is None or conn.execute(
+            "INSERT OR IGNORE INTO stored_submissions (id) VALUES (?)", (submission_id,)
+        ).rowcount:
+            fresh.append(record)
+    return fresh
+
+
+class SubmissionQueue:
+    # commit は回答（dict）のリストを受け取って保存する関数。失敗したら例外を送出する
+    # maintain はジャーナルの回答を保存し終えたときに呼ぶ関数（回答ログの移し替えなど）
+    def __init__(self, path, commit, maintain=None, batch_size=BATCH_SIZE, interval=POLL_INTERVAL,
+                 max_backoff=MAX_BACKOFF, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.commit = commit
+        self.maintain = maintain
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._thread = None
+        self._lock_fd = None
+        self._failures = 0
+        self._isolate = 0
+
+    # スレッドごとに接続を持つ（送信は各セッションのスレッド、保存はワーカーのスレッド）
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # 受け付けを返した回答は電源断でも失わないよう、コミットごとに fsync する
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS submissions ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL,"
+                " submitted_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT)"
+            )
+            self._local.conn = conn
+        return conn
+
+    # 回答をジャーナルに書く。コミットした時点で受け付け済みとしてよい
+    def submit(self, record):
+        body = json.dumps(record, ensure_ascii=False)
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            submission_id = conn.execute(
+                "INSERT INTO submissions (record, submitted_at) VALUES (?, ?)", (body, time.time())
+            ).lastrowid
+        self._wake.set()
+        return submission_id
+
+    # ジャーナルに残っている回答の件数
+    #   pending: 保存待ち（再試行中を含む）、failed: max_attempts 回失敗して再試行をやめたもの
+    def status(self):
+        pending, failed = self._connection().execute(
+            "SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) FROM submissions",
+            (self.max_attempts, self.max_attempts),
+        ).fetchone()
+        return {"pending": pending, "failed": failed}
+
+    # 再試行をやめた回答の一覧（id, 送信時刻, 失敗回数, 最後のエラー）
+    def failed(self):
+        return self._connection().execute(
+            "SELECT id, submitted_at, attempts, error FROM submissions WHERE attempts >= ? ORDER BY id",
+            (self.max_attempts,),
+        ).fetchall()
+
+    # 再試行をやめた回答を再試行に戻し、件数を返す
+    def retry_failed(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            count = conn.execute(
+                "UPDATE submissions SET attempts = 0 WHERE attempts >= ?", (self.max_attempts,)
+            ).rowcount
+        self._wake.set()
+        return count
+
+    # 保存待ちの回答を1バッチ保存し、保存した件数を返す（失敗したら例外を送出する）
+    # バッチの保存に失敗したら、そのバッチの回答は1件ずつ保存し直して失敗する回答を切り分ける。
+    # 失敗回数を数えるのは1件で保存して失敗した場合だけ（巻き込まれた回答は数えない）
+    def process(self):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT id, record FROM submissions WHERE attempts < ? ORDER BY id LIMIT ?",
+            (self.max_attempts, self.batch_size),
+        ).fetchall()
+        if not rows:
+            return 0
+        if rows[0][0] <= self._isolate:
+            rows = rows[:1]
+        ids = [submission_id for submission_id, _ in rows]
+        try:
+            self.commit([dict(json.loads(body), **{SUBMISSION_ID: i}) for i, body in rows])
+        except Exception as e:
+            self._failures += 1
+            error = f"{type(e).__name__}: {e}"
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if len(ids) > 1:
+                    self._isolate = ids[-1]
+                    conn.executemany("UPDATE submissions SET error = ? WHERE id = ?", [(error, i) for i in ids])
+                else:
+                    conn.execute("UPDATE submissions SET attempts = attempts + 1, error = ? WHERE id = ?", (error, ids[0]))
+            raise
+        self._failures = 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM submissions WHERE id = ?", [(i,) for i in ids])
+        return len(rows)
+
+    # 保存するワーカーのロック（他のプロセスのワーカーが持っていれば False）
+    def _acquire(self):
+        if fcntl is None or self._lock_fd is not None:
+            return True
+        fd = os.open(self.path + ".lock", os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def _run(self):
+        delay = 0
+        while not self._stop.is_set():
+            self._wake.wait(max(delay, self.interval))
+            self._wake.clear()
+            if not self._acquire():
+                continue
+            saved = 0
+            try:
+                while not self._stop.is_set():
+                    count = self.process()
+                    if not count:
+                        break
+                    saved += count
+                delay = 0
+            except Exception:
+                delay = min(self.max_backoff, self.interval * 2 ** self._failures)
+            else:
+                if saved and self.maintain is not None:
+                    try:
+                        self.maintain()
+                    except Exception:
+                        logger.exception("保存先の手入れに失敗しました")
+            with self._idle:
+                self._idle.notify_all()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # バックグラウンドのワーカーを起動する（起動時にジャーナルに残っている回答も保存する）
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="survey-submissions", daemon=True)
+            self._thread.start()
+            self._wake.set()
+        return self
+
+    # 保存待ちの回答がなくなるまで待つ（timeout 秒で諦めた場合は False）
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.status()["pending"]:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            with self._idle:
+                self._wake.set()
+                self._idle.wait(self.interval if remaining is None else min(remaining, self.interval))
+        return True
+
+    # ワーカーを止める（保存待ちの回答はジャーナルに残り、次の起動時に保存される）
+    def close(self, timeout=None):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join(timeout)
+            self._thread = None
+            self._stop.clear()
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="回答送信のジャーナルの状態を表示します")
+    parser.add_argument("journal", help="ジャーナル（SQLite）のパス")
+    parser.add_argument("--retry", action="store_true", help="再試行をやめた回答を再試行に戻す")
+    args = parser.parse_args()
+
+    queue = SubmissionQueue(args.journal, commit=None)
+    if args.retry:
+        print(f"{queue.retry_failed()} 件を再試行に戻しました")
+    status = queue.status()
+    print(f"保存待ち: {status['pending']} 件、再試行をやめた回答: {status['failed']} 件")
+    for submission_id, submitted_at, attempts, error in queue.failed():
+        print(f"  #{submission_id} {datetime.fromtimestamp(submitted_at):%Y-%m-%d %H:%M:%S} {attempts} 回失敗: {error}")
@@ -0,0 +1,255 @@
+# 合成回答の生成（負荷試験・容量見積もり用）
+#
+# 調査定義の列（基本情報、総合評価、expectation_* / satisfaction_*、理由の
+# 3列 × 3、wave、timestamp）をそのまま持つ回答を、列ごとに NumPy で
+# まとめて生成する。評価値は回答者ごとの共通因子と項目ごとのばらつきから
+# 作るので、項目間・期待度と満足度・NPS との間に相関が出る。
+# 生成はチャンク単位で、各チャンクを書き込み先（回答ログ・データセット・
+# 集計済み統計など、DataFrame を受け取る関数）へ順に渡すので、件数に
+# かかわらずメモリ使用量はチャンク1つ分で済む。
+#
+#   python -m survey.synthetic 1000000 --dataset employee_survey_data.parquet
+#   python -m survey.synthetic 5000 --log employee_survey_data.csv --profile profile.json
+import copy
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 分布の既定値（--profile の JSON で一部だけ上書きできる）
+#
+# sections:        セクションごとの評価値の平均と標準偏差（尺度の下端 0〜上端 1 に対する位置）
+# item_sd:         項目ごとの平均のばらつき（項目によって評価の高低が出る。item_seed で固定）
+# correlation:     回答者ごとの共通因子の重み（0: 項目間が無相関、1: 全項目が同じ評価）
+# expectation_correlation: 期待度の共通因子と満足度の共通因子の相関
+# segment_effects: 属性値ごとの評価の上下（例: {"事業部": {"営業本部": -0.05}}）
+# weights:         選択式の基本情報の選択肢の重み（省略した選択肢は 1）
+# numbers:         数値の基本情報の平均と標準偏差（min〜max に丸める）
+# reason_rate:     理由入力ページで理由を書く割合（書かない場合は空文字）
+# waves / days:    調査回の候補と、回答日を散らす日数（現在から遡る）
+DEFAULT_PROFILE = {
+    "sections": {
+        "evaluation": {"mean": 0.62, "sd": 0.22},
+        "expectation": {"mean": 0.68, "sd": 0.2},
+        "satisfaction": {"mean": 0.55, "sd": 0.22},
+    },
+    "item_sd": 0.08,
+    "item_seed": 0,
+    "correlation": 0.5,
+    "expectation_correlation": 0.3,
+    "segment_effects": {},
+    "weights": {},
+    "numbers": {
+        "年齢": {"mean": 40, "sd": 11},
+        "残業時間": {"mean": 20, "sd": 12},
+        "有給休暇消化率": {"mean": 60, "sd": 25},
+        "年収": {"mean": 550, "sd": 180},
+    },
+    "reason_rate": 0.7,
+    "waves": ["synthetic"],
+    "days": 30,
+}
+
+REASON_TEXTS = (
+    "業務量に対して人員が足りていないと感じるため",
+    "上司から定期的にフィードバックをもらえているため",
+    "評価の基準が分かりにくいため",
+    "柔軟な働き方ができるようになったため",
+    "研修や学習の機会が少ないため",
+    "チームの雰囲気が良く、相談しやすいため",
+    "給与が業務内容に見合っていないと感じるため",
+    "会社の方針が現場まで伝わっていないため",
+)
+
+
+# 既定値に profile を重ねる（入れ子の dict は項目ごとに上書き）
+def merge_profile(profile=None, base=DEFAULT_PROFILE):
+    merged = copy.deepcopy(base)
+    for key, value in (profile or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_profile(value, merged[key])
+        else:
+            merged[key] = value
+    return merged
+
+
+# 文字列の列はカテゴリ型で作る（値ごとの文字列オブジェクトを作らずに済む）
+# codes が -1 の行は欠損になる
+def _categorical(values, codes):
+    categories, inverse = np.unique(np.array(values, dtype=object), return_inverse=True)
+    return pd.Categorical.from_codes(np.where(codes < 0, -1, inverse[codes]), categories=categories)
+
+
+def _choice(rng, options, weights, n):
+    p = np.array([float(weights.get(str(option), 1)) for option in options])
+    return _categorical(options, rng.choice(len(options), n, p=p / p.sum()))
+
+
+def _demographics(schema, profile, rng, n):
+    columns = {}
+    for question in schema.demographics:
+        if question.widget == "select":
+            columns[question.key] = _choice(rng, question.options, profile["weights"].get(question.key, {}), n)
+        elif question.widget == "year":
+            columns[question.key] = datetime.now().year - np.minimum(rng.geometric(0.12, n) - 1, question.years - 1)
+        else:
+            spec = profile["numbers"].get(question.key)
+            low = question.min if question.min is not None else 0
+            high = question.max if question.max is not None else np.iinfo(np.int32).max
+            if spec is None:
+                values = rng.integers(low, high + 1, n)
+            else:
+                values = np.rint(rng.normal(spec["mean"], spec["sd"], n)).clip(low, high).astype(np.int64)
+            if question.step and question.step > 1:
+                values = (values // question.step) * question.step
+            columns[question.key] = values
+    return columns
+
+
+# 属性値による評価の上下（回答者ごとの値）
+def _segment_shift(columns, profile, n):
+    shift = np.zeros(n)
+    for column, effects in profile["segment_effects"].items():
+        values = columns.get(column)
+        if values is None:
+            continue
+        for value, effect in effects.items():
+            shift += np.where(values == value, effect, 0.0)
+    return shift
+
+
+# 質問ごとに「尺度上の位置（0〜1）→ 評価値」へ丸めた行列（n × 質問数）
+def _ratings(questions, section, factor, profile, rng):
+    n, m = len(factor), len(questions)
+    spec = profile["sections"][section]
+    rho = profile["correlation"]
+    # 項目ごとの平均のずれはチャンクをまたいで同じにする
+    item_rng = np.random.default_rng([profile["item_seed"], ("evaluation", "expectation", "satisfaction").index(section)])
+    offsets = item_rng.normal(0, profile["item_sd"], m).astype(np.float32)
+    position = rng.standard_normal((n, m), dtype=np.float32)
+    position *= np.float32(spec["sd"] * np.sqrt(1 - rho))
+    position += (spec["sd"] * np.sqrt(rho) * factor).astype(np.float32)[:, None]
+    position += offsets + np.float32(spec["mean"])
+
+    # 質問ごとの選択肢の値を1つの表にして、丸めた位置から一度に引く
+    sizes = np.array([len(q.scale.values) for q in questions])
+    table = np.zeros((m, sizes.max()), dtype=np.int8)
+    for j, question in enumerate(questions):
+        table[j, :sizes[j]] = question.scale.values
+    position *= (sizes - 1).astype(np.float32)
+    index = np.rint(position, out=position).clip(0, sizes - 1).astype(np.intp)
+    return table[np.arange(m), index]
+
+
+# 理由入力ページの3列（対象の評価の項目から1つを無作為に選ぶ。対象がなければ欠損）
+def _reasons(prompt, questions, matrix, profile, rng):
+    n = len(matrix)
+    mask = np.zeros(matrix.shape, dtype=bool)
+    for rating in prompt.ratings:
+        mask |= matrix == rating
+    has_item = mask.any(axis=1)
+    chosen = np.argmax(rng.random(matrix.shape, dtype=np.float32) * mask, axis=1)
+    rows = np.arange(n)
+
+    missing = np.where(has_item, 0, -1)
+    scale = questions[0].scale
+    ratings = np.searchsorted(np.array(scale.values), matrix[rows, chosen])
+    # 理由を書かない回答は空文字（REASON_TEXTS の後ろに足した "" の位置）
+    reasons = np.where(rng.random(n) < profile["reason_rate"], rng.integers(0, len(REASON_TEXTS), n), len(REASON_TEXTS))
+
+    item_column, rating_column, reason_column = prompt.columns
+    return {
+        item_column: _categorical([f"{q.category} - {q.text}" for q in questions], chosen | missing),
+        rating_column: _categorical([scale.label(value) for value in scale.values], ratings | missing),
+        reason_column: _categorical(list(REASON_TEXTS) + [""], reasons | missing),
+    }
+
+
+# n 件の合成回答を1つの DataFrame として作る
+def generate_frame(schema, n, rng=None, profile=None):
+    rng = np.random.default_rng(rng)
+    profile = merge_profile(profile)
+    columns = _demographics(schema, profile, rng, n)
+    shift = _segment_shift(columns, profile, n)
+
+    # 満足度・総合評価は共通因子 factor、期待度は factor と相関する別の因子に従う
+    factor = rng.standard_normal(n) + shift / max(profile["sections"]["satisfaction"]["sd"], 1e-9)
+    r = profile["expectation_correlation"]
+    expectation_factor = r * factor + np.sqrt(1 - r * r) * rng.standard_normal(n)
+
+    sections = {
+        "evaluation": _ratings(schema.evaluation, "evaluation", factor, profile, rng),
+        "expectation": _ratings(schema.expectation, "expectation", expectation_factor, profile, rng),
+        "satisfaction": _ratings(schema.satisfaction, "satisfaction", factor, profile, rng),
+    }
+    for section, matrix in sections.items():
+        for j, question in enumerate(schema.section(section)):
+            columns[question.response_key] = matrix[:, j]
+    for prompt in schema.reasons.values():
+        columns.update(_reasons(prompt, schema.section(prompt.section), sections[prompt.section], profile, rng))
+
+    columns["wave"] = _categorical(profile["waves"], rng.integers(0, len(profile["waves"]), n))
+    now = pd.Timestamp.now().floor("s")
+    columns["timestamp"] = now - pd.to_timedelta(rng.integers(0, max(profile["days"], 1) * 86400, n), unit="s")
+    return pd.DataFrame(columns).reindex(columns=list(schema.columns))
+
+
+# n 件を chunk_size 件ずつ生成する
+def generate(schema, n, chunk_size=100_000, seed=None, profile=None):
+    rng = np.random.default_rng(seed)
+    profile = merge_profile(profile)
+    for start in range(0, n, chunk_size):
+        yield generate_frame(schema, min(chunk_size, n - start), rng, profile)
+
+
+# 生成したチャンクを書き込み先（DataFrame を受け取る関数）へ順に渡し、件数を返す
+def write(chunks, sinks):
+    count = 0
+    for chunk in chunks:
+        for sink in sinks:
+            sink(chunk)
+        count += len(chunk)
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from survey.aggregates import AggregateStore
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog
+
+    parser = argparse.ArgumentParser(description="調査定義に沿った合成回答を生成して書き込みます")
+    parser.add_argument("n", type=int, help="生成する回答数")
+    parser.add_argument("--log", help="追記する回答ログ（CSV）のパス")
+    parser.add_argument("--dataset", help="書き込む Parquet データセットのディレクトリ")
+    parser.add_argument("--aggregates", help="加算する集計済み統計（SQLite）のパス")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="1チャンクの件数")
+    parser.add_argument("--seed", type=int, help="乱数のシード")
+    parser.add_argument("--profile", help="分布の設定（JSON。DEFAULT_PROFILE の一部を上書き）")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    profile = None
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+
+    sinks = []
+    if args.log:
+        sinks.append(AppendOnlyLog(args.log, schema.columns).extend)
+    if args.dataset:
+        sinks.append(ResponseDataset(args.dataset, response_dtypes(schema)).write)
+    if args.aggregates:
+        sinks.append(AggregateStore(args.aggregates, schema).add_frame)
+
+    start = time.perf_counter()
+    count = write(generate(schema, args.n, args.chunk_size, args.seed, profile), sinks)
+    elapsed = time.perf_counter() - start
+    print(f"{count} 件を生成しました（{elapsed:.1f} 秒、{count / elapsed:,.0f} 件/秒）")
+    if not sinks:
+        print("書き込み先が指定されていないため、生成のみ行いました（--log / --dataset / --aggregates）")
@@ -0,0 +1,173 @@
+# 回答の検証と正規化（保存の前段）
+#
+# ページの入力を保存する前に、調査定義に沿って型をそろえ、値の範囲と
+# 未回答を確かめる。自由入力の数値（年収など）は全角数字・桁区切り・
+# 「万」「億」などの単位を正規化して整数にするので、回答ログには
+# 型どおりの値だけが入り、集計のたびに文字列を整える必要はない。
+#
+# 検証の結果は (正規化した回答, エラー) で返す。エラーは {列: メッセージ} で、
+# 空なら保存してよい。
+import re
+import unicodedata
+from datetime import datetime
+
+# 数値に添えられる単位（円を 1 として）
+# 万・億は桁のまとまりの単位で、千・百・十はまとまりの中の単位（「5千万」は 5000万）
+UNITS = {"億": 100_000_000, "万": 10_000}
+GROUP_UNITS = {"千": 1_000, "百": 100, "十": 10}
+
+_NUMBER = r"\d+(?:\.\d+)?"
+# 単位の付いた数値（数字のない「千」「百」「十」は 1 つ分）
+_TOKEN = re.compile(rf"({_NUMBER})?([億万千百十])")
+# 単位の後に続く端数と「円」
+_REST = re.compile(rf"({_NUMBER})?(円)?$")
+
+
+# 自由入力の数値を unit（円を 1 とした単位）での数値にする。読めなければ None
+# 「1億2000万」「5千万」「500万円」「5,000,000円」のような表記を読む（単位は大きい順）。
+# 単位のない数値は unit での値（万円の項目の「500」は 500）とみなす。先頭の「-」は負の数
+def parse_number(text, unit=1):
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return text
+    s = unicodedata.normalize("NFKC", str(text))
+    s = re.sub(r"[\s,、]", "", s)
+    sign = -1 if s[:1] in ("-", "−") else 1
+    s = s[1:] if sign < 0 else s
+    total, group, last, last_in_group, units = 0.0, 0.0, float("inf"), float("inf"), False
+    pos = 0
+    while (match := _TOKEN.match(s, pos)) is not None:
+        number, name = match.group(1), match.group(2)
+        if name in UNITS:
+            # 単位は大きい順で、まとまりの単位の前には数が要る（「万円」「1万億」は読まない）
+            value = group + (float(number) if number else 0)
+            if UNITS[name] >= last or not value:
+                return None
+            total += value * UNITS[name]
+            group, last, last_in_group = 0.0, UNITS[name], float("inf")
+        else:
+            if GROUP_UNITS[name] >= last_in_group:
+                return None
+            group += (float(number) if number else 1) * GROUP_UNITS[name]
+            last_in_group = GROUP_UNITS[name]
+        units = True
+        pos = match.end()
+    match = _REST.match(s, pos)
+    if not s or match is None:
+        return None
+    rest, yen = match.group(1), match.group(2)
+    if not units and not yen:
+        return sign * float(rest) if rest else None
+    if not units and not rest:
+        return None
+    return sign * (total + group + (float(rest) if rest else 0)) / unit
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(round(number)) if number == number else None
+
+
+def _check_range(question, value, low, high):
+    if low is not None and value < low:
+        return f"{question.label}は {low} 以上で入力してください"
+    if high is not None and value > high:
+        return f"{question.label}は {high} 以下で入力してください"
+    return None
+
+
+# 基本情報1問の値を正規化する。(値, エラーメッセージ) を返す
+def normalize_demographic(question, value):
+    if question.widget == "select":
+        if value not in question.options:
+            return None, f"{question.label}を選択してください"
+        return value, None
+
+    if question.widget == "year":
+        current = datetime.now().year
+        low, high = current - question.years + 1, current
+    else:
+        low, high = question.min, question.max
+
+    if question.widget == "text" and not question.dtype.startswith(("Int", "UInt", "Float")):
+        text = unicodedata.normalize("NFKC", str(value or "")).strip()
+        return (text or None), None
+
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None, f"{question.label}を入力してください"
+    number = parse_number(value, question.unit) if isinstance(value, str) else value
+    if question.dtype.startswith("Float"):
+        number = None if number is None else float(number)
+    else:
+        number = _integer(number)
+    if number is None:
+        return None, f"{question.label}は数字で入力してください"
+    if number < 0 and (low is None or low >= 0):
+        return None, f"{question.label}にマイナスの値は入力できません"
+    return number, _check_range(question, number, low, high)
+
+
+# 基本情報をまとめて正規化する
+def validate_demographics(schema, responses):
+    values, errors = {}, {}
+    for question in schema.demographics:
+        value, error = normalize_demographic(question, responses.get(question.key))
+        if error:
+            errors[question.key] = error
+        else:
+            values[question.key] = value
+    return values, errors
+
+
+# 評価の回答を尺度の値（int）にそろえる。未回答・尺度にない値はエラー
+def validate_ratings(questions, responses):
+    values, errors = {}, {}
+    for question in questions:
+        value = _integer(responses.get(question.response_key))
+        if value is None:
+            errors[question.response_key] = f"未回答です: {question.text}"
+        elif value not in question.scale.text:
+            errors[question.response_key] = f"選択肢にない値です: {question.text}"
+        else:
+            values[question.response_key] = value
+    return values, errors
+
+
+# 理由入力ページの3列（対象項目がなかった場合は列ごとない）
+def validate_reasons(schema, responses):
+    values, errors = {}, {}
+    for prompt in schema.reasons.values():
+        item_column, rating_column, reason_column = prompt.columns
+        if item_column not in responses:
+            continue
+        labels = schema.section(prompt.section)[0].scale.labels
+        rating = responses.get(rating_column)
+        if labels and rating is not None and rating not in labels:
+            errors[rating_column] = f"評価の値が不正です: {rating}"
+            continue
+        values[item_column] = responses.get(item_column)
+        values[rating_column] = rating
+        values[reason_column] = unicodedata.normalize("NFKC", str(responses.get(reason_column) or "")).strip()
+    return values, errors
+
+
+# 送信する回答全体を検証・正規化する（保存列の順に並べ、調査定義にない項目は落とす）
+def validate_response(schema, responses):
+    record, errors = {}, {}
+    for values, section_errors in (
+        validate_demographics(schema, responses),
+        validate_ratings(schema.questions.values(), responses),
+        validate_reasons(schema, responses),
+    ):
+        record.update(values)
+        errors.update(section_errors)
+    for column in ("wave", "timestamp"):
+        if responses.get(column) is not None:
+            record[column] = responses[column]
+    return {column: record[column] for column in schema.columns if column in record}, errors
@@ -0,0 +1 @@
+# 画面（ページ）ごとの描画。エントリポイントが表示するときに読み込む
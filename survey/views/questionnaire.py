@@ -0,0 +1,312 @@
+# 回答ページ（イントロからサンキューページまで）
+#
+# 集計・保存のモジュール（pandas に依存するもの）は読み込まない。
+# 回答の送信時に survey.app が保存先のモジュールを初めて読み込む。
+from datetime import datetime
+
+import streamlit as st
+
+from survey import app, validation
+from survey.answers import AnswerIndex
+from survey.widgets import answer_block, legend, next_button, question_group, stylesheet, validate_answers
+
+# スクロール処理
+scroll_to_top = lambda: st.markdown('<script>window.scrollTo(0, 0);</script>', unsafe_allow_html=True)
+
+# イントロページ
+@app.METRICS.timed
+def show_intro():
+    schema = app.schema()
+    scroll_to_top()
+    st.title(schema.title)
+    st.markdown("""
+    このアンケートは、従業員の皆様の満足度と期待度を調査し、より良い職場環境づくりに役立てることを目的としています。
+    
+    各質問について、**現在の満足度**と**今後の期待度**の両方をお答えいただきます。
+    回答は匿名で処理され、個人が特定されることはありません。
+    
+    アンケートの所要時間は約15分です。ご協力をお願いいたします。
+    """)
+    
+    if st.button("アンケートを開始する", type="primary"):
+        app.go_to(2)
+
+# 検証エラーの表示
+def show_errors(errors):
+    st.error(f"入力内容に {len(errors)} 件の不備があります。")
+    st.markdown("\n".join(f"- {message}" for message in errors.values()))
+
+# デモグラフィックページ
+@app.METRICS.timed
+def show_demographics():
+    schema = app.schema()
+    scroll_to_top()
+    st.title("基本情報")
+    st.markdown("以下の基本情報をご入力ください。")
+    
+    with st.form("demographics_form"):
+        for question in schema.demographics:
+            key = app.demographic_key(question)
+            # チェックポイントから再開したときは入力欄に回答が入っているので、既定値は渡さない
+            default = {} if key in st.session_state else {"value": question.value}
+            if question.widget == "number":
+                st.session_state.responses[question.key] = st.number_input(
+                    question.label,
+                    min_value=question.min,
+                    max_value=question.max,
+                    step=question.step,
+                    key=key,
+                    **default
+                )
+            elif question.widget == "slider":
+                st.session_state.responses[question.key] = st.slider(
+                    question.label,
+                    min_value=question.min,
+                    max_value=question.max,
+                    step=question.step,
+                    key=key,
+                    **default
+                )
+            elif question.widget == "year":
+                current_year = datetime.now().year
+                st.session_state.responses[question.key] = st.selectbox(
+                    question.label,
+                    options=list(range(current_year, current_year - question.years, -1)),
+                    key=key
+                )
+            elif question.widget == "text":
+                st.session_state.responses[question.key] = st.text_input(
+                    question.label,
+                    help=question.help,
+                    key=key,
+                    **default
+                )
+            else:
+                st.session_state.responses[question.key] = st.selectbox(
+                    question.label,
+                    options=question.options,
+                    key=key
+                )
+        
+        submit_button = st.form_submit_button("次へ進む", type="primary")
+    
+    if submit_button:
+        # 入力を正規化して保存する（全角数字・「万」などの単位もここで数値にする）
+        values, errors = validation.validate_demographics(schema, st.session_state.responses)
+        st.session_state.responses.update(values)
+        if errors:
+            show_errors(errors)
+        else:
+            app.go_to(3)
+
+# 評価項目ページ
+@app.METRICS.timed
+def show_evaluation():
+    schema = app.schema()
+    # 回答モード（調査定義の answer_mode。batch なら st.form でまとめて確定する）
+    batch = schema.answer_mode == "batch"
+    scroll_to_top()
+    st.title("総合評価")
+    st.markdown("以下の質問について、あなたの評価をお聞かせください。")
+    
+    # 11段階評価の説明をカード形式で表示
+    legend(schema.scales['rating_11'])
+    
+    with answer_block("evaluation_form", batch):
+        # 11段階評価の質問
+        st.markdown("## 総合評価項目")
+        
+        question_group([q for q in schema.evaluation if q.scale.name == 'rating_11'], batch)
+        
+        # 活躍貢献度の説明
+        st.markdown("## 活躍貢献度")
+        
+        # 選択肢の説明をカード形式で表示
+        legend(schema.scales['contribution_5'])
+        
+        # 活躍貢献度の質問
+        question_group([q for q in schema.evaluation if q.scale.name == 'contribution_5'], batch)
+        
+        submitted = next_button("次へ進む", "next_button_eval", batch)
+    
+    if submitted and validate_answers(schema.evaluation):
+        app.go_to(4)
+
+# 期待項目ページ
+@app.METRICS.timed
+def show_expectation():
+    schema = app.schema()
+    batch = schema.answer_mode == "batch"
+    scroll_to_top()
+    st.title("期待項目の確認")
+    st.markdown("以下の項目について、今の会社にどの程度**期待**しているかを率直にお答えください。")
+    
+    # 選択肢の説明をカード形式で表示
+    legend(schema.scales['expectation_5'])
+    
+    # カテゴリごとに質問を表示
+    with answer_block("expectation_form", batch):
+        for category in schema.categories:
+            st.markdown(f"## {category.name}")
+            
+            # 各質問項目（回答ごとの再実行はこのカテゴリだけ）
+            question_group(category.expectation, batch)
+        
+        # 次へ進むボタン
+        submitted = next_button("次へ進む", "next_button_exp", batch)
+    
+    if submitted and validate_answers(schema.expectation):
+        app.go_to(5)
+
+# 理由入力ページの共通部分
+# 対象項目の中から1つ選んで理由を入力してもらい、ボタンが押されたら True を返す
+def show_reason(prompt, button_label):
+    scroll_to_top()
+    st.title(prompt.title)
+    responses = st.session_state.responses
+    
+    # 対象の評価（例: 1または2）を選択した項目（回答時に更新されるインデックスから引く）
+    items = st.session_state.answer_index.questions(prompt.section, prompt.ratings)
+    
+    if not items:
+        st.info(prompt.empty)
+        return st.button(button_label, type="primary")
+    
+    st.markdown(prompt.intro)
+    
+    # 項目の選択
+    selected = st.selectbox(
+        "項目を選択してください",
+        items,
+        format_func=lambda q: f"{q.category} - {q.text} ({q.scale.label(responses[q.response_key])})"
+    )
+    rating = selected.scale.label(responses[selected.response_key])
+    
+    # 理由の入力
+    reason = st.text_area(
+        f"「{selected.text}」について、なぜ「{rating}」と回答されたのか、理由をお聞かせください。",
+        height=150
+    )
+    
+    if not st.button(button_label, type="primary"):
+        return False
+    
+    # 回答を保存
+    item_column, rating_column, reason_column = prompt.columns
+    responses[item_column] = f"{selected.category} - {selected.text}"
+    responses[rating_column] = rating
+    responses[reason_column] = reason
+    return True
+
+# 期待していない項目の理由ページ
+@app.METRICS.timed
+def show_low_expectation_reason():
+    schema = app.schema()
+    if show_reason(schema.reasons["low_expectation"], "次へ進む"):
+        app.go_to(6)
+
+# 満足項目ページ
+@app.METRICS.timed
+def show_satisfaction():
+    schema = app.schema()
+    batch = schema.answer_mode == "batch"
+    scroll_to_top()
+    st.title("満足項目の確認")
+    st.markdown("以下の項目について、今の会社にどの程度**満足**しているかを率直にお答えください。")
+    
+    # 選択肢の説明をカード形式で表示
+    legend(schema.scales['satisfaction_5'])
+    
+    # カテゴリごとに質問を表示
+    with answer_block("satisfaction_form", batch):
+        for category in schema.categories:
+            st.markdown(f"## {category.name}")
+            
+            # 各質問項目（回答ごとの再実行はこのカテゴリだけ）
+            question_group(category.satisfaction, batch)
+        
+        # 次へ進むボタン
+        submitted = next_button("次へ進む", "next_button_sat", batch)
+    
+    if submitted and validate_answers(schema.satisfaction):
+        app.go_to(7)
+
+# 満足していない項目の理由ページ
+@app.METRICS.timed
+def show_low_satisfaction_reason():
+    schema = app.schema()
+    if show_reason(schema.reasons["low_satisfaction"], "次へ進む"):
+        app.go_to(8)
+
+# 満足している項目の理由ページ
+@app.METRICS.timed
+def show_high_satisfaction_reason():
+    survey_id = app.survey_id()
+    schema = app.schema()
+    if show_reason(schema.reasons["high_satisfaction"], "回答を送信する"):
+        # 調査回とタイムスタンプを追加
+        now = datetime.now()
+        wave = app.current_wave(now)
+        if app.get_wave_store(survey_id).is_closed(wave):
+            st.error(f"この調査（{wave}）の回答は締め切りました。")
+            return
+        st.session_state.responses['wave'] = wave
+        st.session_state.responses['timestamp'] = now.strftime("%Y-%m-%d %H:%M:%S")
+        
+        # 検証・正規化してから保存（不備があれば送信せずに知らせる）
+        record, errors = validation.validate_response(schema, st.session_state.responses)
+        if errors:
+            show_errors(errors)
+            return
+        app.save_data(record)
+        app.discard_checkpoint()
+        
+        # サンキューページへ
+        app.go_to(9)
+
+# サンキューページ
+@app.METRICS.timed
+def show_thank_you():
+    scroll_to_top()
+    st.title("ご回答ありがとうございました")
+    st.markdown("""
+    アンケートへのご協力ありがとうございました。
+    いただいた回答は、より良い職場環境づくりのために活用させていただきます。
+    """)
+    
+    if st.button("新しいアンケートを開始", type="primary"):
+        # セッション状態をリセット
+        st.session_state.responses = {}
+        st.session_state.answer_index = AnswerIndex()
+        app.clear_demographics()
+        app.discard_checkpoint()
+        app.go_to(1)
+
+
+# ページ番号ごとの描画関数
+PAGES = {
+    1: show_intro,
+    2: show_demographics,
+    3: show_evaluation,
+    4: show_expectation,
+    5: show_low_expectation_reason,
+    6: show_satisfaction,
+    7: show_low_satisfaction_reason,
+    8: show_high_satisfaction_reason,
+    9: show_thank_you,
+}
+
+def show_page(page):
+    # カスタムCSS（static/survey.css）
+    stylesheet()
+    
+    # プログレスバーの表示（ページ1は除く）
+    if page > 1 and page < 9:
+        progress_value = (page - 1) / 8
+        st.progress(progress_value)
+        st.write(f"ページ {page - 1}/8")
+    
+    # ページ表示
+    show = PAGES.get(page)
+    if show is not None:
+        show()
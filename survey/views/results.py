@@ -0,0 +1,334 @@
+# 集計結果ページ（?view=results で表示）
+#
+# 集計・分析のモジュール（pandas / numpy に依存する）は、このページを
+# 最初に表示したときにこのモジュールと一緒に読み込む。
+import hmac
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from survey import analytics, anonymity, app, drivers, export, waves
+
+# 集計結果ページのパスワード（未設定なら集計結果ページは表示しない。回答データのダウンロードを含むため）
+ADMIN_PASSWORD = os.environ.get("SURVEY_ADMIN_PASSWORD")
+
+# 属性別の集計で表示する最小の回答者数（これより少ない区分は個人が特定されうるので表示しない）
+MIN_CELL_SIZE = int(os.environ.get("SURVEY_MIN_CELL_SIZE", anonymity.K_MIN))
+
+# 入力されたパスワードが設定と一致するか（一致した長さが応答時間からわからないよう一定時間で比べる）
+def authorized(password):
+    return hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8"))
+
+# 集計結果ページ（?view=results で表示）
+@app.METRICS.timed
+def show_results():
+    survey_id = app.survey_id()
+    st.title("集計結果")
+    
+    if not ADMIN_PASSWORD:
+        st.error("集計結果ページを表示するには、環境変数 SURVEY_ADMIN_PASSWORD にパスワードを設定してください。")
+        return
+    if not authorized(st.text_input("パスワード", type="password")):
+        st.info("集計結果を表示するにはパスワードを入力してください。")
+        return
+    
+    # 保存のたびに更新される集計済み統計から、選んだ調査回（既定は実施中の調査回）の分を読む
+    # （回答全件は読み込まない）
+    store = app.get_aggregate_store(survey_id)
+    stored = store.waves()
+    if not stored:
+        st.info("まだ回答がありません。")
+        return
+    current = app.current_wave(datetime.now())
+    options = sorted(set(stored) | {current})
+    wave = st.selectbox("調査回", options, index=options.index(current))
+    show_summary(store, wave)
+    
+    # 属性の組み合わせ別の集計（回答全件を読むので、属性を選んだときだけ計算する）
+    st.markdown("### 属性の組み合わせ別")
+    show_cross_tab()
+    
+    # 理由の自由記述（索引から検索・語の頻度を引くので、回答ログは読まない）
+    st.markdown("## 理由の自由記述")
+    show_reasons()
+    
+    # 調査回ごとの推移（締め切った調査回はスナップショットから読む。実施中の調査回は回答全件を
+    # 読んで集計するので、含めることを選んだときだけ計算する）
+    st.markdown("## 調査回ごとの推移")
+    show_trend(st.toggle("実施中の調査回を含める"))
+    
+    # キードライバー分析（回答全件を読むので、表示を選んだときだけ計算する）
+    st.markdown("## 満足度の影響要因")
+    if st.toggle("キードライバー分析を表示する"):
+        show_drivers()
+    
+    # 回答データのダウンロード
+    st.markdown("## 回答データのダウンロード")
+    show_export()
+
+# 調査回の集計（NPS・ギャップ・属性別。集計済み統計から読む）
+def show_summary(store, wave):
+    nps = store.nps_summary(wave)
+    if not nps["responses"]:
+        st.info("この調査回の回答はまだありません。")
+        return
+    
+    # NPS
+    st.markdown("## NPS")
+    cols = st.columns(4)
+    cols[0].metric("NPS", f"{nps['nps']:.1f}")
+    cols[1].metric("推奨者（9〜10）", f"{nps['promoters']}", f"{nps['promoters'] / nps['responses']:.0%}", delta_color="off")
+    cols[2].metric("中立者（7〜8）", f"{nps['passives']}", f"{nps['passives'] / nps['responses']:.0%}", delta_color="off")
+    cols[3].metric("批判者（0〜6）", f"{nps['detractors']}", f"{nps['detractors'] / nps['responses']:.0%}", delta_color="off")
+    st.caption(f"回答数: {nps['responses']}")
+    
+    # カテゴリ別・項目別のギャップ
+    st.markdown("## 期待度と満足度のギャップ")
+    st.markdown("ギャップ = 期待度 − 満足度（回答者ごとの差の平均）。値が大きいほど期待に対して満足が不足しています。")
+    items = store.item_gaps(wave)
+    if not store.paired_gaps():
+        st.caption("この集計済み統計には回答者ごとの差がないため、ギャップは期待度と満足度の平均の差です"
+                   "（python -m survey.aggregates rebuild で作り直すと回答者ごとの差の平均になります）。")
+    st.dataframe(analytics.category_gaps(items).style.format(precision=2))
+    
+    items = items.sort_values("gap", ascending=False)
+    st.markdown("### 優先度マップ")
+    st.scatter_chart(items, x="expectation", y="satisfaction", color="quadrant")
+    st.dataframe(
+        items[["category", "question", "expectation", "satisfaction", "gap", "quadrant", "responses"]],
+        hide_index=True,
+        column_config={
+            "category": "カテゴリ",
+            "question": "項目",
+            "expectation": st.column_config.NumberColumn("期待度", format="%.2f"),
+            "satisfaction": st.column_config.NumberColumn("満足度", format="%.2f"),
+            "gap": st.column_config.NumberColumn("ギャップ", format="%.2f"),
+            "quadrant": "象限",
+            "responses": "回答数",
+        },
+    )
+    
+    # 属性別のクロス集計（回答者が MIN_CELL_SIZE 人未満の属性値は表示しない）
+    # 属性は調査定義の選択式の基本情報（選択式の基本情報がない調査では表示しない）
+    segments = analytics.segment_columns(app.schema())
+    if segments:
+        st.markdown("## 属性別")
+        labels = {question.key: question.label for question in app.schema().demographics}
+        for tab, segment in zip(st.tabs([labels[segment] for segment in segments]), segments):
+            with tab:
+                summary, hidden = anonymity.suppress(store.segment_summary(segment, wave), MIN_CELL_SIZE)
+                st.dataframe(summary.style.format(precision=2))
+                if hidden:
+                    st.caption(f"回答者が {MIN_CELL_SIZE} 人未満などの {hidden} 区分は表示していません。")
+
+def show_reasons():
+    survey_id = app.survey_id()
+    schema = app.schema()
+    index = app.get_reason_index(survey_id)
+    prompts = {prompt.key: prompt.title for prompt in schema.reasons.values()}
+    categories = [category.name for category in schema.categories]
+    
+    search, frequencies = st.tabs(["検索", "よく使われる語"])
+    with search:
+        query = st.text_input("キーワード（空白区切りですべてを含む記述、\"...\" でフレーズ）")
+        cols = st.columns(2)
+        prompt = cols[0].selectbox("理由の種類", [None, *prompts], format_func=lambda key: "すべて" if key is None else prompts[key])
+        category = cols[1].selectbox("項目のカテゴリ", [None, *categories], format_func=lambda name: name or "すべて")
+        if query:
+            total, matches = index.search(query, prompt, category)
+            st.caption(f"{total} 件" + (f"（新しい順に {len(matches)} 件を表示）" if total > len(matches) else ""))
+            st.dataframe(
+                matches.assign(prompt=matches["prompt"].map(prompts))[["prompt", "item", "rating", "text", "timestamp"]],
+                hide_index=True,
+                column_config={
+                    "prompt": "理由の種類",
+                    "item": "項目",
+                    "rating": "評価",
+                    "text": "理由",
+                    "timestamp": "回答日時",
+                },
+            )
+    
+    with frequencies:
+        cols = st.columns(2)
+        prompt = cols[0].selectbox("理由の種類", list(prompts), format_func=prompts.get, key="term_prompt")
+        category = cols[1].selectbox("項目のカテゴリ", [None, *categories], format_func=lambda name: name or "すべて", key="term_category")
+        terms = index.term_frequencies(prompt, category)
+        if terms.empty:
+            st.info("まだ記述がありません。")
+        else:
+            st.bar_chart(terms, x="term", y="documents", x_label="語", y_label="記述数", horizontal=True, sort="-documents")
+
+# 属性の組み合わせ別の集計（回答データの版と、属性・秘匿方法の組をキーにキャッシュする）
+@st.cache_data(max_entries=32, show_spinner="集計しています…")
+def _cross_tab(survey_id, version, by, k, mode):
+    schema = app.get_schema(survey_id)
+    df = app.cached_responses(survey_id, version, tuple(anonymity.analysis_columns(schema, by)))
+    return anonymity.cross_tab(df, schema, by, k, mode)
+
+def show_cross_tab():
+    survey_id = app.survey_id()
+    schema = app.schema()
+    labels = {question.key: question.label for question in schema.demographics}
+    cols = st.columns([3, 1])
+    by = cols[0].multiselect("集計する属性", list(labels), format_func=labels.get)
+    mode = cols[1].radio(
+        "少人数の区分",
+        anonymity.MODES,
+        format_func={"suppress": "表示しない", "merge": "「その他」にまとめる"}.get,
+        horizontal=True,
+    )
+    if not by:
+        st.caption("属性を選ぶと、その組み合わせごとに集計します（例: 事業部 × 役職 × 年齢）。年齢・年収などの数値は区間に分けて集計します。")
+        return
+    
+    version = app.responses_version(survey_id)
+    summary, hidden = _cross_tab(survey_id, version, tuple(by), MIN_CELL_SIZE, mode)
+    if summary.empty:
+        st.info(f"回答者が {MIN_CELL_SIZE} 人以上の区分がありません。属性を減らしてください。")
+    else:
+        st.dataframe(summary.style.format(precision=2))
+    if hidden:
+        verb = "「その他（少人数）」にまとめています" if mode == "merge" else "表示していません"
+        st.caption(f"回答者が {MIN_CELL_SIZE} 人未満などの {hidden} 区分は{verb}。")
+
+# 実施中の調査回の指標の件数・合計・二乗和（回答データの版と、締め切った調査回の組をキーにキャッシュする）
+@st.cache_data(max_entries=4, show_spinner="調査回ごとに集計しています…")
+def _open_wave_moments(survey_id, version, closed):
+    schema = app.get_schema(survey_id)
+    dataset = app.get_response_dataset(survey_id)
+    df = waves.open_responses(app.get_response_log(survey_id), dataset, closed, waves.analysis_columns(schema))
+    return waves.wave_moments(df, schema, dataset.default_wave)
+
+def show_trend(include_open):
+    survey_id = app.survey_id()
+    schema = app.schema()
+    store = app.get_wave_store(survey_id)
+    moments = None
+    if include_open:
+        moments = _open_wave_moments(survey_id, app.responses_version(survey_id), store.closed())
+    
+    segments = {question.key: question for question in schema.demographics if question.widget == "select"}
+    cols = st.columns(4)
+    kind = cols[0].selectbox("指標", waves.KINDS, format_func={"overall": "総合評価・NPS", "category": "カテゴリ別", "item": "項目別"}.get)
+    section = cols[1].selectbox("期待度・満足度", list(waves.SECTIONS), index=1, format_func=waves.SECTIONS.get, disabled=kind == "overall")
+    segment = cols[2].selectbox("属性", [None, *segments], format_func=lambda key: "全体" if key is None else segments[key].label)
+    value = cols[3].selectbox("属性値", segments[segment].options if segment else [], disabled=segment is None)
+    # 属性値で絞ったときは、回答者が少ない調査回の値を表示しない
+    table = store.trend(moments, segment_column=segment, segment_value=value, min_responses=MIN_CELL_SIZE if segment else 1)
+    if table["wave"].nunique() < 2:
+        if include_open:
+            st.info("比較できる調査回がまだありません。2回目の調査回から推移を表示します。")
+        else:
+            st.info("比較できる締め切った調査回がまだありません。実施中の調査回を含めると、その回答も集計して推移を表示します。")
+        return
+    
+    table = table[table["kind"] == kind]
+    if kind != "overall":
+        table = table[table["section"] == section]
+        st.line_chart(table.pivot(index="wave", columns="category" if kind == "category" else "label", values="mean"))
+    latest = table["wave"].max()
+    st.markdown(f"**{latest}** の前回との差（* は多重比較を補正して 5% 水準で有意）")
+    latest = table[table["wave"] == latest]
+    st.dataframe(
+        latest.assign(mark=latest["significant"].map({True: "*", False: ""}))[["label", "n", "mean", "delta", "p_value", "q_value", "mark"]],
+        hide_index=True,
+        column_config={
+            "label": "指標",
+            "n": "回答数",
+            "mean": st.column_config.NumberColumn("平均", format="%.2f"),
+            "delta": st.column_config.NumberColumn("前回との差", format="%+.2f"),
+            "p_value": st.column_config.NumberColumn("p 値", format="%.3f"),
+            "q_value": st.column_config.NumberColumn("q 値", format="%.3f"),
+            "mark": "",
+        },
+    )
+    st.caption(f"締め切った調査回: {', '.join(store.closed()) or 'なし'}（集計は締め切り時のスナップショット）")
+
+# キードライバー分析（回答データの版をキーにキャッシュするので、回答が増えたときだけ計算し直す）
+@st.cache_data(max_entries=4, show_spinner="キードライバー分析を計算しています…")
+def _driver_analysis(survey_id, version):
+    schema = app.get_schema(survey_id)
+    df = app.cached_responses(survey_id, version, tuple(drivers.analysis_columns(schema)))
+    return drivers.analyze(df, schema)
+
+def show_drivers():
+    survey_id = app.survey_id()
+    schema = app.schema()
+    version = app.responses_version(survey_id)
+    result = _driver_analysis(survey_id, version)
+    table = result["drivers"]
+    if table.empty:
+        st.info("分析に必要な回答数（満足度の項目数より多い完了済みの回答）がまだありません。")
+        return
+    
+    summary = result["summary"].set_index("outcome")
+    outcome = st.selectbox(
+        "目的変数",
+        list(summary.index),
+        format_func=lambda key: schema.question(key).text.split("：")[0],
+    )
+    row = summary.loc[outcome]
+    st.caption(f"回答数: {int(row['responses'])}　決定係数 R²: {row['r2']:.2f}")
+    
+    table = table[table["outcome"] == outcome].sort_values("weight", ascending=False)
+    st.markdown("相対重要度が高く満足度が低い項目ほど、改善による効果が大きい項目です。")
+    st.scatter_chart(table, x="satisfaction", y="weight", color="category")
+    columns = ["category", "question", "satisfaction", "correlation", "beta", "weight", "share"]
+    column_config = {
+        "category": "カテゴリ",
+        "question": "項目",
+        "satisfaction": st.column_config.NumberColumn("満足度", format="%.2f"),
+        "correlation": st.column_config.NumberColumn("相関係数", format="%.3f"),
+        "beta": st.column_config.NumberColumn("標準化係数", format="%.3f"),
+        "weight": st.column_config.NumberColumn("相対重要度", format="%.4f"),
+        "share": st.column_config.NumberColumn("寄与率", format="%.1f%%"),
+    }
+    if "weight_low" in table:
+        columns[6:6] = ["weight_low", "weight_high"]
+        column_config["weight_low"] = st.column_config.NumberColumn("95%CI 下限", format="%.4f")
+        column_config["weight_high"] = st.column_config.NumberColumn("95%CI 上限", format="%.4f")
+    st.dataframe(table[columns].assign(share=table["share"] * 100), hide_index=True, column_config=column_config)
+
+# 回答データのダウンロード（期間・属性値で絞り込み、ボタンが押されたときに書き出す）
+def show_export():
+    survey_id = app.survey_id()
+    schema = app.schema()
+    formats = [fmt for fmt in export.FORMATS if fmt != "xlsx" or export.openpyxl is not None]
+    cols = st.columns(4)
+    fmt = cols[0].selectbox("形式", formats)
+    encoding = cols[1].selectbox("文字コード（CSV）", list(export.ENCODINGS), index=1, disabled=fmt != "csv")
+    since = cols[2].date_input("開始日", value=None)
+    until = cols[3].date_input("終了日", value=None)
+    
+    segments = {}
+    questions = [q for q in schema.demographics if q.widget == "select"]
+    if questions:
+        for col, question in zip(st.columns(len(questions)), questions):
+            segments[question.key] = col.multiselect(question.label, question.options)
+    
+    # チャンクごとに一時ファイルへ書き出してから、内容を読んで渡す（st.download_button は
+    # ファイル全体を bytes で受け取るので、ダウンロードする内容はメモリ上に1つ載る）。
+    # 一時ファイルは with を抜けると閉じて削除される
+    def build():
+        chunks = export.iter_responses(
+            app.get_response_log(survey_id),
+            app.get_response_dataset(survey_id),
+            since=since,
+            until=until + timedelta(days=1) if until else None,
+            segments=segments,
+        )
+        with tempfile.TemporaryFile() as out:
+            export.export(chunks, out, fmt, encoding)
+            out.seek(0)
+            return out.read()
+    
+    st.download_button(
+        "ダウンロード",
+        data=build,
+        file_name=f"{survey_id}.{fmt}",
+        mime=export.MIME_TYPES[fmt],
+        on_click="ignore",
+    )
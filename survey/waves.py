@@ -0,0 +1,414 @@
+# 調査回（wave）の管理と、調査回をまたいだ推移
+#
+# 調査は四半期などの調査回ごとに繰り返し実施する。回答には保存時に調査回の ID
+# （wave 列）を付け、データセットも調査回でパーティション分割している。
+# 調査回の開始・締め切りは WaveStore（SQLite）で管理し、締め切るときに
+# その調査回の回答から「属性値 × 指標」ごとの件数・合計・二乗和（スナップショット）を
+# 作って保存する。スナップショットはトリガーで更新・削除を禁止しているので、
+# 締め切った調査回は二度と計算し直さない（締め切り後に届いた回答は推移に含めない）。
+#
+# 推移（trend）は、締め切った調査回のスナップショットと、実施中の調査回の回答から
+# 同じ形で求めた値を並べ、指標ごとに直前（または基準）の調査回との差と
+# Welch の t 検定の p 値を求める。件数・合計・二乗和から平均と分散が求まるので、
+# 検定のために回答を読み直す必要はない。指標は次のとおり。
+#
+# - overall:  総合評価、NPS（推奨者 +100・中立者 0・批判者 −100 の平均）、
+#             全項目平均の期待度・満足度・ギャップ
+# - category: カテゴリごとの期待度・満足度・ギャップ（回答者ごとのカテゴリ平均の平均）
+# - item:     期待度・満足度の項目ごとの評価値
+#
+#   python -m survey.waves open 2026Q3
+#   python -m survey.waves close 2026Q3
+#   python -m survey.waves trend --kind category
+import math
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from survey.aggregates import segment_columns
+from survey.analytics import nan_mean, rating_matrix, respondent_measures
+
+# 調査回の ID に使える文字（データセットのパーティションのディレクトリ名になる）
+WAVE_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# NPS の指標名（回答者ごとに推奨者 +100、中立者 0、批判者 −100 とした値の平均が NPS になる）
+NET_PROMOTER = "net_promoter"
+
+SECTIONS = {"expectation": "期待度", "satisfaction": "満足度", "gap": "ギャップ"}
+
+KINDS = ("overall", "category", "item")
+
+# 有意とみなす水準（Benjamini-Hochberg 法で補正した q 値と比べる）
+ALPHA = 0.05
+
+MOMENT_COLUMNS = ["wave", "segment_column", "segment_value", "measure", "n", "total", "total_sq"]
+
+
+class WaveError(ValueError):
+    pass
+
+
+# 推移を求める指標の一覧（measure, kind, section, category, label）
+def measures(schema):
+    rows = [(q.response_key, "overall", "evaluation", None, q.text.split("：")[0]) for q in schema.evaluation]
+    if "nps" in schema.questions:
+        rows.append((NET_PROMOTER, "overall", "evaluation", None, "NPS"))
+    rows += [(section, "overall", section, None, f"{label}（全項目平均）") for section, label in SECTIONS.items()]
+    for category in schema.categories:
+        rows += [
+            (f"{section}:{category.name}", "category", section, category.name, f"{category.name}の{label}")
+            for section, label in SECTIONS.items()
+        ]
+    rows += [
+        (q.response_key, "item", q.section, q.category, f"{q.text}（{SECTIONS[q.section]}）")
+        for q in schema.expectation + schema.satisfaction
+    ]
+    return pd.DataFrame(rows, columns=["measure", "kind", "section", "category", "label"])
+
+
+# 集計に必要な列
+def analysis_columns(schema):
+    return segment_columns(schema) + list(schema.questions) + ["wave"]
+
+
+# 回答者 × 指標の値（measures の measure を列とする）
+def measure_frame(df, schema):
+    table = respondent_measures(df, schema)
+    values = {q.response_key: table[q.response_key] for q in schema.evaluation}
+    if "nps" in schema.questions:
+        values[NET_PROMOTER] = (table["promoter"] - table["detractor"]) * 100
+    for section in SECTIONS:
+        values[section] = table[section]
+
+    # カテゴリの項目は expectation / satisfaction の中で連続している
+    expectation = rating_matrix(df, schema.expectation)
+    satisfaction = rating_matrix(df, schema.satisfaction)
+    offset = 0
+    for category in schema.categories:
+        columns = slice(offset, offset + len(category.items))
+        e, s = nan_mean(expectation[:, columns], axis=1), nan_mean(satisfaction[:, columns], axis=1)
+        values[f"expectation:{category.name}"] = e
+        values[f"satisfaction:{category.name}"] = s
+        values[f"gap:{category.name}"] = e - s
+        offset += len(category.items)
+    for j, question in enumerate(schema.expectation):
+        values[question.response_key] = expectation[:, j]
+    for j, question in enumerate(schema.satisfaction):
+        values[question.response_key] = satisfaction[:, j]
+    return pd.DataFrame(values, index=df.index)
+
+
+# 調査回 × 属性値 × 指標ごとの件数・合計・二乗和（全体は segment_column、segment_value とも ""）
+# 調査回のない回答は default_wave とみなす
+def wave_moments(df, schema, default_wave="default"):
+    values = measure_frame(df, schema)
+    squares = values ** 2
+    if "wave" in df.columns:
+        wave = df["wave"].astype("string").fillna(default_wave)
+    else:
+        wave = pd.Series(default_wave, index=df.index, dtype="string")
+    frames = []
+    for column in [None] + [c for c in segment_columns(schema) if c in df.columns]:
+        segment = pd.Series("", index=df.index, dtype="string") if column is None else df[column].astype("string")
+        keys = [wave.rename("wave"), segment.rename("segment_value")]
+        grouped = values.groupby(keys, sort=False)
+        n, total = grouped.count(), grouped.sum()
+        total_sq = squares.groupby(keys, sort=False).sum().reindex(n.index)
+        width = len(values.columns)
+        frame = pd.DataFrame({
+            "wave": np.repeat(n.index.get_level_values("wave").to_numpy(dtype=object), width),
+            "segment_column": column or "",
+            "segment_value": np.repeat(n.index.get_level_values("segment_value").to_numpy(dtype=object), width),
+            "measure": np.tile(values.columns.to_numpy(dtype=object), len(n)),
+            "n": n.to_numpy().ravel(),
+            "total": total.to_numpy().ravel(),
+            "total_sq": total_sq.to_numpy().ravel(),
+        })
+        frames.append(frame[frame["n"] > 0])
+    if not frames or not len(df):
+        return pd.DataFrame(columns=MOMENT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+# 正則化不完全ベータ関数 I_x(a, b)（連分数展開。x が大きいときは I_x(a, b) = 1 − I_{1−x}(b, a) で収束を速める）
+def _betainc(a, b, x):
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    if x > (a + 1) / (a + b + 2):
+        return 1.0 - _betainc(b, a, 1 - x)
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log1p(-x)) / a
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    f = d
+    for m in range(1, 1000):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1)),
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            f *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return front * f
+
+
+# t 分布（自由度 dof）での両側 p 値
+def t_pvalue(t, dof):
+    if not (np.isfinite(t) and dof > 0):
+        return np.nan
+    return _betainc(dof / 2, 0.5, dof / (dof + t * t))
+
+
+# Benjamini-Hochberg 法で補正した q 値（NaN はそのまま）
+def _adjust(pvalues):
+    q = np.full(len(pvalues), np.nan)
+    valid = np.flatnonzero(~np.isnan(pvalues))
+    order = np.argsort(pvalues[valid])
+    ranked = pvalues[valid][order] * len(valid) / np.arange(1, len(valid) + 1)
+    q[valid[order]] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q
+
+
+# 調査回ごとの指標の推移
+# moments: wave_moments の形の表（締め切った調査回のスナップショットと実施中の調査回の値）
+# waves: 並べる調査回（古い順。省略すると moments にある調査回の名前順）
+# baseline: 差をとる基準の調査回（省略すると、その指標の値がある直前の調査回）
+# min_responses 未満の件数の値は表示しない（属性値で絞ったときの少人数の秘匿）
+# 戻り値は指標 × 調査回の表。delta は基準との差、p_value は Welch の t 検定の両側 p 値、
+# q_value は表全体で Benjamini-Hochberg 法により補正した値、significant は q_value < alpha
+def trend(moments, schema, waves=None, segment_column=None, segment_value=None, baseline=None, alpha=ALPHA, min_responses=1):
+    rows = moments[
+        (moments["segment_column"] == (segment_column or ""))
+        & (moments["segment_value"] == ("" if segment_column is None else str(segment_value)))
+    ]
+    waves = list(waves) if waves is not None else sorted(rows["wave"].unique())
+    rows = rows[rows["wave"].isin(waves) & (rows["n"] >= min_responses)]
+    catalog = measures(schema).reset_index(names="order")
+    table = catalog.merge(rows[["wave", "measure", "n", "total", "total_sq"]], on="measure")
+    table["wave"] = pd.Categorical(table["wave"], categories=waves, ordered=True)
+    table = table.sort_values(["order", "wave"], ignore_index=True)
+
+    n = table["n"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = table["total"].to_numpy(dtype=float) / n
+        variance = np.maximum(table["total_sq"].to_numpy(dtype=float) - mean * table["total"].to_numpy(dtype=float), 0) / (n - 1)
+    table["n"] = n.astype(int)
+    table["mean"] = mean
+    table["sd"] = np.sqrt(variance)
+    table = table.drop(columns=["order", "total", "total_sq"])
+
+    if baseline is None:
+        base = table.groupby("measure", sort=False)[["n", "mean", "sd"]].shift(1)
+    else:
+        reference = table[table["wave"] == baseline].set_index("measure")[["n", "mean", "sd"]]
+        base = reference.reindex(table["measure"]).reset_index(drop=True)
+        base[(table["wave"] == baseline).to_numpy()] = np.nan
+    base_n = base["n"].to_numpy(dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        se2 = variance / n
+        base_se2 = base["sd"].to_numpy(dtype=float) ** 2 / base_n
+        delta = mean - base["mean"].to_numpy(dtype=float)
+        t = delta / np.sqrt(se2 + base_se2)
+        dof = (se2 + base_se2) ** 2 / (se2 ** 2 / (n - 1) + base_se2 ** 2 / (base_n - 1))
+    pvalues = np.array([t_pvalue(ti, di) for ti, di in zip(t, dof)], dtype=float)
+    # 両方の調査回で分散が 0 なら、差があるかないかは確定している
+    constant = (se2 + base_se2 == 0) & ~np.isnan(delta)
+    pvalues[constant] = np.where(delta[constant] == 0, 1.0, 0.0)
+    table["delta"] = delta
+    table["p_value"] = pvalues
+    table["q_value"] = _adjust(pvalues)
+    table["significant"] = table["q_value"] < alpha
+    return table
+
+
+class WaveStore:
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS waves ("
+                " wave TEXT PRIMARY KEY, opened_at TEXT NOT NULL, closed_at TEXT, responses INTEGER);"
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " wave TEXT NOT NULL, segment_column TEXT NOT NULL, segment_value TEXT NOT NULL,"
+                " measure TEXT NOT NULL, n INTEGER NOT NULL, total REAL NOT NULL, total_sq REAL NOT NULL,"
+                " PRIMARY KEY (wave, segment_column, segment_value, measure));"
+                # 締め切った調査回とスナップショットは変更できない
+                "CREATE TRIGGER IF NOT EXISTS snapshots_no_update BEFORE UPDATE ON snapshots"
+                " BEGIN SELECT RAISE(ABORT, 'snapshots are immutable'); END;"
+                "CREATE TRIGGER IF NOT EXISTS snapshots_no_delete BEFORE DELETE ON snapshots"
+                " BEGIN SELECT RAISE(ABORT, 'snapshots are immutable'); END;"
+                "CREATE TRIGGER IF NOT EXISTS waves_closed_no_update BEFORE UPDATE ON waves WHEN OLD.closed_at IS NOT NULL"
+                " BEGIN SELECT RAISE(ABORT, 'closed waves are immutable'); END;"
+                "CREATE TRIGGER IF NOT EXISTS waves_closed_no_delete BEFORE DELETE ON waves WHEN OLD.closed_at IS NOT NULL"
+                " BEGIN SELECT RAISE(ABORT, 'closed waves are immutable'); END;"
+            )
+            self._local.conn = conn
+        return conn
+
+    # 調査回の一覧（開始順）
+    def waves(self):
+        return pd.read_sql_query(
+            "SELECT wave, opened_at, closed_at, responses FROM waves ORDER BY opened_at, wave",
+            self._connection(),
+        )
+
+    # 実施中の調査回（最後に開始したもの。なければ None）
+    def current(self):
+        row = self._connection().execute(
+            "SELECT wave FROM waves WHERE closed_at IS NULL ORDER BY opened_at DESC, wave DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    # 締め切った調査回（開始順）
+    def closed(self):
+        rows = self._connection().execute(
+            "SELECT wave FROM waves WHERE closed_at IS NOT NULL ORDER BY opened_at, wave"
+        ).fetchall()
+        return tuple(wave for (wave,) in rows)
+
+    def is_closed(self, wave):
+        row = self._connection().execute("SELECT closed_at FROM waves WHERE wave = ?", (wave,)).fetchone()
+        return row is not None and row[0] is not None
+
+    # 調査回を開始する（すでに実施中なら何もしない）
+    def open(self, wave, opened_at=None):
+        if not WAVE_PATTERN.match(wave or ""):
+            raise WaveError(f"調査回の ID に使えない文字が含まれています: {wave}")
+        if self.is_closed(wave):
+            raise WaveError(f"調査回 {wave} は締め切り済みです")
+        opened_at = opened_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self._connection()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO waves (wave, opened_at) VALUES (?, ?)", (wave, opened_at))
+
+    # 調査回を締め切り、その回答（df。他の調査回の行は除く）からスナップショットを作る
+    # 戻り値はスナップショットに含めた回答数
+    # 調査回のない回答は default_wave の回答とみなす
+    def close(self, wave, df, closed_at=None, default_wave="default"):
+        if "wave" in df.columns:
+            df = df[(df["wave"].astype("string").fillna(default_wave) == wave).to_numpy(dtype=bool)]
+        moments = wave_moments(df.assign(wave=wave), self.schema)
+        closed_at = closed_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if self.is_closed(wave):
+                raise WaveError(f"調査回 {wave} は締め切り済みです")
+            conn.executemany(
+                "INSERT INTO snapshots (wave, segment_column, segment_value, measure, n, total, total_sq)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                moments[MOMENT_COLUMNS].itertuples(index=False, name=None),
+            )
+            conn.execute(
+                "INSERT INTO waves (wave, opened_at, closed_at, responses) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(wave) DO UPDATE SET closed_at = excluded.closed_at, responses = excluded.responses",
+                (wave, closed_at, closed_at, len(df)),
+            )
+        return len(df)
+
+    # 締め切った調査回のスナップショット（wave_moments と同じ形）
+    def snapshots(self):
+        df = pd.read_sql_query(f"SELECT {', '.join(MOMENT_COLUMNS)} FROM snapshots", self._connection())
+        return df.astype({"n": "int64", "total": "float64", "total_sq": "float64"})
+
+    # 調査回を古い順に並べる（登録済みの調査回は開始順、それ以外は名前順で後ろに）
+    def order(self, waves):
+        waves = set(waves)
+        known = [wave for wave in self.waves()["wave"] if wave in waves]
+        return known + sorted(waves - set(known))
+
+    # 締め切った調査回のスナップショットと、実施中の調査回の値（open_moments）からの推移
+    # 引数は trend と同じ（waves を省略するとすべての調査回）
+    def trend(self, open_moments=None, waves=None, **options):
+        frames = [self.snapshots()]
+        if open_moments is not None and len(open_moments):
+            frames.append(open_moments[~open_moments["wave"].isin(self.closed())])
+        moments = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        waves = self.order(moments["wave"].unique()) if waves is None else waves
+        return trend(moments, self.schema, waves, **options)
+
+
+# 締め切っていない調査回の回答（データセットは締め切った調査回のパーティションを読まない）
+def open_responses(log, dataset, closed, columns=None):
+    closed = list(closed)
+    stored = dataset.read(columns, filters=[("wave", "not in", closed)] if closed else None)
+    recent = log.read(columns=columns)
+    if closed and "wave" in recent.columns:
+        recent = recent[~recent["wave"].astype("string").isin(closed)]
+    return dataset.combine(stored, recent)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from survey.dataset import ResponseDataset, response_dtypes
+    from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+    from survey.storage import AppendOnlyLog
+    from survey.submissions import SubmissionQueue
+
+    parser = argparse.ArgumentParser(description="調査回を開始・締め切り、調査回ごとの推移を表示します")
+    parser.add_argument("--log", default="employee_survey_data.csv", help="回答ログ（CSV）のパス")
+    parser.add_argument("--dataset", default="employee_survey_data.parquet", help="Parquet データセットのディレクトリ")
+    parser.add_argument("--store", default="employee_survey_data.waves.sqlite3", help="調査回の管理（SQLite）のパス")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA_PATH, help="調査定義（JSON）のパス")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="調査回の一覧")
+    command = commands.add_parser("open", help="調査回を開始する（以後の回答はこの調査回として保存される）")
+    command.add_argument("wave", help="調査回の ID（例: 2026Q3）")
+    command = commands.add_parser("close", help="調査回を締め切ってスナップショットを作る")
+    command.add_argument("wave", help="調査回の ID")
+    command.add_argument("--submissions", default="employee_survey_data.submissions.sqlite3", help="送信のジャーナル（SQLite）のパス")
+    command.add_argument("--timeout", type=float, default=60, help="保存待ちの回答が保存されるまで待つ秒数")
+    command = commands.add_parser("trend", help="調査回ごとの推移")
+    command.add_argument("--kind", choices=KINDS, default="overall", help="指標の種類")
+    command.add_argument("--segment", help="属性で絞り込む（例: 事業部=営業部）")
+    command.add_argument("--baseline", help="差をとる基準の調査回（既定は直前の調査回）")
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    store = WaveStore(args.store, schema)
+    log = AppendOnlyLog(args.log, schema.columns)
+    dataset = ResponseDataset(args.dataset, response_dtypes(schema))
+    if args.command == "open":
+        store.open(args.wave)
+        print(f"調査回 {args.wave} を開始しました")
+    elif args.command == "close":
+        # 受け付け済みでジャーナルに残っている回答を、アプリのワーカーが保存し終えるまで待つ
+        # （保存されていない回答はスナップショットに入らず、締め切った後は二度と入らない）
+        queue = SubmissionQueue(args.submissions, commit=None)
+        if not queue.flush(args.timeout):
+            raise SystemExit(
+                f"保存待ちの回答が {queue.status()['pending']} 件あるため締め切れません。"
+                "アプリを起動して保存し終えてから、もう一度実行してください"
+            )
+        df = open_responses(log, dataset, store.closed(), analysis_columns(schema))
+        count = store.close(args.wave, df, default_wave=dataset.default_wave)
+        print(f"調査回 {args.wave} を {count} 件の回答で締め切りました")
+    elif args.command == "list":
+        print(store.waves().to_string(index=False))
+    else:
+        column, value = args.segment.split("=", 1) if args.segment else (None, None)
+        df = open_responses(log, dataset, store.closed(), analysis_columns(schema))
+        table = store.trend(wave_moments(df, schema, dataset.default_wave), segment_column=column, segment_value=value, baseline=args.baseline)
+        table = table[table["kind"] == args.kind]
+        table = table.assign(mark=np.where(table["significant"], "*", ""))
+        columns = ["label", "wave", "n", "mean", "delta", "p_value", "q_value", "mark"]
+        print(table[columns].to_string(index=False, float_format=lambda v: f"{v:.3f}"))
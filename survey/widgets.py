@@ -0,0 +1,115 @@
+# 質問の描画部品
+import contextlib
+import functools
+
+import streamlit as st
+
+from survey import app
+
+# 共通スタイルの読み込み。CSS 本体は static/survey.css として静的配信されるので、
+# 再実行のたびに送るのはこの1行だけになる。
+STYLESHEET = '<link rel="stylesheet" href="app/static/survey.css">'
+
+
+def stylesheet():
+    st.markdown(STYLESHEET, unsafe_allow_html=True)
+
+
+# 選択肢の説明カードの HTML（尺度ごとにプロセスで1回だけ組み立てる）
+@functools.lru_cache(maxsize=None)
+def legend_html(scale):
+    if scale.anchors:
+        body = "".join(f"<div>{value}: {label}</div>" for value, label in scale.anchors.items())
+        layout = "legend-anchors"
+    else:
+        body = "".join(f"<div>{label}</div>" for label in scale.display.values())
+        layout = "legend-grid"
+    return f'<div class="legend"><h3>選択肢の説明</h3><div class="{layout}">{body}</div></div>'
+
+
+# 選択肢の説明カードを表示する（1要素）
+def legend(scale):
+    st.markdown(legend_html(scale), unsafe_allow_html=True)
+
+
+# リッカート尺度の1問を水平ラジオボタン1つで描画する
+#
+# 選択肢ごとに st.button と st.columns を並べる代わりにウィジェット1つで
+# 済むため、ページの要素数と操作ごとの差分送信量が大きく減る。選択値は
+# ウィジェットの状態として保持されるので、クリックごとの st.rerun() も不要。
+# question: survey.schema.Question
+def likert_row(question):
+    scale = question.scale
+    responses = st.session_state.responses
+    current = responses.get(question.response_key)
+
+    st.markdown(f"### {question.text}")
+    value = st.radio(
+        question.text,
+        options=scale.values,
+        index=scale.values.index(current) if current in scale.display else None,
+        format_func=scale.display.__getitem__,
+        horizontal=True,
+        key=f"likert_{question.response_key}",
+        label_visibility="collapsed",
+    )
+    if value is not None:
+        responses[question.response_key] = value
+        st.session_state.answer_index.record(question, value)
+    return value
+
+
+# 質問のまとまりを描画する枠
+#
+# batch=True のときは st.form の中に描画し、ページ内の回答を送信ボタンで
+# まとめて1回だけ確定する（回答をクリックするたびのスクリプト再実行がない）。
+# batch=False のときは通常のコンテナで、回答のたびに再実行される
+# （question_group で描画した範囲だけが再実行される）。
+@contextlib.contextmanager
+def answer_block(key, batch=True):
+    with (st.form(key) if batch else st.container()):
+        yield
+
+
+# 質問のまとまり（カテゴリなど）を描画する
+#
+# batch=False のときは st.fragment として描画するので、回答を変えたときに
+# 再実行されるのはこのまとまりだけになる。CSS やプログレスバー、他の
+# カテゴリは再実行されず、アプリ全体の再実行はページ移動のときだけになる。
+# フラグメントだけの再実行は "<ページ>:fragment" のページとして実行時メトリクスに記録する。
+# batch=True（st.form の中）では回答のたびの再実行がないので、そのまま描画する。
+def question_group(questions, batch=True):
+    if batch:
+        _render_questions(questions)
+    else:
+        _question_fragment(questions)
+
+
+def _render_questions(questions):
+    for question in questions:
+        likert_row(question)
+
+
+@st.fragment
+def _question_fragment(questions):
+    with app.METRICS.rerun(f"{st.session_state.current_page}:fragment"):
+        _render_questions(questions)
+
+
+# answer_block の中に置く「次へ」ボタン
+def next_button(label, key, batch=True):
+    if batch:
+        return st.form_submit_button(label, type="primary")
+    return st.button(label, type="primary", key=key)
+
+
+# 未回答の質問があればエラーを表示して False を返す
+# questions: survey.schema.Question の並び
+def validate_answers(questions):
+    responses = st.session_state.responses
+    missing = [question.text for question in questions if responses.get(question.response_key) is None]
+    if not missing:
+        return True
+    st.error(f"未回答の項目が {len(missing)} 件あります。すべての項目にお答えください。")
+    st.markdown("\n".join(f"- {question}" for question in missing))
+    return False
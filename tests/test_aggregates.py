@@ -0,0 +1,92 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from survey import analytics
+from survey.aggregates import AggregateStore
+from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+
+
+@pytest.fixture
+def schema():
+    return load_schema(DEFAULT_SCHEMA_PATH)
+
+
+RECORDS = [
+    {"wave": "2024", "事業部": "営業部", "nps": 10},
+    {"wave": "2024", "事業部": "開発部", "nps": 9},
+    {"wave": "2025", "事業部": "営業部", "nps": 0},
+    {"事業部": "営業部", "nps": 8},
+]
+
+
+# 集計は調査回ごとに分かれ、wave を指定しなければ全調査回の合計になる
+def test_histograms_are_kept_per_wave(tmp_path, schema):
+    store = AggregateStore(str(tmp_path / "aggregates.sqlite3"), schema)
+    store.add_many(RECORDS)
+
+    assert store.waves() == ["2024", "2025", "default"]
+    assert store.nps_summary("2024")["nps"] == 100
+    assert store.nps_summary("2025")["nps"] == -100
+    assert store.nps_summary()["responses"] == 4
+    assert store.segment_summary("事業部", "2024")["responses"].to_dict() == {"営業部": 1, "開発部": 1}
+    assert store.verify(pd.DataFrame(RECORDS)).empty
+
+
+# 調査回の列がない以前のヒストグラムは default_wave の分として引き継ぐ
+def test_migrates_histograms_without_wave(tmp_path, schema):
+    path = str(tmp_path / "aggregates.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE histograms (segment_column TEXT NOT NULL, segment_value TEXT NOT NULL,"
+        " response_key TEXT NOT NULL, rating INTEGER NOT NULL, count INTEGER NOT NULL,"
+        " PRIMARY KEY (segment_column, segment_value, response_key, rating))"
+    )
+    conn.execute("INSERT INTO histograms VALUES ('', '', 'nps', 10, 3)")
+    conn.commit()
+    conn.close()
+
+    store = AggregateStore(path, schema, default_wave="2023")
+    assert store.waves() == ["2023"]
+    assert store.nps_summary("2023")["promoters"] == 3
+    store.add_many([{"wave": "2024", "nps": 0}])
+    assert store.nps_summary()["responses"] == 4
+
+
+# ギャップは analytics.item_gaps と同じく回答者ごとの差の平均（一方だけの回答があると平均の差とは一致しない）
+def test_item_gaps_match_full_scan(tmp_path, schema):
+    e, s = schema.expectation[0].response_key, schema.satisfaction[0].response_key
+    records = [
+        {"事業部": "営業部", e: 5, s: 2},
+        {"事業部": "営業部", e: 4, s: 4},
+        {"事業部": "開発部", e: 1},
+        {"事業部": "開発部", s: 5},
+    ]
+    store = AggregateStore(str(tmp_path / "aggregates.sqlite3"), schema)
+    store.add_many(records[:2])
+    store.add_frame(pd.DataFrame(records[2:]))
+
+    expected = analytics.item_gaps(pd.DataFrame(records), schema).iloc[0]
+    row = store.item_gaps().iloc[0]
+    assert row["gap"] == expected["gap"] == 1.5
+    assert row["expectation"] - row["satisfaction"] != row["gap"]
+    assert store.verify(pd.DataFrame(records)).empty
+
+
+# 回答者ごとの差を数える前の集計済み統計は、作り直すまで平均の差を返す
+def test_item_gaps_fall_back_for_stores_without_paired_gaps(tmp_path, schema):
+    e, s = schema.expectation[0].response_key, schema.satisfaction[0].response_key
+    records = [{e: 5, s: 2}, {e: 1}]
+    path = str(tmp_path / "aggregates.sqlite3")
+    AggregateStore(path, schema).add_many(records)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA user_version = 0")
+    conn.close()
+
+    store = AggregateStore(path, schema)
+    assert not store.paired_gaps()
+    assert store.item_gaps().iloc[0]["gap"] == 1
+    store.rebuild(pd.DataFrame(records))
+    assert store.paired_gaps()
+    assert store.item_gaps().iloc[0]["gap"] == 3
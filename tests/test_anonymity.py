@@ -0,0 +1,56 @@
+import pandas as pd
+import pytest
+
+from survey import synthetic
+from survey.anonymity import MERGED, cross_tab, hidden_cells, suppress
+from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+
+
+@pytest.fixture
+def schema():
+    return load_schema(DEFAULT_SCHEMA_PATH)
+
+
+# 営業部 12 人、開発部 5 人、人事部 3 人の回答
+@pytest.fixture
+def responses(schema):
+    df = synthetic.generate_frame(schema, 20, 0)
+    df["事業部"] = ["営業部"] * 12 + ["開発部"] * 5 + ["人事部"] * 3
+    return df
+
+
+def test_hidden_cells_hides_small_cells():
+    sizes = pd.Series([12, 4, 4], index=["a", "b", "c"])
+    assert hidden_cells(sizes, 5).tolist() == [False, True, True]
+
+
+# 秘匿したセルが1つで k 人未満なら、全体からの逆算を防ぐため次に小さいセルも秘匿する
+def test_hidden_cells_adds_secondary_suppression():
+    sizes = pd.Series([12, 5, 3], index=["a", "b", "c"])
+    assert hidden_cells(sizes, 5).tolist() == [False, True, True]
+
+
+def test_cross_tab_suppresses_small_cells(schema, responses):
+    summary, hidden = cross_tab(responses, schema, ["事業部"], k=5)
+    assert hidden == 2
+    assert summary.index.tolist() == ["営業部"]
+    assert summary["responses"].tolist() == [12]
+
+
+def test_cross_tab_merges_small_cells(schema, responses):
+    summary, hidden = cross_tab(responses, schema, ["事業部"], k=5, mode="merge")
+    assert hidden == 2
+    assert summary.index.tolist() == ["営業部", MERGED]
+    assert summary["responses"].tolist() == [12, 8]
+
+
+def test_cross_tab_rejects_unknown_mode(schema, responses):
+    with pytest.raises(ValueError):
+        cross_tab(responses, schema, ["事業部"], mode="round")
+
+
+def test_suppress_summary_table():
+    summary = pd.DataFrame({"responses": [10, 2, 7], "nps": [10.0, -50.0, 0.0]}, index=["a", "b", "c"])
+    table, hidden = suppress(summary, 5)
+    assert hidden == 2
+    assert table.index.tolist() == ["a"]
@@ -0,0 +1,35 @@
+import time
+
+from survey.checkpoint import CheckpointStore
+
+
+def _age(store, token, seconds):
+    conn = store._connection()
+    conn.execute("UPDATE checkpoints SET updated_at = ? WHERE token = ?", (time.time() - seconds, token))
+
+
+def test_purge_removes_stale_checkpoints(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    store.save("old", 3, {"nps": 5})
+    store.save("new", 4, {"nps": 9})
+    _age(store, "old", 7200)
+
+    assert store.purge(3600) == 1
+    assert store.load("old") is None
+    assert store.load("new") == (4, {"nps": 9})
+
+
+# max_age を指定したストアは、保存のついでに古いチェックポイントを削除する
+def test_save_purges_on_schedule(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite3")
+    CheckpointStore(path).save("old", 3, {"nps": 5})
+    store = CheckpointStore(path, max_age=3600)
+    _age(store, "old", 7200)
+
+    store.save("new", 2, {"年齢": 30})
+    assert store.load("old") is None
+
+    store.save("stale", 2, {})
+    _age(store, "stale", 7200)
+    store.save("new", 3, {})
+    assert store.load("stale") is not None
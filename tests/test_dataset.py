@@ -0,0 +1,82 @@
+import pandas as pd
+
+from survey.dataset import ResponseDataset, compact
+from survey.storage import AppendOnlyLog
+
+DTYPES = {"nps": "Int8", "wave": "string", "timestamp": "datetime64[ns]"}
+
+
+def _dataset(tmp_path, dtypes=DTYPES):
+    return ResponseDataset(str(tmp_path / "dataset"), dtypes)
+
+
+def _log(tmp_path, columns):
+    return AppendOnlyLog(str(tmp_path / "log.csv"), columns)
+
+
+def test_read_projects_columns(tmp_path):
+    log = _log(tmp_path, ["nps", "wave", "timestamp"])
+    log.append_many([{"nps": 9, "wave": "2025", "timestamp": "2025-04-01 10:00:00"},
+                     {"nps": 3, "wave": "2025", "timestamp": "2025-04-02 10:00:00"}])
+    dataset = _dataset(tmp_path)
+    assert compact(log, dataset) == 2
+
+    df = dataset.read(["nps"])
+    assert list(df.columns) == ["nps"]
+    assert df["nps"].dtype == "Int8"
+    assert sorted(df["nps"].tolist()) == [3, 9]
+
+
+# 移し替えた後に調査定義へ足した列は、データセットにない列として欠損値で読める
+def test_read_column_added_after_compaction(tmp_path):
+    log = _log(tmp_path, ["nps", "wave", "timestamp"])
+    log.append({"nps": 9, "wave": "2025", "timestamp": "2025-04-01 10:00:00"})
+    compact(log, _dataset(tmp_path))
+
+    dtypes = dict(DTYPES, 部署="string")
+    dataset = _dataset(tmp_path, dtypes)
+    df = dataset.read(["nps", "部署"])
+    assert list(df.columns) == ["nps", "部署"]
+    assert df["部署"].isna().all()
+
+    # 新しい列を含む回答を移し替えると、以前のファイルの行だけが欠損値になる
+    log = _log(tmp_path, ["nps", "部署", "wave", "timestamp"])
+    log.append({"nps": 5, "部署": "営業", "wave": "2025", "timestamp": "2025-04-03 10:00:00"})
+    compact(log, dataset)
+    df = dataset.read(["nps", "部署"]).sort_values("nps", ignore_index=True)
+    assert df["nps"].tolist() == [5, 9]
+    assert df["部署"].iloc[0] == "営業" and pd.isna(df["部署"].iloc[1])
+    assert "部署" in dataset.read().columns
+
+
+def test_read_filters_by_wave(tmp_path):
+    log = _log(tmp_path, ["nps", "wave", "timestamp"])
+    log.append_many([{"nps": 9, "wave": "2024", "timestamp": "2024-04-01 10:00:00"},
+                     {"nps": 3, "wave": "2025", "timestamp": "2025-04-01 10:00:00"}])
+    dataset = _dataset(tmp_path)
+    compact(log, dataset)
+    df = dataset.read(["nps"], filters=[("wave", "not in", ["2024"])])
+    assert df["nps"].tolist() == [3]
+
+
+# 書き込んだ後・セグメントを消す前に止まった移し替えをやり直しても、回答は二重にならない
+def test_compact_is_idempotent(tmp_path, monkeypatch):
+    log = _log(tmp_path, ["nps", "wave", "timestamp"])
+    log.append_many([{"nps": n, "wave": "2025", "timestamp": f"2025-04-0{n} 10:00:00"} for n in (1, 2, 3)])
+    dataset = _dataset(tmp_path)
+
+    def crash(path):
+        raise OSError("crashed")
+
+    with monkeypatch.context() as m:
+        m.setattr("survey.dataset.os.remove", crash)
+        try:
+            compact(log, dataset)
+        except OSError:
+            pass
+    assert len(dataset.read()) == 3
+
+    log.append({"nps": 4, "wave": "2025", "timestamp": "2025-04-04 10:00:00"})
+    assert compact(log, dataset) == 4
+    assert sorted(dataset.read()["nps"].tolist()) == [1, 2, 3, 4]
+    assert log.detach() == []
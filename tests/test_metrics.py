@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+from survey import metrics
+
+
+class _Message:
+    def HasField(self, name):
+        return name == "delta"
+
+
+def _context(monkeypatch):
+    sent = []
+    ctx = SimpleNamespace(session_id="s1", _enqueue=sent.append)
+    monkeypatch.setattr(metrics, "get_script_run_ctx", lambda: ctx)
+    return ctx
+
+
+def _counts(histogram):
+    return {label: sum(counts) for label, (counts, _) in histogram._series.items()}
+
+
+# フラグメントだけの再実行は記録し、アプリ全体の再実行の中で描画したフラグメントは外側に含める
+def test_fragment_reruns_are_counted_once(monkeypatch):
+    ctx = _context(monkeypatch)
+    m = metrics.Metrics()
+
+    with m.rerun(3):
+        ctx._enqueue(_Message())
+        with m.rerun("3:fragment"):
+            ctx._enqueue(_Message())
+    with m.rerun("3:fragment"):
+        ctx._enqueue(_Message())
+
+    assert _counts(m.rerun_seconds) == {"3": 1, "3:fragment": 1}
+    assert m.rerun_elements._series["3"][1] == 2
+    assert m.rerun_elements._series["3:fragment"][1] == 1
+
+
+# Streamlit の更新で _enqueue がなくなっても、所要時間は記録し続ける
+def test_rerun_without_enqueue_records_time_only(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "get_script_run_ctx", lambda: SimpleNamespace(session_id="s1"))
+    m = metrics.Metrics()
+
+    with m.rerun(1):
+        pass
+    with m.rerun(1):
+        pass
+
+    assert _counts(m.rerun_seconds) == {"1": 2}
+    assert m.rerun_elements._series == {}
+    assert m.active_sessions() == 1
+    assert len([r for r in caplog.records if r.name == "survey.metrics"]) == 1
+
+
+# 書き出しに失敗してもスレッドは止まらず、書き出せるようになれば書き出す
+def test_write_periodically_survives_errors(tmp_path):
+    path = tmp_path / "missing" / "survey.prom"
+    metrics.write_periodically(metrics.Metrics(), str(path), interval=0.01)
+    time.sleep(0.05)
+    path.parent.mkdir()
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "survey_active_sessions 0" in path.read_text(encoding="utf-8")
@@ -0,0 +1,133 @@
+import pytest
+
+from survey.aggregates import AggregateStore
+from survey.app import commit_responses
+from survey.reasons import ReasonIndex
+from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+from survey.storage import AppendOnlyLog
+from survey.submissions import SubmissionQueue
+
+
+@pytest.fixture
+def sinks(tmp_path):
+    schema = load_schema(DEFAULT_SCHEMA_PATH)
+    return (
+        AppendOnlyLog(str(tmp_path / "log.csv"), schema.columns),
+        AggregateStore(str(tmp_path / "aggregates.sqlite3"), schema),
+        ReasonIndex(str(tmp_path / "reasons.sqlite3"), schema),
+    )
+
+
+def _record(n):
+    return {"nps": n, "low_expectation_reason": f"理由{n}", "timestamp": f"2025-04-01 10:00:0{n}"}
+
+
+# 例外で止まるまで保存待ちの回答を保存する
+def _drain(queue, limit=100):
+    for _ in range(limit):
+        try:
+            if not queue.process():
+                return
+        except ValueError:
+            pass
+    raise AssertionError("journal was not drained")
+
+
+def _counts(log, aggregates, reasons):
+    return len(log.read()), aggregates.nps_summary()["responses"], reasons.count()
+
+
+# すべての保存先に書いた後で失敗したバッチを保存し直しても、どの保存先にも1回ずつしか入らない
+def test_retry_after_partial_commit_saves_each_response_once(tmp_path, sinks):
+    log, aggregates, reasons = sinks
+    bad = {3}
+
+    def commit(records):
+        commit_responses(log, aggregates, reasons, records)
+        if any(record["nps"] in bad for record in records):
+            raise ValueError("failed after saving")
+
+    queue = SubmissionQueue(str(tmp_path / "journal.sqlite3"), commit, max_attempts=2)
+    for n in range(6):
+        queue.submit(_record(n))
+    _drain(queue)
+    assert queue.status() == {"pending": 0, "failed": 1}
+    assert _counts(*sinks) == (6, 6, 6)
+
+    bad.clear()
+    assert queue.retry_failed() == 1
+    _drain(queue)
+    assert queue.status() == {"pending": 0, "failed": 0}
+    assert _counts(*sinks) == (6, 6, 6)
+    assert sorted(log.read()["nps"]) == list(range(6))
+
+
+# 保存し終えた後の手入れ（移し替え）が失敗しても、保存済みの回答は再試行されない
+def test_maintenance_failure_does_not_replay(tmp_path, sinks):
+    log, aggregates, reasons = sinks
+    calls = []
+
+    def maintain():
+        calls.append(len(log.read()))
+        raise OSError("compaction failed")
+
+    queue = SubmissionQueue(
+        str(tmp_path / "journal.sqlite3"), lambda records: commit_responses(log, aggregates, reasons, records),
+        maintain, interval=0.01,
+    ).start()
+    try:
+        for n in range(3):
+            queue.submit(_record(n))
+        assert queue.flush(timeout=10)
+    finally:
+        queue.close()
+    assert calls
+    assert _counts(*sinks) == (3, 3, 3)
+
+
+# 失敗したバッチは1件ずつ保存し直し、失敗回数は失敗した回答にだけ数える
+def test_failed_batch_is_retried_one_by_one(tmp_path):
+    saved, batches = [], []
+
+    def commit(records):
+        batches.append(len(records))
+        if any(record["n"] == 2 for record in records):
+            raise ValueError("bad record")
+        saved.extend(record["n"] for record in records)
+
+    queue = SubmissionQueue(str(tmp_path / "journal.sqlite3"), commit, max_attempts=3)
+    for n in range(5):
+        queue.submit({"n": n})
+    with pytest.raises(ValueError):
+        queue.process()
+    assert queue.status() == {"pending": 5, "failed": 0}
+
+    _drain(queue)
+    assert batches == [5, 1, 1, 1, 1, 1, 1, 1]
+    assert saved == [0, 1, 3, 4]
+    assert queue.status() == {"pending": 0, "failed": 1}
+    [(_, _, attempts, error)] = queue.failed()
+    assert attempts == 3 and error == "ValueError: bad record"
+
+
+# 保存する回答にはジャーナルの ID が付く
+def test_records_carry_submission_id(tmp_path):
+    received = []
+    queue = SubmissionQueue(str(tmp_path / "journal.sqlite3"), received.extend)
+    ids = [queue.submit({"n": n}) for n in range(3)]
+    assert queue.process() == 3
+    assert [record["submission_id"] for record in received] == ids
+
+
+# 保存されずにジャーナルに残った回答は、次に起動したワーカーが保存する
+def test_journal_survives_restart(tmp_path):
+    path = str(tmp_path / "journal.sqlite3")
+    SubmissionQueue(path, commit=None).submit({"n": 1})
+
+    received = []
+    queue = SubmissionQueue(path, received.extend, interval=0.01).start()
+    try:
+        assert queue.flush(timeout=10)
+    finally:
+        queue.close()
+    assert [record["n"] for record in received] == [1]
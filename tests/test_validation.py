@@ -0,0 +1,42 @@
+import pytest
+
+from survey.schema import DEFAULT_SCHEMA_PATH, load_schema
+from survey.validation import normalize_demographic, parse_number
+
+
+@pytest.mark.parametrize("text, unit, expected", [
+    ("500", 10_000, 500),
+    ("500万円", 10_000, 500),
+    ("1.5万", 10_000, 1.5),
+    ("1億2000万", 10_000, 12_000),
+    ("5千万", 10_000, 5_000),
+    ("1億2千万", 10_000, 12_000),
+    ("3千5百万円", 10_000, 3_500),
+    ("12万3千円", 1, 123_000),
+    ("-500", 10_000, -500),
+    ("−500万", 10_000, -500),
+    ("５，０００，０００円", 10_000, 500),
+    ("5,000,000円", 1, 5_000_000),
+    ("3千円", 1, 3_000),
+    (" 12 3 ", 1, 123),
+    (700, 10_000, 700),
+])
+def test_parse_number(text, unit, expected):
+    assert parse_number(text, unit) == expected
+
+
+@pytest.mark.parametrize("text", [None, "", "abc", "万円", "500ドル", "1万億", "5万3千万", "1百千", "円", "-"])
+def test_parse_number_rejects_unreadable_text(text):
+    assert parse_number(text, 10_000) is None
+
+
+# 年収（万円の項目）の自由入力：単位を混ぜた表記は読み、マイナスの値は範囲とは別に案内する
+@pytest.mark.parametrize("text, expected, error", [
+    ("5千万", 5_000, None),
+    ("1億2000万円", 12_000, "年収（万円）は 10000 以下で入力してください"),
+    ("-300", None, "年収（万円）にマイナスの値は入力できません"),
+    ("たくさん", None, "年収（万円）は数字で入力してください"),
+])
+def test_normalize_income(text, expected, error):
+    question = next(q for q in load_schema(DEFAULT_SCHEMA_PATH).demographics if q.key == "年収")
+    assert normalize_demographic(question, text) == (expected, error)
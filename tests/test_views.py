@@ -0,0 +1,81 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 新しいプロセスで回答ページをイントロから評価のページまで進め、読み込まれたモジュールを JSON で出力する
+_WALK = """
+import json, sys
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+at.button[0].click().run()
+at.button[0].click().run()
+for r in at.radio:
+    r.set_value(r.options[0])
+at.button[0].click().run()
+print(json.dumps({
+    "page": at.session_state.current_page,
+    "exception": [e.message for e in at.exception],
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+# 回答ページだけを表示するプロセスは、集計結果ページと pandas などの集計用のモジュールを読み込まない
+def test_questionnaire_does_not_import_results_modules(tmp_path):
+    env = dict(os.environ, SURVEY_DATA_DIR=str(tmp_path), PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-c", _WALK, os.path.join(ROOT, "streamlit_survey.py")],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    walked = json.loads(result.stdout.strip().splitlines()[-1])
+    assert walked["exception"] == []
+    assert walked["page"] == 4
+    modules = set(walked["modules"])
+    assert "survey.views.questionnaire" in modules
+    assert not modules & {"survey.views.results", "survey.storage", "survey.dataset", "survey.aggregates"}
+    assert not modules & {"numpy", "pandas", "pyarrow"}
+
+
+# 新しいプロセスで、基本情報のページのチェックポイントから再開し、入力欄の値を JSON で出力する
+_RESUME = """
+import json, sys
+from survey.checkpoint import CheckpointStore
+from survey.registry import DEFAULT_SURVEY, storage_paths
+responses = {"雇用形態": "契約社員", "年齢": 42, "有給休暇消化率": 80, "入社年": int(sys.argv[2]), "年収": 650}
+CheckpointStore(storage_paths(DEFAULT_SURVEY)["checkpoints"]).save("token", 2, responses)
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.query_params["resume"] = "token"
+at.run()
+widgets = {w.label: w.value for w in list(at.selectbox) + list(at.number_input) + list(at.slider) + list(at.text_input)}
+print(json.dumps({
+    "page": at.session_state.current_page,
+    "exception": [e.message for e in at.exception],
+    "warnings": [w.value for w in at.warning],
+    "widgets": widgets,
+}, ensure_ascii=False))
+"""
+
+
+# チェックポイントから再開すると、基本情報の入力欄には既定値ではなく保存した回答が入る
+def test_resume_restores_demographic_widgets(tmp_path):
+    env = dict(os.environ, SURVEY_DATA_DIR=str(tmp_path), PYTHONPATH=ROOT)
+    year = str(datetime.now().year - 3)
+    result = subprocess.run(
+        [sys.executable, "-c", _RESUME, os.path.join(ROOT, "streamlit_survey.py"), year],
+        cwd=tmp_path, env=env, capture_output=True, text=True, check=True,
+    )
+    resumed = json.loads(result.stdout.strip().splitlines()[-1])
+    assert resumed["exception"] == [] and resumed["warnings"] == []
+    assert resumed["page"] == 2
+    widgets = resumed["widgets"]
+    assert widgets["雇用形態"] == "契約社員"
+    assert widgets["年齢"] == 42
+    assert widgets["有給休暇消化率（%）"] == 80
+    assert widgets["入社年"] == int(year)
+    assert widgets["年収（万円）"] == "650"
+    assert widgets["残業時間（月平均時間）"] == 20